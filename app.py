@@ -1,12 +1,28 @@
 # app.py - Updated with OAuth Support
 import os
+import hmac
+import atexit
 import logging
 import asyncio
 import threading
+import sys
 import time
-from flask import Flask, request, jsonify
+import signal
+import concurrent.futures
+from flask import Flask, Response, request, jsonify
 from telegram import Update
 from bot import TelegramBot
+from config.bot_messages import BUTTON_LABELS
+from services.metrics_service import metrics
+from services.tracing_service import tracer
+from services.profiling_service import ProcessProfiler
+from services.memory_service import MemoryInspector
+from services.traffic_recorder import TrafficRecorder
+from services.leader_service import LeaderElection
+from services.dispatcher_service import UpdateDispatcher
+from services.health_service import HealthProber, google_health_checks
+from services.export_service import ReportExporter, ExportFilterError, parse_filters
+from config.spreadsheet_config import SpreadsheetConfig
 
 # Setup logging
 logging.basicConfig(
@@ -19,6 +35,17 @@ logger = logging.getLogger(__name__)
 BOT_TOKEN = os.environ.get("BOT_TOKEN")
 SPREADSHEET_ID = os.environ.get("SPREADSHEET_ID")
 SHEET_NAME = os.environ.get("SHEET_NAME", "Sheet1")  # Default to Sheet1 if not set
+DEBUG_TOKEN = os.environ.get("DEBUG_TOKEN")  # Debug endpoints disabled if not set
+EXPORT_TOKEN = os.environ.get("EXPORT_TOKEN")  # /export disabled if not set
+WORKERS = int(os.environ.get("WEB_CONCURRENCY", "1"))
+# Multi-worker: webhook baru dijawab setelah update selesai diproses, supaya update
+# berikutnya dari user yang sama (bisa masuk ke worker lain) tidak mendahului
+WEBHOOK_WAIT = os.environ.get("WEBHOOK_WAIT_FOR_PROCESSING", "1" if WORKERS > 1 else "0") == "1"
+WEBHOOK_WAIT_TIMEOUT = float(os.environ.get("WEBHOOK_WAIT_TIMEOUT", "50"))
+# > 0: proses ini hanya dispatcher, update diteruskan ke N proses worker per user
+DISPATCH_WORKERS = int(os.environ.get("DISPATCH_WORKERS", "0"))
+# Batas waktu menguras update yang sedang diproses saat SIGTERM (Railway redeploy)
+SHUTDOWN_TIMEOUT = float(os.environ.get("SHUTDOWN_TIMEOUT", "25"))
 
 # Validate required environment variables
 if not BOT_TOKEN:
@@ -32,6 +59,8 @@ if not SPREADSHEET_ID:
 # Log sheet configuration
 logger.info(f"📊 Using spreadsheet: {SPREADSHEET_ID}")
 logger.info(f"📄 Using sheet: {SHEET_NAME}")
+if os.environ.get("SHEET_PARTITION"):
+    logger.info(f"🗂️ New rows go to partition tabs by: {os.environ['SHEET_PARTITION']} (template: {SHEET_NAME})")
 
 # Optional: Validate SHEET_NAME format (tidak boleh kosong atau hanya whitespace)
 if not SHEET_NAME or not SHEET_NAME.strip():
@@ -42,11 +71,25 @@ if not SHEET_NAME or not SHEET_NAME.strip():
 # Create Flask app
 app = Flask(__name__)
 
-# Global variables
+# Global variables (per worker process: tiap worker gunicorn punya loop, bot dan Application sendiri)
 bot = None
 loop = None
 loop_thread = None
 bot_ready = False
+dispatcher = None
+shutting_down = False
+shutdown_lock = threading.Lock()
+profiler = ProcessProfiler()
+memory_inspector = MemoryInspector()
+recorder = TrafficRecorder(keep_texts=BUTTON_LABELS)
+atexit.register(recorder.close)
+# Job latar belakang hanya jalan di satu worker
+leader = LeaderElection()
+atexit.register(leader.stop)
+# Cek Google berkala di worker leader; endpoint hanya membaca hasil cache
+prober = HealthProber()
+# /export membaca file mirror SQLite langsung (juga di mode dispatcher, tanpa bot)
+exporter = ReportExporter(SpreadsheetConfig())
 
 def create_and_run_loop():
     """Create and run event loop in dedicated thread"""
@@ -104,29 +147,22 @@ def initialize_bot():
         logger.error(f"❌ Error initializing bot: {e}")
         return False
 
-def test_oauth_drive():
-    """Test OAuth Drive access"""
-    if not bot or not bot.google_service:
-        logger.warning("⚠️ Bot or Google service not available for OAuth test")
-        return False
-    
-    try:
-        logger.info("🧪 Testing OAuth Drive access...")
-        test_result = bot.google_service.test_oauth_drive_access()
-        
-        if test_result:
-            logger.info("✅ OAuth Drive access test PASSED - photos will use personal Gmail quota!")
-        else:
-            logger.warning("⚠️ OAuth Drive access test FAILED - photo uploads may not work")
-        
-        return test_result
-        
-    except Exception as e:
-        logger.error(f"❌ Error testing OAuth Drive: {e}")
+def deep_check_requested():
+    """?deep=1 (live Drive/Sheets calls) only with the debug token; anyone else gets the cached results"""
+    if request.args.get('deep') != '1':
         return False
+    return check_debug_token() is None
+
+def get_health_checks(deep=False):
+    """Cached health check results, or a live run when deep=True"""
+    if deep and prober.checks:
+        return prober.run_checks()
+    return prober.get_results()
 
 @app.route('/')
 def index():
+    checks = get_health_checks(deep=deep_check_requested())
+    
     # Get system info
     system_info = {
         'status': 'running',
@@ -135,7 +171,8 @@ def index():
         'message': 'Telegram Bot with OAuth Drive & Service Account Sheets',
         'spreadsheet_config': {
             'spreadsheet_id': SPREADSHEET_ID,
-            'sheet_name': SHEET_NAME
+            'sheet_name': SHEET_NAME,
+            'sheet_partition': bot.spreadsheet_config.partition_keys if bot else None
         },
         'services': {
             'drive': 'oauth_personal_account',
@@ -143,14 +180,12 @@ def index():
         }
     }
     
-    # Get quota info if available
-    if bot and bot.google_service:
-        try:
-            quota_info = bot.google_service.get_drive_quota_info()
-            if quota_info:
-                system_info['drive_quota'] = quota_info
-        except Exception as e:
-            logger.error(f"Error getting quota info: {e}")
+    # Kuota Drive dari cache prober (?deep=1 untuk cek langsung)
+    quota_check = checks.get('drive_quota')
+    if quota_check and quota_check['value']:
+        system_info['drive_quota'] = quota_check['value']
+        system_info['drive_quota_checked_at'] = quota_check['checked_at']
+    system_info['health_checks'] = checks
     
     return jsonify(system_info)
 
@@ -163,34 +198,221 @@ def health():
         'services': {
             'drive_oauth': 'ready' if (bot and bot.google_service and bot.google_service.service_drive) else 'not_ready',
             'sheets_service_account': 'ready' if (bot and bot.google_service and bot.google_service.service_sheets) else 'not_ready'
-        }
+        },
+        'photo_budget': bot.photo_budget.get_stats() if bot else None,
+        'photo_dedup': bot.photo_dedup.get_stats() if bot else None,
+        'photo_processing': bot.image_processor.get_stats() if bot else None,
+        'state_store': bot.state_store.get_stats() if bot else None,
+        'sheet_partitions': bot.sheet_partitions.get_stats() if bot else None,
+        'ticket_index': bot.ticket_index.get_stats() if bot else None,
+        'search_index': bot.search_index.get_stats() if bot else None,
+        'sheet_mirror': bot.sheet_mirror.get_stats() if bot else None,
+        'report_summary': bot.report_summary.get_stats() if bot else None,
+        'checks': prober.get_results(),
+        'health_prober': prober.get_stats(),
+        'worker': leader.get_stats(),
+        'dispatcher': dispatcher.get_stats() if dispatcher else None,
+        'tracing': tracer.get_stats(),
+        'traffic_recorder': recorder.get_stats()
     })
 
+@app.route('/metrics')
+def metrics_endpoint():
+    """Prometheus-style metrics endpoint"""
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4; charset=utf-8')
+
+def check_token(expected, header, disabled_message):
+    """Return error response if request does not carry the expected token"""
+    if not expected:
+        return jsonify({'status': 'error', 'message': disabled_message}), 404
+    
+    token = request.headers.get(header) or request.args.get('token', '')
+    if not hmac.compare_digest(token, expected):
+        return jsonify({'status': 'error', 'message': 'Unauthorized'}), 401
+    
+    return None
+
+def check_debug_token():
+    """Return error response if request is not authorized for debug endpoints"""
+    return check_token(DEBUG_TOKEN, 'X-Debug-Token', 'Debug endpoints disabled (DEBUG_TOKEN not set)')
+
+@app.route('/debug/profile')
+def profile_endpoint():
+    """Start a time-boxed profiling job of the running process (?job=<id> fetches the result)"""
+    auth_error = check_debug_token()
+    if auth_error:
+        return auth_error
+    
+    job_id = request.args.get('job')
+    if job_id:
+        return profile_result(job_id)
+    
+    if not loop or loop.is_closed():
+        return jsonify({'status': 'error', 'message': 'Event loop not available'}), 503
+    
+    mode = request.args.get('mode', 'cprofile')
+    seconds = request.args.get('seconds', 5, type=float)
+    
+    try:
+        # Sesi jalan di thread sendiri: request ini tidak menahan worker web selama profiling
+        if mode == 'cprofile':
+            output = request.args.get('format', 'text')
+            job = profiler.start_job(
+                mode,
+                profiler.profile_event_loop,
+                loop=loop,
+                seconds=seconds,
+                output=output,
+                sort=request.args.get('sort', 'cumulative'),
+                limit=request.args.get('limit', 60, type=int),
+                # Mode cprofile: stack thread event loop disampel, hasil tetap format pstats
+                interval=request.args.get('interval_ms', 1, type=float) / 1000
+            )
+            job['format'] = output
+        
+        elif mode == 'sample':
+            interval = request.args.get('interval_ms', 10, type=float) / 1000
+            job = profiler.start_job(mode, profiler.sample_stacks, seconds=seconds, interval=interval)
+        
+        elif mode == 'slow-callbacks':
+            threshold = request.args.get('threshold_ms', 100, type=float) / 1000
+            job = profiler.start_job(mode, profiler.detect_slow_callbacks, loop=loop, seconds=seconds, threshold=threshold)
+        
+        else:
+            return jsonify({
+                'status': 'error',
+                'message': 'Unknown mode (use cprofile, sample or slow-callbacks)'
+            }), 400
+        
+        return jsonify({
+            'status': 'started',
+            'job_id': job['id'],
+            'mode': mode,
+            'result_url': f"/debug/profile?job={job['id']}"
+        }), 202
+        
+    except RuntimeError as e:
+        return jsonify({'status': 'busy', 'message': str(e)}), 409
+    except Exception as e:
+        logger.error(f"❌ Error in profile endpoint: {e}")
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+def profile_result(job_id):
+    """Result of a profiling job (202 while it is still running)"""
+    job = profiler.get_job(job_id)
+    if job is None:
+        # Job disimpan per proses: dengan beberapa worker request bisa masuk worker lain
+        return jsonify({'status': 'error', 'message': 'Unknown job (expired, or started on another worker)'}), 404
+    
+    if job['status'] == 'running':
+        return jsonify({
+            'status': 'running',
+            'job_id': job_id,
+            'elapsed_seconds': round(time.time() - job['started_at'], 1)
+        }), 202, {'Retry-After': '1'}
+    
+    if job['status'] == 'error':
+        return jsonify({'status': 'error', 'job_id': job_id, 'message': job['error']}), 500
+    
+    result = job['result']
+    if job['mode'] == 'slow-callbacks':
+        return jsonify({'status': 'success', **result})
+    if job.get('format') == 'pstats':
+        return Response(
+            result,
+            mimetype='application/octet-stream',
+            headers={'Content-Disposition': 'attachment; filename=event_loop.pstats'}
+        )
+    return Response(result, mimetype='text/plain')
+
+@app.route('/debug/memory')
+def memory_endpoint():
+    """tracemalloc snapshot diff plus live state counts"""
+    auth_error = check_debug_token()
+    if auth_error:
+        return auth_error
+    
+    try:
+        if request.args.get('stop') == '1':
+            memory_inspector.stop()
+            return jsonify({'status': 'stopped'})
+        
+        result = memory_inspector.snapshot(limit=request.args.get('limit', 30, type=int))
+        
+        if bot:
+            result['runtime'] = bot.get_runtime_stats()
+        
+        return jsonify(result)
+        
+    except Exception as e:
+        logger.error(f"❌ Error in memory endpoint: {e}")
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+@app.route('/export')
+def export_endpoint():
+    """Stream the report table as CSV or Parquet (?format=, from=, to=, report_type=, sto=)"""
+    auth_error = check_token(EXPORT_TOKEN, 'X-Export-Token', 'Export disabled (EXPORT_TOKEN not set)')
+    if auth_error:
+        return auth_error
+    
+    export_format = request.args.get('format', 'csv').lower()
+    if export_format not in exporter.formats:
+        return jsonify({
+            'status': 'error',
+            'message': f"Unsupported format (available: {', '.join(exporter.formats)})"
+        }), 400
+    
+    try:
+        filters = parse_filters(request.args)
+    except ExportFilterError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+    
+    if not exporter.available():
+        return jsonify({
+            'status': 'pending',
+            'message': 'Sheet mirror not synced yet - retry later'
+        }), 503, {'Retry-After': '30'}
+    
+    logger.info(f"📤 Export {export_format} started: {filters or 'all rows'}")
+    filename = f"laporan_{time.strftime('%Y%m%d_%H%M%S')}.{export_format}"
+    if export_format == 'parquet':
+        body, mimetype = exporter.stream_parquet(filters), 'application/vnd.apache.parquet'
+    else:
+        body, mimetype = exporter.stream_csv(filters), 'text/csv'
+    # Tanpa Content-Length: dikirim chunked, halaman demi halaman
+    return Response(body, mimetype=mimetype, headers={'Content-Disposition': f'attachment; filename={filename}'})
+
 @app.route('/test-oauth')
 def test_oauth_endpoint():
-    """Test endpoint for OAuth Drive access"""
+    """OAuth Drive status from the health prober (?deep=1 runs the checks now)"""
     try:
-        if not bot or not bot.google_service:
+        deep = deep_check_requested()
+        if deep and not prober.checks:
             return jsonify({
                 'status': 'error',
                 'message': 'Bot or Google service not available'
             }), 503
         
-        # Test OAuth Drive access
-        oauth_test = test_oauth_drive()
-        
-        # Get quota info
-        quota_info = bot.google_service.get_drive_quota_info()
+        checks = get_health_checks(deep=deep)
+        oauth_check = checks.get('drive_oauth')
+        if not oauth_check:
+            return jsonify({
+                'status': 'pending',
+                'message': 'No OAuth Drive check has run yet - retry later or use ?deep=1 with the debug token'
+            }), 503
         
-        # Get service account info
-        service_account_info = bot.google_service.get_service_account_usage()
+        quota_check = checks.get('drive_quota') or {}
         
         return jsonify({
-            'status': 'success' if oauth_test else 'failed',
-            'oauth_drive_working': oauth_test,
-            'quota_info': quota_info,
-            'service_account_info': service_account_info,
-            'message': 'OAuth Drive test completed'
+            'status': 'success' if oauth_check['ok'] else 'failed',
+            'oauth_drive_working': oauth_check['ok'],
+            'checked_at': oauth_check['checked_at'],
+            'age_seconds': oauth_check['age_seconds'],
+            'deep': deep,
+            'quota_info': quota_check.get('value'),
+            'sheets_reachable': checks.get('sheets', {}).get('ok'),
+            'service_account_info': bot.google_service.get_service_account_usage() if bot else None,
+            'message': 'OAuth Drive test completed' if deep else 'Cached OAuth Drive result'
         })
         
     except Exception as e:
@@ -226,9 +448,64 @@ def cleanup_endpoint():
             'message': str(e)
         }), 500
 
+def shutdown():
+    """Graceful shutdown: refuse new webhooks, drain in-flight updates, flush state (idempotent)"""
+    global shutting_down, bot_ready
+    with shutdown_lock:
+        if shutting_down:
+            return
+        shutting_down = True
+    
+    logger.info("🛑 Shutting down - new webhooks get 503 until the next instance is up")
+    try:
+        if dispatcher:
+            dispatcher.close(timeout=SHUTDOWN_TIMEOUT + 5)
+        elif bot and loop and not loop.is_closed():
+            future = asyncio.run_coroutine_threadsafe(bot.shutdown(SHUTDOWN_TIMEOUT), loop)
+            future.result(timeout=SHUTDOWN_TIMEOUT + 10)
+            loop.call_soon_threadsafe(loop.stop)
+    except Exception as e:
+        logger.error(f"❌ Error during shutdown: {e}")
+        if bot:
+            bot.state_store.close()
+    finally:
+        bot_ready = False
+        prober.stop()
+        leader.stop()
+        recorder.close()
+        tracer.close()
+    logger.info("✅ Shutdown complete")
+
+atexit.register(shutdown)
+
+def handle_sigterm(signum, frame):
+    """SIGTERM when running app.py directly (gunicorn calls shutdown from worker_exit)"""
+    shutdown()
+    sys.exit(0)
+
+def dispatch_webhook():
+    """Webhook in dispatcher mode: hand raw update to the worker owning the user"""
+    received_at = time.monotonic()
+    json_data = request.get_json(force=True)
+    if not json_data:
+        logger.error("❌ Empty JSON data received")
+        return jsonify({'status': 'invalid_data'}), 400
+    
+    recorder.record(json_data)
+    worker = dispatcher.dispatch(json_data, received_at=received_at)
+    logger.info(f"✅ Update dispatched to worker {worker}")
+    return jsonify({'status': 'ok'})
+
 @app.route('/webhook', methods=['POST'])
 def webhook():
     try:
+        if shutting_down:
+            # Telegram mengirim ulang update yang gagal; instance berikutnya yang memproses
+            return jsonify({'status': 'shutting_down'}), 503, {'Retry-After': '5'}
+        
+        if dispatcher:
+            return dispatch_webhook()
+        
         # Check if bot is ready
         if not bot_ready or not bot:
             logger.warning("⚠️ Bot not ready, ignoring webhook")
@@ -240,23 +517,38 @@ def webhook():
             return jsonify({'status': 'loop_error'}), 503
         
         # Get and validate JSON data
+        received_at = time.monotonic()
         json_data = request.get_json(force=True)
         if not json_data:
             logger.error("❌ Empty JSON data received")
             return jsonify({'status': 'invalid_data'}), 400
         
+        # Rekam update (opsional, WEBHOOK_RECORD_DIR)
+        recorder.record(json_data)
+        
         logger.info(f"📨 Processing webhook update")
         
         try:
             # Create Update object
             update = Update.de_json(json_data, bot.application.bot)
             
+            # Root span dibuka di sini, ditutup setelah update selesai diproses
+            trace = tracer.start_trace('webhook', update_id=update.update_id)
+            
             # Schedule processing (don't wait for result)
             future = asyncio.run_coroutine_threadsafe(
-                bot.process_update(update), 
+                bot.process_update(update, received_at=received_at, trace=trace),
                 loop
             )
             
+            if WEBHOOK_WAIT:
+                try:
+                    future.result(timeout=WEBHOOK_WAIT_TIMEOUT)
+                except concurrent.futures.TimeoutError:
+                    # Tetap 200 supaya Telegram tidak mengirim ulang; proses jalan terus
+                    logger.warning("⚠️ Update still processing after webhook wait timeout")
+                return jsonify({'status': 'ok'})
+            
             logger.info("✅ Update queued successfully")
             return jsonify({'status': 'ok'})
             
@@ -269,11 +561,30 @@ def webhook():
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
 # Application startup
+def start_dispatcher():
+    """Start worker processes; this process only routes webhook updates"""
+    global dispatcher, bot_ready
+    
+    if WORKERS > 1:
+        logger.warning("⚠️ DISPATCH_WORKERS set - run a single gunicorn worker (WEB_CONCURRENCY=1)")
+    
+    logger.info(f"🔀 Starting dispatcher with {DISPATCH_WORKERS} worker processes...")
+    dispatcher = UpdateDispatcher(DISPATCH_WORKERS, BOT_TOKEN, SPREADSHEET_ID)
+    if not dispatcher.start():
+        logger.warning("⚠️ Not all workers ready yet - updates wait in their queues")
+    
+    bot_ready = True
+    logger.info("✅ Application startup complete!")
+
 def startup():
     global bot_ready
     
     logger.info("🚀 Starting Telegram Bot with OAuth Drive + Service Account Sheets...")
     
+    if DISPATCH_WORKERS > 0:
+        start_dispatcher()
+        return
+    
     # Start event loop
     logger.info("⚡ Starting event loop...")
     if not start_event_loop():
@@ -286,22 +597,22 @@ def startup():
         logger.error("❌ Failed to initialize bot")
         exit(1)
     
-    # Test OAuth Drive capability
-    logger.info("🧪 Testing OAuth Drive access...")
-    oauth_test_passed = test_oauth_drive()
-    
-    if oauth_test_passed:
-        logger.info("✅ OAUTH DRIVE WORKING - Photos will use your personal Gmail quota (15GB)!")
-    else:
-        logger.warning("⚠️ OAUTH DRIVE NOT WORKING - Photo uploads may fail!")
-        logger.warning("⚠️ Check OAuth credentials: OAUTH_CLIENT_ID, OAUTH_CLIENT_SECRET, OAUTH_REFRESH_TOKEN")
+    # Cek OAuth Drive, kuota dan Sheets berkala (hanya di worker leader)
+    prober.checks.update(google_health_checks(bot.google_service.background_client(), SPREADSHEET_ID, bot.spreadsheet_config))
+    leader.on_elected(prober.start)
+    # Mirror SQLite spreadsheet: satu penulis, worker lain hanya membaca file yang sama
+    leader.on_elected(bot.sheet_mirror.start)
+    leader.start()
     
     logger.info("✅ Application startup complete!")
 
-# Run startup
-startup()
+# Run startup (tidak di proses anak forkserver/spawn, yang meng-import ulang
+# file __main__ sebagai __mp_main__ saat dijalankan dengan python app.py)
+if __name__ != '__mp_main__':
+    startup()
 
 if __name__ == "__main__":
     port = int(os.environ.get('PORT', 5000))
+    signal.signal(signal.SIGTERM, handle_sigterm)
     logger.info(f"🌐 Starting Flask server on port {port}")
     app.run(host='0.0.0.0', port=port, debug=False)
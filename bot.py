@@ -1,10 +1,14 @@
 # bot.py - Simple Fixed Version
 import os
 import re
+import time
+import uuid
 import asyncio
+import contextlib
 import logging
 from datetime import datetime
-from telegram import Update, ReplyKeyboardMarkup, KeyboardButton
+from telegram import Update
+from telegram.request import HTTPXRequest
 from telegram.ext import (
     Application,
     CommandHandler,
@@ -16,39 +20,225 @@ from telegram.ext import (
 
 from services.google_service import GoogleService
 from services.session_service import SessionService
+from services.persistence_service import StateStore, SQLitePersistence, conversation_key
+from services.photo_budget_service import PhotoByteBudget
+from services.photo_dedup_service import PhotoDedupIndex
+from services.image_service import ImageProcessor
+from services.ticket_index_service import TicketIndex, normalize_ticket_id
+from services.search_service import SearchIndex
+from services.sheet_mirror_service import SheetMirror
+from services.sheet_partition_service import SheetPartitions
+from services.report_summary_service import ReportAggregator, PERIODS
+from services.metrics_service import metrics
+from services.tracing_service import tracer
 from config.spreadsheet_config import SpreadsheetConfig
+from config.report_form import ReportFormParser
+from config.bot_messages import (
+    BTN_CANCEL, BTN_SUBMIT, BTN_EDIT, BTN_UPLOAD, BTN_MODE_SINGLE, BTN_MODE_MULTIPLE,
+    BTN_DELETE_ALL, BTN_BACK_TO_CONFIRM, BTN_FINISH_UPLOAD, BTN_FINISH_UPLOAD_ALT,
+    BTN_PHOTO_OK, BTN_PHOTO_WRONG, BTN_BACK_TO_UPLOAD, BTN_CONTINUE_DUPLICATE, REPORT_TYPE_LABELS,
+    KEYBOARD_REPORT_TYPE, KEYBOARD_CANCEL, KEYBOARD_START, KEYBOARD_CONFIRM,
+    KEYBOARD_UPLOAD_MODE, KEYBOARD_UPLOADING, KEYBOARD_PHOTO_DESC, KEYBOARD_PHOTO_CHECK,
+    KEYBOARD_DUPLICATE_TICKET, DUPLICATE_TICKET_TEXT,
+    upload_keyboard, upload_mode_keyboard, render_form_created, render_form_edit,
+    UPLOAD_METHOD_TEXT, SINGLE_MODE_TEXT, SINGLE_MODE_AGAIN_TEXT, MULTIPLE_MODE_TEXT,
+    PHOTO_DESC_PROMPT, CANCELLED_TEXT, SESSION_ERROR_TEXT, CHOOSE_ACTION_TEXT,
+    SEARCH_USAGE_TEXT, SEARCH_LOADING_TEXT, REKAP_USAGE_TEXT, REPORT_QUERY_DENIED_TEXT,
+    render_confirmation, render_form_errors, render_search_results, render_rekap
+)
 
 # States untuk ConversationHandler
 SELECT_REPORT_TYPE, INPUT_ID, INPUT_DATA, CONFIRM_DATA, UPLOAD_PHOTO, INPUT_PHOTO_DESC = range(6)
+STATE_NAMES = {
+    SELECT_REPORT_TYPE: 'SELECT_REPORT_TYPE',
+    INPUT_ID: 'INPUT_ID',
+    INPUT_DATA: 'INPUT_DATA',
+    CONFIRM_DATA: 'CONFIRM_DATA',
+    UPLOAD_PHOTO: 'UPLOAD_PHOTO',
+    INPUT_PHOTO_DESC: 'INPUT_PHOTO_DESC'
+}
+
+CONVERSATION_NAME = 'report_conversation'
+
+# Sub-mode routing UPLOAD_PHOTO saat menunggu konfirmasi foto satu-satu
+CONFIRMING_PHOTO = 'confirming_photo'
 
 logger = logging.getLogger(__name__)
 
+# Metrics
+HANDLER_LATENCY = metrics.histogram(
+    'bot_handler_duration_seconds',
+    'Latency of conversation state handlers',
+    ['handler']
+)
+ACTION_LATENCY = metrics.histogram(
+    'bot_action_duration_seconds',
+    'Latency of conversation button actions',
+    ['action']
+)
+WEBHOOK_QUEUE_DELAY = metrics.histogram(
+    'webhook_queue_delay_seconds',
+    'Delay between webhook receipt and start of update processing'
+)
+UPDATE_LATENCY = metrics.histogram(
+    'bot_update_duration_seconds',
+    'Total processing time of one update'
+)
+ACTIVE_SESSIONS = metrics.gauge('bot_active_sessions', 'Number of active report sessions')
+PHOTO_INFLIGHT_BYTES = metrics.gauge('photo_inflight_bytes', 'Photo bytes currently in flight')
+PHOTO_INFLIGHT_PEAK_BYTES = metrics.gauge('photo_inflight_peak_bytes', 'Peak photo bytes in flight')
+PHOTO_QUEUED = metrics.gauge('photo_queued', 'Photos waiting for byte budget')
+
+class TracingHTTPXRequest(HTTPXRequest):
+    """HTTPXRequest that records every outbound Telegram call as a trace span"""
+    
+    async def do_request(self, url, method, *args, **kwargs):
+        # URL: .../bot<token>/sendMessage atau .../file/bot<token>/<path> (download)
+        if '/file/bot' in url:
+            span_name = 'telegram.download_file'
+        else:
+            span_name = f"telegram.{url.rsplit('/', 1)[-1]}"
+        
+        with tracer.span(span_name) as span:
+            status_code, payload = await super().do_request(url, method, *args, **kwargs)
+            if span:
+                span.set_attribute('status_code', status_code)
+                span.set_attribute('response_bytes', len(payload))
+            return status_code, payload
+
 class TelegramBot:
-    def __init__(self, token, spreadsheet_id):
+    def __init__(self, token, spreadsheet_id, state_store=None):
         self.token = token
         self.spreadsheet_id = spreadsheet_id
+        # Base URL Bot API lokal (tools/fake_servers.py) untuk benchmark/test offline
+        self.api_base_url = os.environ.get('TELEGRAM_API_BASE_URL')
+        # /cari dan /rekap membuka data semua laporan: hanya user ID Telegram di daftar ini
+        self.report_query_users = {
+            int(user_id) for user_id in os.environ.get('REPORT_QUERY_USER_IDS', '').split(',') if user_id.strip()
+        }
+        if not self.report_query_users:
+            logger.warning("⚠️ REPORT_QUERY_USER_IDS not set - /cari and /rekap are disabled")
         self.application = None
+        self.conversation_handler = None
         
         # Initialize services
         logger.info("🔧 Initializing Google services...")
         self.google_service = GoogleService()
-        self.session_service = SessionService(self.google_service)
+        # Satu store untuk state percakapan PTB, user_data dan session laporan
+        # (worker dispatcher memberi store per shard)
+        self.state_store = state_store or StateStore()
+        self.persistence = SQLitePersistence(self.state_store)
+        self.session_service = SessionService(self.google_service, self.state_store)
+        self._user_locks = {}
+        # update_id -> {'update', 'task', 'started'}; dikuras saat shutdown
+        self._inflight = {}
+        self._replay_tasks = set()
+        # Dispatcher: hanya update milik worker ini yang diproses ulang saat start
+        self.owns_update = None
         self.spreadsheet_config = SpreadsheetConfig()
+        self.form_parser = ReportFormParser(self.spreadsheet_config)
+        self.photo_budget = PhotoByteBudget()
+        self.photo_dedup = PhotoDedupIndex()
+        self.image_processor = ImageProcessor()
+        self._routes = self._build_routes()
+        self._register_metrics()
         
         # Authenticate Google
         logger.info("🔐 Authenticating Google APIs...")
         if not self.google_service.authenticate():
             raise Exception("Failed to authenticate Google APIs")
         
+        # Tab tujuan baris laporan (SHEET_PARTITION), dipakai di event loop bersama google_service
+        self.sheet_partitions = SheetPartitions(self.google_service, spreadsheet_id, self.spreadsheet_config)
+        # Salinan SQLite tabel laporan; sync dijalankan worker leader (lihat app.py)
+        self.sheet_mirror = SheetMirror(self.google_service.background_client(), spreadsheet_id, self.spreadsheet_config)
+        # Cek duplikat ID Ticket dan index /cari dibangun dari mirror, tanpa baca Sheets per worker
+        self.ticket_index = TicketIndex(self.sheet_mirror, self.spreadsheet_config)
+        self.search_index = SearchIndex(self.sheet_mirror, self.spreadsheet_config)
+        self.report_summary = ReportAggregator(self.sheet_mirror, self.spreadsheet_config, self.state_store)
+        
         logger.info("✅ TelegramBot services initialized")
 
+    def _register_metrics(self):
+        """Expose service state as scrape-time gauges"""
+        ACTIVE_SESSIONS.set_function(self.session_service.count_sessions)
+        PHOTO_INFLIGHT_BYTES.set_function(lambda: self.photo_budget.in_flight_bytes)
+        PHOTO_INFLIGHT_PEAK_BYTES.set_function(lambda: self.photo_budget.peak_in_flight_bytes)
+        PHOTO_QUEUED.set_function(lambda: self.photo_budget.get_stats()['queued_photos'])
+
+    def _instrumented(self, name, handler):
+        """Wrap conversation handler with latency metric and trace span"""
+        async def wrapper(update, context):
+            with HANDLER_LATENCY.time(handler=name), tracer.span(f'handler.{name}'):
+                return await handler(update, context)
+        return wrapper
+
+    def _build_routes(self):
+        """Build (state, sub-mode, button label) -> (action name, handler) table once"""
+        cancel = ('cancel', self._action_cancel)
+        upload = {
+            BTN_BACK_TO_CONFIRM: ('back_to_confirm', self._action_show_confirmation),
+            BTN_DELETE_ALL: ('delete_all_photos', self._action_delete_all_photos),
+            BTN_MODE_SINGLE: ('mode_single', self._action_mode_single),
+            BTN_MODE_MULTIPLE: ('mode_multiple', self._action_mode_multiple),
+            BTN_FINISH_UPLOAD: ('finish_upload', self._action_finish_upload),
+            BTN_CANCEL: cancel
+        }
+        tables = {
+            (INPUT_ID, None): {
+                BTN_CONTINUE_DUPLICATE: ('continue_duplicate', self._action_continue_duplicate),
+                BTN_CANCEL: cancel
+            },
+            (INPUT_DATA, None): {BTN_CANCEL: cancel},
+            (CONFIRM_DATA, None): {
+                BTN_SUBMIT: ('submit', self._action_submit),
+                BTN_EDIT: ('edit', self._action_edit),
+                BTN_UPLOAD: ('upload', self._action_upload),
+                BTN_CANCEL: cancel
+            },
+            (UPLOAD_PHOTO, None): upload,
+            # Tombol upload biasa tetap berlaku saat konfirmasi foto, jadi digabung di sini
+            # supaya dispatch tetap satu lookup
+            (UPLOAD_PHOTO, CONFIRMING_PHOTO): {
+                **upload,
+                BTN_PHOTO_OK: ('photo_ok', self._action_photo_ok),
+                BTN_PHOTO_WRONG: ('photo_wrong', self._action_photo_wrong),
+                BTN_FINISH_UPLOAD_ALT: ('finish_upload', self._action_finish_upload)
+            },
+            (INPUT_PHOTO_DESC, None): {BTN_BACK_TO_UPLOAD: ('back_to_upload', self._action_back_to_upload)}
+        }
+        return {
+            (state, submode, label): route
+            for (state, submode), table in tables.items()
+            for label, route in table.items()
+        }
+
+    async def _dispatch(self, state, update, context, submode=None):
+        """Run the action routed for a button press; None if the text is not a button here"""
+        route = self._routes.get((state, submode, update.message.text))
+        if route is None:
+            return None
+        name, action = route
+        with ACTION_LATENCY.time(action=name), tracer.span(f'action.{name}'):
+            return await action(update, context)
+
     async def initialize_application(self):
         """Initialize Telegram Application"""
         try:
             logger.info("🤖 Building Telegram Application...")
             
             # Build application
-            self.application = Application.builder().token(self.token).build()
+            builder = (
+                Application.builder()
+                .token(self.token)
+                .request(TracingHTTPXRequest(connection_pool_size=256))
+                .persistence(self.persistence)
+            )
+            if self.api_base_url:
+                base_url = self.api_base_url.rstrip('/')
+                logger.warning(f"⚠️ TELEGRAM_API_BASE_URL set - using local Bot API at {base_url}")
+                builder = builder.base_url(f"{base_url}/bot").base_file_url(f"{base_url}/file/bot")
+            self.application = builder.build()
             
             # Setup handlers
             self._setup_handlers()
@@ -57,6 +247,10 @@ class TelegramBot:
             logger.info("🔄 Initializing Telegram Application...")
             await self.application.initialize()
             
+            self._replay_pending_updates()
+            self.ticket_index.start()
+            self.search_index.start()
+            
             logger.info("✅ Telegram Application initialized successfully")
             return True
             
@@ -68,64 +262,212 @@ class TelegramBot:
         """Setup conversation handlers"""
         logger.info("📋 Setting up conversation handlers...")
         
+        start = self._instrumented('start', self.start)
+        upload_photo = self._instrumented('upload_photo', self.upload_photo)
+        
         conv_handler = ConversationHandler(
             entry_points=[
-                CommandHandler('start', self.start)
+                CommandHandler('start', start)
             ],
             states={
                 SELECT_REPORT_TYPE: [
-                    MessageHandler(filters.TEXT & ~filters.COMMAND, self.select_report_type)
+                    MessageHandler(filters.TEXT & ~filters.COMMAND, self._instrumented('select_report_type', self.select_report_type))
                 ],
                 INPUT_ID: [
-                    MessageHandler(filters.TEXT & ~filters.COMMAND, self.input_id)
+                    MessageHandler(filters.TEXT & ~filters.COMMAND, self._instrumented('input_id', self.input_id))
                 ],
                 INPUT_DATA: [
-                    MessageHandler(filters.TEXT & ~filters.COMMAND, self.input_data)
+                    MessageHandler(filters.TEXT & ~filters.COMMAND, self._instrumented('input_data', self.input_data))
                 ],
                 CONFIRM_DATA: [
-                    MessageHandler(filters.TEXT & ~filters.COMMAND, self.confirm_data)
+                    MessageHandler(filters.TEXT & ~filters.COMMAND, self._instrumented('confirm_data', self.confirm_data))
                 ],
                 UPLOAD_PHOTO: [
-                    MessageHandler(filters.TEXT & ~filters.COMMAND, self.upload_photo),
-                    MessageHandler(filters.PHOTO, self.upload_photo)
+                    MessageHandler(filters.TEXT & ~filters.COMMAND, upload_photo),
+                    MessageHandler(filters.PHOTO, upload_photo)
                 ],
                 INPUT_PHOTO_DESC: [
-                    MessageHandler(filters.TEXT & ~filters.COMMAND, self.input_photo_desc)
+                    MessageHandler(filters.TEXT & ~filters.COMMAND, self._instrumented('input_photo_desc', self.input_photo_desc))
                 ]
             },
-            fallbacks=[CommandHandler('start', self.start)],
-            allow_reentry=True
+            fallbacks=[CommandHandler('start', start)],
+            allow_reentry=True,
+            name=CONVERSATION_NAME,
+            persistent=True
         )
         
+        self.conversation_handler = conv_handler
         self.application.add_handler(conv_handler)
+        # Di luar percakapan: /cari tidak mengubah state laporan yang sedang diisi
+        self.application.add_handler(CommandHandler('cari', self._instrumented('cari', self.cari)))
+        self.application.add_handler(CommandHandler('rekap', self._instrumented('rekap', self.rekap)))
         logger.info("✅ Handlers setup complete")
 
-    async def process_update(self, update):
-        """Process incoming update"""
+    def get_runtime_stats(self):
+        """Count live in-memory state (sessions, conversation states, user_data)"""
+        stats = {
+            'active_sessions': self.session_service.count_sessions(),
+            'conversation_states': {},
+            'user_data': {'users': 0, 'entries': 0, 'keys': {}},
+            'photo_budget': self.photo_budget.get_stats(),
+            'photo_dedup': self.photo_dedup.get_stats(),
+            'state_store': self.state_store.get_stats(),
+            'sheet_partitions': self.sheet_partitions.get_stats(),
+            'ticket_index': self.ticket_index.get_stats(),
+            'search_index': self.search_index.get_stats(),
+            'sheet_mirror': self.sheet_mirror.get_stats(),
+            'report_summary': self.report_summary.get_stats()
+        }
+        
+        if self.conversation_handler:
+            # ConversationHandler tidak punya API publik untuk daftar percakapan
+            conversations = getattr(self.conversation_handler, '_conversations', {})
+            for state in list(conversations.values()):
+                name = STATE_NAMES.get(state, str(state))
+                stats['conversation_states'][name] = stats['conversation_states'].get(name, 0) + 1
+        
+        if self.application:
+            key_counts = stats['user_data']['keys']
+            for data in list(self.application.user_data.values()):
+                if not data:
+                    continue
+                stats['user_data']['users'] += 1
+                stats['user_data']['entries'] += len(data)
+                for key in list(data):
+                    key_counts[key] = key_counts.get(key, 0) + 1
+        
+        return stats
+
+    @contextlib.asynccontextmanager
+    async def _user_lock(self, user_id):
+        """Serialize updates of one user (across workers if the store is shared)"""
+        entry = self._user_locks.get(user_id)
+        if entry is None:
+            entry = self._user_locks[user_id] = [asyncio.Lock(), 0]
+        entry[1] += 1
         try:
-            if not self.application:
-                logger.error("❌ Application not initialized")
-                return
-                
-            user_id = update.effective_user.id if update.effective_user else 'Unknown'
-            logger.info(f"🔄 Processing update for user: {user_id}")
-            
-            # Process the update
-            await self.application.process_update(update)
-            logger.info("✅ Update processed successfully")
-            
+            async with entry[0]:
+                await self.state_store.lock_user(user_id)
+                try:
+                    yield
+                finally:
+                    self.state_store.unlock_user(user_id)
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del self._user_locks[user_id]
+
+    def _refresh_shared_state(self, update):
+        """Reload conversation state and session of this user written by other workers"""
+        if not update.effective_user or not update.effective_chat:
+            return
+        user_id = update.effective_user.id
+        key = (update.effective_chat.id, user_id)
+        state = self.state_store.load_row('conversations', conversation_key(CONVERSATION_NAME, key))
+        conversations = self.conversation_handler._conversations
+        if state is None:
+            conversations.pop(key, None)
+        else:
+            conversations.update_no_track({key: state})
+        # user_data di-refresh PTB lewat SQLitePersistence.refresh_user_data
+        self.session_service.refresh(user_id)
+
+    def _replay_pending_updates(self):
+        """Process updates saved by the previous instance at shutdown, in order"""
+        pending = self.state_store.claim_pending_updates(self.owns_update)
+        if not pending:
+            return
+        logger.info(f"♻️ Replaying {len(pending)} updates saved at last shutdown")
+        for data in pending:
+            update = Update.de_json(data, self.application.bot)
+            task = asyncio.get_running_loop().create_task(self.process_update(update))
+            self._replay_tasks.add(task)
+            task.add_done_callback(self._replay_tasks.discard)
+
+    async def shutdown(self, timeout):
+        """Drain in-flight updates, save the ones not started yet and shut the Application down"""
+        logger.info(f"🛑 Shutting down bot: draining {len(self._inflight)} in-flight updates (max {timeout:g}s)")
+        self.ticket_index.stop()
+        self.search_index.stop()
+        deadline = time.monotonic() + timeout
+        while self._inflight and time.monotonic() < deadline:
+            await asyncio.sleep(0.1)
+        
+        if self._inflight:
+            entries = list(self._inflight.values())
+            waiting = [entry for entry in entries if not entry['started']]
+            # Yang belum mulai aman diproses ulang oleh instance berikutnya
+            for entry in waiting:
+                self.state_store.stage('pending_updates', entry['update'].update_id, entry['update'].to_dict())
+            logger.warning(
+                f"⚠️ Drain deadline reached: {len(waiting)} queued updates saved for next start, "
+                f"{len(entries) - len(waiting)} running updates cancelled"
+            )
+            for entry in entries:
+                entry['task'].cancel()
+            await asyncio.gather(*(entry['task'] for entry in entries), return_exceptions=True)
+        
+        try:
+            # update_persistence + flush, lalu tutup koneksi HTTP
+            await self.application.shutdown()
         except Exception as e:
-            logger.error(f"❌ Error processing update: {e}")
-            
-            # Try to send error message
+            logger.error(f"❌ Error shutting down Telegram Application: {e}")
+        self.image_processor.shutdown()
+        self.sheet_mirror.close()
+        self.state_store.close()
+        logger.info("✅ Bot shutdown complete")
+
+    async def process_update(self, update, received_at=None, trace=None):
+        """Process incoming update"""
+        error = None
+        entry = self._inflight[update.update_id] = {
+            'update': update,
+            'task': asyncio.current_task(),
+            'started': False
+        }
+        with tracer.activate(trace):
             try:
-                if update.effective_chat and self.application:
-                    await self.application.bot.send_message(
-                        chat_id=update.effective_chat.id,
-                        text="❌ Terjadi kesalahan sistem. Silakan coba lagi dengan /start"
-                    )
-            except Exception as send_error:
-                logger.error(f"❌ Failed to send error message: {send_error}")
+                if not self.application:
+                    logger.error("❌ Application not initialized")
+                    return
+                
+                # Waktu tunggu sejak webhook diterima sampai mulai diproses
+                if received_at is not None:
+                    WEBHOOK_QUEUE_DELAY.observe(time.monotonic() - received_at)
+                    
+                user_id = update.effective_user.id if update.effective_user else 'Unknown'
+                logger.info(f"🔄 Processing update for user: {user_id}")
+                
+                # Update dari user yang sama diproses berurutan, supaya state percakapan
+                # dan session yang disimpan selalu dari update terakhir
+                async with self._user_lock(user_id):
+                    entry['started'] = True
+                    with UPDATE_LATENCY.time(), tracer.span('process_update', user_id=user_id):
+                        if self.state_store.shared:
+                            self._refresh_shared_state(update)
+                        await self.application.process_update(update)
+                        # Application tidak di-start(), jadi persistence di-flush manual
+                        await self.application.update_persistence()
+                        await self.persistence.flush()
+                logger.info("✅ Update processed successfully")
+                
+            except Exception as e:
+                error = e
+                logger.error(f"❌ Error processing update: {e}")
+                
+                # Try to send error message
+                try:
+                    if update.effective_chat and self.application:
+                        await self.application.bot.send_message(
+                            chat_id=update.effective_chat.id,
+                            text="❌ Terjadi kesalahan sistem. Silakan coba lagi dengan /start"
+                        )
+                except Exception as send_error:
+                    logger.error(f"❌ Failed to send error message: {send_error}")
+            
+            finally:
+                self._inflight.pop(update.update_id, None)
+                tracer.finish_trace(trace, error=error)
 
     async def start(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Start command handler"""
@@ -136,15 +478,9 @@ class TelegramBot:
             # Create new session
             self.session_service.create_session(user_id)
             
-            keyboard = [
-                [KeyboardButton("Non B2B"), KeyboardButton("BGES")],
-                [KeyboardButton("Squad")]
-            ]
-            reply_markup = ReplyKeyboardMarkup(keyboard, resize_keyboard=True)
-            
             await update.message.reply_text(
                 "🔷 Pilih Jenis Laporan:",
-                reply_markup=reply_markup
+                reply_markup=KEYBOARD_REPORT_TYPE
             )
             return SELECT_REPORT_TYPE
             
@@ -153,6 +489,58 @@ class TelegramBot:
             await update.message.reply_text("❌ Terjadi kesalahan. Silakan coba lagi.")
             return ConversationHandler.END
 
+    async def _report_query_allowed(self, update, command):
+        """Only allowlisted users (REPORT_QUERY_USER_IDS) may read other users' reports"""
+        user_id = update.effective_user.id
+        if user_id in self.report_query_users:
+            return True
+        logger.warning(f"⛔ User {user_id} not allowed to use /{command}")
+        await update.message.reply_text(REPORT_QUERY_DENIED_TEXT)
+        return False
+
+    async def cari(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Search reports in the sheet via the in-memory index"""
+        try:
+            if not await self._report_query_allowed(update, 'cari'):
+                return
+            
+            query = ' '.join(context.args).strip()
+            if not query:
+                await update.message.reply_text(SEARCH_USAGE_TEXT)
+                return
+            
+            if not self.search_index.loaded:
+                await update.message.reply_text(SEARCH_LOADING_TEXT)
+                return
+            
+            total, results = self.search_index.search(query)
+            logger.info(f"🔍 User {update.effective_user.id} searched '{query}': {total} results")
+            await update.message.reply_text(render_search_results(query, total, results))
+            
+        except Exception as e:
+            logger.error(f"❌ Error in cari handler: {e}")
+            await update.message.reply_text("❌ Terjadi kesalahan. Silakan coba lagi.")
+
+    async def rekap(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Daily or monthly report summary from the sheet mirror"""
+        try:
+            if not await self._report_query_allowed(update, 'rekap'):
+                return
+            
+            period = PERIODS.get(context.args[0].lower() if context.args else 'hari')
+            if period is None:
+                await update.message.reply_text(REKAP_USAGE_TEXT)
+                return
+            
+            # Sync mirror baru (leader) dibaca di thread, agregasi tidak menahan event loop
+            summary = await asyncio.to_thread(self.report_summary.summary, period)
+            logger.info(f"📊 User {update.effective_user.id} requested rekap {period}: {summary['total']} reports")
+            await update.message.reply_text(render_rekap(summary))
+            
+        except Exception as e:
+            logger.error(f"❌ Error in rekap handler: {e}")
+            await update.message.reply_text("❌ Terjadi kesalahan. Silakan coba lagi.")
+
     async def select_report_type(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Handle report type selection"""
         try:
@@ -161,20 +549,19 @@ class TelegramBot:
             
             logger.info(f"📝 User {user_id} selected: {message_text}")
             
-            valid_types = ['Non B2B', 'BGES', 'Squad']
-            if message_text not in valid_types:
+            if message_text not in REPORT_TYPE_LABELS:
                 await update.message.reply_text("❌ Pilihan tidak valid. Silakan pilih jenis laporan yang tersedia.")
                 return SELECT_REPORT_TYPE
             
             # Update session
             success = self.session_service.update_session(user_id, {'report_type': message_text})
             if not success:
-                await update.message.reply_text("❌ Session error. Silakan /start ulang.")
+                await update.message.reply_text(SESSION_ERROR_TEXT)
                 return ConversationHandler.END
             
             await update.message.reply_text(
                 "🎫 Masukkan ID Ticket:",
-                reply_markup=ReplyKeyboardMarkup([[KeyboardButton("❌ Batalkan")]], resize_keyboard=True)
+                reply_markup=KEYBOARD_CANCEL
             )
             return INPUT_ID
             
@@ -191,14 +578,9 @@ class TelegramBot:
             
             logger.info(f"🎫 User {user_id} entered ticket ID: {ticket_id}")
             
-            if ticket_id == "❌ Batalkan":
-                self.delete_folder_if_exists(user_id)
-                self.session_service.end_session(user_id)
-                await update.message.reply_text(
-                    "❌ Laporan dibatalkan.",
-                    reply_markup=ReplyKeyboardMarkup([[KeyboardButton("/start")]], resize_keyboard=True)
-                )
-                return ConversationHandler.END
+            next_state = await self._dispatch(INPUT_ID, update, context)
+            if next_state is not None:
+                return next_state
             
             if not ticket_id:
                 await update.message.reply_text("❌ ID Ticket tidak boleh kosong. Silakan masukkan ID Ticket:")
@@ -210,87 +592,85 @@ class TelegramBot:
                 await update.message.reply_text("❌ Session tidak ditemukan. Silakan /start ulang.")
                 return ConversationHandler.END
             
-            # Update session with ticket ID
-            self.session_service.update_session(user_id, {'id_ticket': ticket_id})
-            
-            # Create folder in Google Drive
-            folder_name = f"{session['report_type']}_{ticket_id}"
-            folder_id = self.google_service.create_folder(folder_name)
-            
-            if not folder_id:
-                await update.message.reply_text("❌ Gagal membuat folder. Silakan coba lagi.")
-                return INPUT_ID
-            
-            self.session_service.update_session(user_id, {'folder_id': folder_id})
-            
-            # Send format
-            folder_link = self.google_service.get_folder_link(folder_id)
-            report_format = (
-                f"✅ Format Berhasil Dibuat\n\n"
-                f"Report Type : {session['report_type']}\n"
-                f"ID Ticket : {ticket_id}\n"
-                f"Folder Drive : {folder_link}\n"
-                f"-------------------------------------------------------------\n"
-                f"Salin Format Laporan dan isi dibawah ini :\n\n"
-                f"Customer Name : \n"
-                f"Service No : \n"
-                f"Segment : \n"
-                f"Teknisi 1 : \n"
-                f"Teknisi 2 : \n"
-                f"STO : \n"
-                f"Valins ID : "
-            )
+            # ID yang sudah ada di sheet: peringatkan dulu sebelum membuat folder.
+            # Mengetik ulang ID yang sama (beda huruf besar/kecil/spasi pun) setelah peringatan dianggap lanjut
+            if self.ticket_index.contains(ticket_id) and session.get('duplicate_ticket') != normalize_ticket_id(ticket_id):
+                return await self._warn_duplicate_ticket(update, user_id, ticket_id)
             
-            await update.message.reply_text(
-                report_format,
-                reply_markup=ReplyKeyboardMarkup([[KeyboardButton("❌ Batalkan")]], resize_keyboard=True)
-            )
-            return INPUT_DATA
+            return await self._create_report_folder(update, user_id, session, ticket_id)
             
         except Exception as e:
             logger.error(f"❌ Error in input_id: {e}")
             await update.message.reply_text("❌ Terjadi kesalahan. Silakan /start ulang.")
             return ConversationHandler.END
 
+    async def _warn_duplicate_ticket(self, update, user_id, ticket_id):
+        """Ask before creating a folder for a ticket ID that is already in the sheet"""
+        row = self.ticket_index.row_of(ticket_id)
+        location = self.spreadsheet_config.describe_row(*row) if row else None
+        logger.warning(f"⚠️ User {user_id} entered already reported ticket ID: {ticket_id} ({location or 'not synced yet'})")
+        self.ticket_index.record_duplicate()
+        self.session_service.update_session(user_id, {'duplicate_ticket': normalize_ticket_id(ticket_id)})
+        await update.message.reply_text(
+            DUPLICATE_TICKET_TEXT.format(
+                id_ticket=ticket_id,
+                location=f" ({location} di spreadsheet)" if location else ""
+            ),
+            reply_markup=KEYBOARD_DUPLICATE_TICKET
+        )
+        return INPUT_ID
+
+    async def _create_report_folder(self, update, user_id, session, ticket_id):
+        """Create the Drive folder for the ticket and send the report form"""
+        # Update session with ticket ID
+        self.session_service.update_session(user_id, {'id_ticket': ticket_id, 'duplicate_ticket': None})
+        
+        # Create folder in Google Drive
+        folder_name = f"{session['report_type']}_{ticket_id}"
+        folder_id = self.google_service.create_folder(folder_name)
+        
+        if not folder_id:
+            await update.message.reply_text("❌ Gagal membuat folder. Silakan coba lagi.")
+            return INPUT_ID
+        
+        self.session_service.update_session(user_id, {'folder_id': folder_id})
+        
+        # Send format
+        folder_link = self.google_service.get_folder_link(folder_id)
+        report_format = render_form_created(
+            self.spreadsheet_config.form_fields,
+            report_type=session['report_type'],
+            id_ticket=ticket_id,
+            folder_link=folder_link
+        )
+        
+        await update.message.reply_text(
+            report_format,
+            reply_markup=KEYBOARD_CANCEL
+        )
+        return INPUT_DATA
+
     async def input_data(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Handle data input - simplified version"""
         try:
             user_id = update.effective_user.id
             message_text = update.message.text
             
-            if message_text == "❌ Batalkan":
-                self.delete_folder_if_exists(user_id)
-                self.session_service.end_session(user_id)
-                await update.message.reply_text(
-                    "❌ Laporan dibatalkan.",
-                    reply_markup=ReplyKeyboardMarkup([[KeyboardButton("/start")]], resize_keyboard=True)
-                )
-                return ConversationHandler.END
+            next_state = await self._dispatch(INPUT_DATA, update, context)
+            if next_state is not None:
+                return next_state
             
-            # Simple data parsing
-            data = {}
-            lines = message_text.split('\n')
+            # Parse form (semua kesalahan dilaporkan sekaligus)
+            data, errors = self.form_parser.parse(message_text)
             
-            for line in lines:
-                if ':' in line:
-                    key, value = line.split(':', 1)
-                    data[key.strip()] = value.strip()
-            
-            # Check if we have the required fields
-            required_fields = ['Customer Name', 'Service No', 'Segment', 'Teknisi 1', 'Teknisi 2', 'STO', 'Valins ID']
-            missing_fields = [field for field in required_fields if field not in data or not data[field]]
-            
-            if missing_fields:
-                await update.message.reply_text(
-                    f"❌ Data tidak lengkap. Field berikut harus diisi: {', '.join(missing_fields)}\n\n"
-                    f"Silakan kirim ulang format yang sudah diisi dengan lengkap."
-                )
+            if errors:
+                await update.message.reply_text(render_form_errors(errors))
                 return INPUT_DATA
             
             # Get session
             session = self.session_service.get_session(user_id)
             if not session:
-                await update.message.reply_text("❌ Session error. Silakan /start ulang.")
+                await update.message.reply_text(SESSION_ERROR_TEXT)
                 return ConversationHandler.END
             
             # Create report data
@@ -299,65 +679,17 @@ class TelegramBot:
                 'id_ticket': session['id_ticket'],
                 'folder_link': self.google_service.get_folder_link(session['folder_id']),
                 'reported': datetime.now().strftime("%d/%m/%Y %H:%M"),
-                'customer_name': data.get('Customer Name', ''),
-                'service_no': data.get('Service No', ''),
-                'segment': data.get('Segment', ''),
-                'teknisi_1': data.get('Teknisi 1', ''),
-                'teknisi_2': data.get('Teknisi 2', ''),
-                'sto': data.get('STO', ''),
-                'valins_id': data.get('Valins ID', '')
+                **data
             }
             
             # Save to session
             self.session_service.update_session(user_id, {'data': report_data})
             
-            # Show confirmation
-            confirmation_text = (
-                f"✅ Konfirmasi Data Laporan\n\n"
-                f"Report Type: {report_data['report_type']}\n"
-                f"ID Ticket: {report_data['id_ticket']}\n"
-                f"Customer Name: {report_data['customer_name']}\n"
-                f"Service No: {report_data['service_no']}\n"
-                f"Segment: {report_data['segment']}\n"
-                f"Teknisi 1: {report_data['teknisi_1']}\n"
-                f"Teknisi 2: {report_data['teknisi_2']}\n"
-                f"STO: {report_data['sto']}\n"
-                f"Valins ID: {report_data['valins_id']}\n\n"
-                f"Pilih tindakan:"
-            )
-            
             # Tampilkan konfirmasi dengan info foto
             session = self.session_service.get_session(user_id)
-            photo_info = ""
-            if session.get('photos'):
-                photo_info = f"\n📷 Foto Terupload: {len(session['photos'])} foto\n"
-                for i, photo in enumerate(session['photos'], 1):
-                    photo_info += f"   {i}. {photo['name']}\n"
-            else:
-                photo_info = "\n📷 Foto Eviden: Belum ada foto terupload\n"
-            
-            confirmation_text = (
-                f"✅ Konfirmasi Data Laporan\n\n"
-                f"Report Type: {report_data['report_type']}\n"
-                f"ID Ticket: {report_data['id_ticket']}\n"
-                f"Customer Name: {report_data['customer_name']}\n"
-                f"Service No: {report_data['service_no']}\n"
-                f"Segment: {report_data['segment']}\n"
-                f"Teknisi 1: {report_data['teknisi_1']}\n"
-                f"Teknisi 2: {report_data['teknisi_2']}\n"
-                f"STO: {report_data['sto']}\n"
-                f"Valins ID: {report_data['valins_id']}"
-                f"{photo_info}\n"
-                f"Pilih tindakan:"
-            )
+            confirmation_text = render_confirmation(self.spreadsheet_config.form_fields, report_data, session.get('photos'))
             
-            keyboard = [
-                [KeyboardButton("✅ Kirim Laporan"), KeyboardButton("📝 Edit Data")],
-                [KeyboardButton("📷 Upload Foto Eviden"), KeyboardButton("❌ Batalkan")]
-            ]
-            reply_markup = ReplyKeyboardMarkup(keyboard, resize_keyboard=True)
-            
-            await update.message.reply_text(confirmation_text, reply_markup=reply_markup)
+            await update.message.reply_text(confirmation_text, reply_markup=KEYBOARD_CONFIRM)
             return CONFIRM_DATA
             
         except Exception as e:
@@ -368,417 +700,224 @@ class TelegramBot:
     async def confirm_data(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Handle data confirmation - simplified"""
         try:
-            user_id = update.effective_user.id
-            choice = update.message.text
-            
-            session = self.session_service.get_session(user_id)
-            if not session:
-                await update.message.reply_text("❌ Session error. Silakan /start ulang.")
-                return ConversationHandler.END
-            
-            if choice == "✅ Kirim Laporan":
-                # Send to spreadsheet
-                success = self.google_service.update_spreadsheet(
-                    self.spreadsheet_id,
-                    self.spreadsheet_config,
-                    session['data']
-                )
-                
-                if success:
-                    await update.message.reply_text(
-                        "✅ Laporan berhasil dikirim ke spreadsheet!",
-                        reply_markup=ReplyKeyboardMarkup([[KeyboardButton("/start")]], resize_keyboard=True)
-                    )
-                else:
-                    await update.message.reply_text(
-                        "❌ Gagal mengirim laporan. Silakan coba lagi.",
-                        reply_markup=ReplyKeyboardMarkup([[KeyboardButton("/start")]], resize_keyboard=True)
-                    )
-                
-                self.session_service.end_session(user_id)
-                return ConversationHandler.END
-                
-            elif choice == "❌ Batalkan":
-                self.delete_folder_if_exists(user_id)
-                self.session_service.end_session(user_id)
-                await update.message.reply_text(
-                    "❌ Laporan dibatalkan.",
-                    reply_markup=ReplyKeyboardMarkup([[KeyboardButton("/start")]], resize_keyboard=True)
-                )
-                return ConversationHandler.END
-
-            elif choice == "📝 Edit Data":
-                # Kirim ulang format untuk diedit
-                report_format = (
-                    f"📝 Edit Data Laporan\n\n"
-                    f"Report Type : {session['data']['report_type']}\n"
-                    f"ID Ticket : {session['data']['id_ticket']}\n"
-                    f"Folder Drive : {session['data']['folder_link']}\n"
-                    f"-------------------------------------------------------------\n"
-                    f"Salin Format Laporan dan edit dibawah ini :\n\n"
-                    f"Customer Name : {session['data']['customer_name']}\n"
-                    f"Service No : {session['data']['service_no']}\n"
-                    f"Segment : {session['data']['segment']}\n"
-                    f"Teknisi 1 : {session['data']['teknisi_1']}\n"
-                    f"Teknisi 2 : {session['data']['teknisi_2']}\n"
-                    f"STO : {session['data']['sto']}\n"
-                    f"Valins ID : {session['data']['valins_id']}"
-                )
-                
-                await update.message.reply_text(
-                    report_format,
-                    reply_markup=ReplyKeyboardMarkup([[KeyboardButton("❌ Batalkan")]], resize_keyboard=True)
-                )
-                return INPUT_DATA
-            
-            elif choice == "📷 Upload Foto Eviden":
-                # Cek apakah sudah ada foto terupload
-                session = self.session_service.get_session(user_id)
-                has_photos = session.get('photos') and len(session['photos']) > 0
-                
-                if has_photos:
-                    # Jika sudah ada foto, langsung ke opsi upload
-                    keyboard = [
-                        [KeyboardButton("🔸 Upload Satu-Satu (Custom Nama)")],
-                        [KeyboardButton("📷 Upload Banyak (Auto Nama)")],
-                        [KeyboardButton("🗑️ Hapus Semua & Upload Ulang")],
-                        [KeyboardButton("🔙 Kembali ke Konfirmasi")]
-                    ]
-                else:
-                    # Jika belum ada foto, tampilkan opsi kembali
-                    keyboard = [
-                        [KeyboardButton("🔸 Upload Satu-Satu (Custom Nama)")],
-                        [KeyboardButton("📷 Upload Banyak (Auto Nama)")],
-                        [KeyboardButton("🔙 Kembali ke Konfirmasi")]
-                    ]
-                
-                await update.message.reply_text(
-                    "📷 **Upload Foto Eviden**\n\n"
-                    "⚡ **PENTING - Cara Upload Foto:**\n"
-                    "• **Satu foto**: Kirim 1 foto → input deskripsi custom\n"
-                    "• **Beberapa foto sekaligus**: Deskripsi akan otomatis random (foto_1, foto_2, dst)\n\n"
-                    "🔧 **Pilih metode upload:**",
-                    reply_markup=ReplyKeyboardMarkup(keyboard, resize_keyboard=True)
-                )
-                return UPLOAD_PHOTO
+            # Pilihan di luar tombol diabaikan, tetap di CONFIRM_DATA
+            return await self._dispatch(CONFIRM_DATA, update, context)
                 
         except Exception as e:
             logger.error(f"❌ Error in confirm_data: {e}")
             await update.message.reply_text("❌ Terjadi kesalahan. Silakan /start ulang.")
             return ConversationHandler.END
 
-    async def upload_photo(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
-        """Handle photo upload state - FIXED VERSION with better controls"""
+    async def _action_cancel(self, update, context):
+        """Cancel report: delete Drive folder and end session"""
         user_id = update.effective_user.id
-        message_text = update.message.text
+        context.user_data.pop('upload_mode', None)
+        self.delete_folder_if_exists(user_id)
+        self.session_service.end_session(user_id)
+        await update.message.reply_text(CANCELLED_TEXT, reply_markup=KEYBOARD_START)
+        return ConversationHandler.END
 
-        if context.user_data.get('confirming_single_photo'):
-            if message_text == "✅ Benar, Lanjut Upload":
-                # Clear confirmation state dan lanjut upload
-                context.user_data['confirming_single_photo'] = False
-                if 'last_uploaded_photo' in context.user_data:
-                    del context.user_data['last_uploaded_photo']
-                
-                # Kembali ke mode upload satu-satu
-                session = self.session_service.get_session(user_id)
-                has_photos = session.get('photos') and len(session['photos']) > 0
-                
-                keyboard = [
-                    [KeyboardButton("✅ Selesai Upload")],
-                    [KeyboardButton("🗑️ Hapus Semua & Upload Ulang")],
-                    [KeyboardButton("🔙 Kembali ke Konfirmasi")]
-                ]
-                
-                await update.message.reply_text(
-                    f"📷 **Total foto terupload: {len(session.get('photos', []))}**\n\n"
-                    f"Kirimkan foto berikutnya atau pilih opsi:",
-                    reply_markup=ReplyKeyboardMarkup(keyboard, resize_keyboard=True)
-                )
-                return UPLOAD_PHOTO
-            
-            elif message_text == "❌ Salah, Hapus Foto Ini":
-                # Hapus foto yang baru saja diupload
-                last_photo = context.user_data.get('last_uploaded_photo')
-                session = self.session_service.get_session(user_id)
-                
-                if last_photo and session:
-                    try:
-                        # Hapus dari Drive
-                        self.google_service.service_drive.files().delete(fileId=last_photo['id']).execute()
-                        logger.info(f"🗑️ Deleted incorrect photo: {last_photo['name']}")
-                        
-                        # Hapus dari session
-                        if 'photos' in session:
-                            session['photos'] = [p for p in session['photos'] if p['id'] != last_photo['id']]
-                            self.session_service.update_session(user_id, {'photos': session['photos']})
-                        
-                        await update.message.reply_text("🗑️ Foto berhasil dihapus!")
-                        
-                    except Exception as e:
-                        logger.error(f"❌ Error deleting photo: {e}")
-                        await update.message.reply_text("❌ Terjadi kesalahan saat menghapus foto.")
-                
-                # Clear confirmation state
-                context.user_data['confirming_single_photo'] = False
-                if 'last_uploaded_photo' in context.user_data:
-                    del context.user_data['last_uploaded_photo']
-                
-                # Kembali ke mode upload satu-satu
-                session = self.session_service.get_session(user_id)
-                has_photos = session.get('photos') and len(session['photos']) > 0
-                
-                if has_photos:
-                    keyboard = [
-                        [KeyboardButton("✅ Selesai Upload")],
-                        [KeyboardButton("🗑️ Hapus Semua & Upload Ulang")],
-                        [KeyboardButton("🔙 Kembali ke Konfirmasi")]
-                    ]
-                else:
-                    keyboard = [
-                        [KeyboardButton("🔙 Kembali ke Konfirmasi")]
-                    ]
+    async def _action_continue_duplicate(self, update, context):
+        """Create the report anyway for the ticket ID flagged as duplicate"""
+        user_id = update.effective_user.id
+        session = self.session_service.get_session(user_id)
+        if not session:
+            await update.message.reply_text(SESSION_ERROR_TEXT)
+            return ConversationHandler.END
+        
+        ticket_id = session.get('duplicate_ticket')
+        if not ticket_id:
+            await update.message.reply_text("🎫 Masukkan ID Ticket:", reply_markup=KEYBOARD_CANCEL)
+            return INPUT_ID
+        
+        logger.info(f"🎫 User {user_id} continues with duplicate ticket ID: {ticket_id}")
+        return await self._create_report_folder(update, user_id, session, ticket_id)
+
+    async def _action_submit(self, update, context):
+        """Send report row to spreadsheet"""
+        user_id = update.effective_user.id
+        session = self.session_service.get_session(user_id)
+        if not session:
+            await update.message.reply_text(SESSION_ERROR_TEXT)
+            return ConversationHandler.END
+        
+        success = self.sheet_partitions.append(session['data'])
+        
+        if success:
+            self.ticket_index.add(session['data']['id_ticket'])
+            # Hanya berpengaruh di worker leader; index lain menyusul dari mirror
+            self.sheet_mirror.request_sync()
+            await self._record_report(session)
+            await update.message.reply_text(
+                "✅ Laporan berhasil dikirim ke spreadsheet!",
+                reply_markup=KEYBOARD_START
+            )
+        else:
+            await update.message.reply_text(
+                "❌ Gagal mengirim laporan. Silakan coba lagi.",
+                reply_markup=KEYBOARD_START
+            )
+        
+        self.session_service.end_session(user_id)
+        return ConversationHandler.END
+
+    async def _record_report(self, session):
+        """Count a submitted report in the /rekap counters right away"""
+        try:
+            created_at = datetime.fromisoformat(session['created_at'])
+            turnaround = (datetime.now() - created_at).total_seconds()
+            # Menulis turnaround ke SQLite state store: jangan di event loop
+            await asyncio.to_thread(self.report_summary.record, session['data'], turnaround)
+        except Exception as e:
+            logger.error(f"❌ Error recording report for rekap: {e}")
+
+    async def _action_edit(self, update, context):
+        """Resend filled form for editing"""
+        session = self.session_service.get_session(update.effective_user.id)
+        if not session:
+            await update.message.reply_text(SESSION_ERROR_TEXT)
+            return ConversationHandler.END
+        
+        await update.message.reply_text(
+            render_form_edit(self.spreadsheet_config.form_fields, session['data']),
+            reply_markup=KEYBOARD_CANCEL
+        )
+        return INPUT_DATA
+
+    async def _action_upload(self, update, context):
+        """Show upload method choice"""
+        session = self.session_service.get_session(update.effective_user.id)
+        if not session:
+            await update.message.reply_text(SESSION_ERROR_TEXT)
+            return ConversationHandler.END
+        
+        # Opsi hapus semua hanya muncul kalau sudah ada foto
+        await update.message.reply_text(
+            UPLOAD_METHOD_TEXT,
+            reply_markup=upload_mode_keyboard(session.get('photos'))
+        )
+        return UPLOAD_PHOTO
+
+    async def _action_show_confirmation(self, update, context):
+        """Back to report confirmation with latest photo list"""
+        session = self.session_service.get_session(update.effective_user.id)
+        if not session:
+            await update.message.reply_text(SESSION_ERROR_TEXT)
+            return ConversationHandler.END
+        
+        confirmation_text = render_confirmation(self.spreadsheet_config.form_fields, session['data'], session.get('photos'))
+        await update.message.reply_text(confirmation_text, reply_markup=KEYBOARD_CONFIRM)
+        return CONFIRM_DATA
+
+    async def _action_finish_upload(self, update, context):
+        """Finish uploading: reset upload state and show confirmation"""
+        context.user_data.pop('confirming_single_photo', None)
+        context.user_data.pop('last_uploaded_photo', None)
+        context.user_data.pop('upload_mode', None)
+        return await self._action_show_confirmation(update, context)
+
+    async def _action_delete_all_photos(self, update, context):
+        """Delete all uploaded photos from Drive and session"""
+        user_id = update.effective_user.id
+        session = self.session_service.get_session(user_id)
+        if session and session.get('photos'):
+            try:
+                # Hapus foto dari Drive
+                for photo in session['photos']:
+                    if self.google_service.delete_file(photo['id']):
+                        self.photo_dedup.forget_file(photo['id'])
+                        logger.info(f"🗑️ Deleted photo: {photo['name']}")
+                    else:
+                        logger.error(f"❌ Error deleting photo {photo['name']}")
                 
-                await update.message.reply_text(
-                    "Kirimkan foto lagi atau pilih opsi:",
-                    reply_markup=ReplyKeyboardMarkup(keyboard, resize_keyboard=True)
-                )
-                return UPLOAD_PHOTO
-            
-            elif message_text == "🏁 Selesai Upload":
-                # Same as "✅ Selesai Upload" - go to confirmation
-                context.user_data['confirming_single_photo'] = False
-                if 'last_uploaded_photo' in context.user_data:
-                    del context.user_data['last_uploaded_photo']
+                # Hapus dari session
+                self.session_service.update_session(user_id, {'photos': []})
                 
-                # Reset upload mode
-                if 'upload_mode' in context.user_data:
-                    del context.user_data['upload_mode']
+                await update.message.reply_text("🗑️ Semua foto berhasil dihapus!")
                 
-                # Kembali ke konfirmasi data
-                session = self.session_service.get_session(user_id)
-                if not session:
-                    await update.message.reply_text("❌ Session error. Silakan /start ulang.")
-                    return ConversationHandler.END
-                    
-                photo_info = ""
-                if session.get('photos'):
-                    photo_info = f"\n📷 Foto Terupload: {len(session['photos'])} foto\n"
-                    for i, photo in enumerate(session['photos'], 1):
-                        photo_info += f"   {i}. {photo['name']}\n"
-                else:
-                    photo_info = "\n📷 Foto Eviden: Belum ada foto terupload\n"
+            except Exception as e:
+                logger.error(f"❌ Error deleting photos: {e}")
+                await update.message.reply_text("❌ Terjadi kesalahan saat menghapus foto.")
+        
+        # Kembali ke pilihan upload awal (tanpa opsi hapus karena sudah tidak ada foto)
+        await update.message.reply_text(UPLOAD_METHOD_TEXT, reply_markup=KEYBOARD_UPLOAD_MODE)
+        return UPLOAD_PHOTO
+
+    async def _action_mode_single(self, update, context):
+        """Switch to one-by-one upload with custom names"""
+        context.user_data['upload_mode'] = 'single'
+        session = self.session_service.get_session(update.effective_user.id)
+        await update.message.reply_text(SINGLE_MODE_TEXT, reply_markup=upload_keyboard(session.get('photos')))
+        return UPLOAD_PHOTO
+
+    async def _action_mode_multiple(self, update, context):
+        """Switch to batch upload with automatic names"""
+        context.user_data['upload_mode'] = 'multiple'
+        session = self.session_service.get_session(update.effective_user.id)
+        await update.message.reply_text(MULTIPLE_MODE_TEXT, reply_markup=upload_keyboard(session.get('photos')))
+        return UPLOAD_PHOTO
+
+    async def _action_photo_ok(self, update, context):
+        """Accept last single-mode photo and continue uploading"""
+        context.user_data.pop('confirming_single_photo', None)
+        context.user_data.pop('last_uploaded_photo', None)
+        
+        session = self.session_service.get_session(update.effective_user.id)
+        await update.message.reply_text(
+            f"📷 **Total foto terupload: {len(session.get('photos', []))}**\n\n"
+            f"Kirimkan foto berikutnya atau pilih opsi:",
+            reply_markup=KEYBOARD_UPLOADING
+        )
+        return UPLOAD_PHOTO
+
+    async def _action_photo_wrong(self, update, context):
+        """Delete last single-mode photo and continue uploading"""
+        user_id = update.effective_user.id
+        last_photo = context.user_data.pop('last_uploaded_photo', None)
+        context.user_data.pop('confirming_single_photo', None)
+        session = self.session_service.get_session(user_id)
+        
+        if last_photo and session:
+            try:
+                # Hapus dari Drive
+                if not self.google_service.delete_file(last_photo['id']):
+                    raise Exception("Drive delete failed")
+                self.photo_dedup.forget_file(last_photo['id'])
+                logger.info(f"🗑️ Deleted incorrect photo: {last_photo['name']}")
                 
-                confirmation_text = (
-                    f"✅ Konfirmasi Data Laporan\n\n"
-                    f"Report Type: {session['data']['report_type']}\n"
-                    f"ID Ticket: {session['data']['id_ticket']}\n"
-                    f"Customer Name: {session['data']['customer_name']}\n"
-                    f"Service No: {session['data']['service_no']}\n"
-                    f"Segment: {session['data']['segment']}\n"
-                    f"Teknisi 1: {session['data']['teknisi_1']}\n"
-                    f"Teknisi 2: {session['data']['teknisi_2']}\n"
-                    f"STO: {session['data']['sto']}\n"
-                    f"Valins ID: {session['data']['valins_id']}"
-                    f"{photo_info}\n"
-                    f"Pilih tindakan:"
-                )
+                # Hapus dari session
+                if 'photos' in session:
+                    session['photos'] = [p for p in session['photos'] if p['id'] != last_photo['id']]
+                    self.session_service.update_session(user_id, {'photos': session['photos']})
                 
-                keyboard = [
-                    [KeyboardButton("✅ Kirim Laporan"), KeyboardButton("📝 Edit Data")],
-                    [KeyboardButton("📷 Upload Foto Eviden"), KeyboardButton("❌ Batalkan")]
-                ]
-                reply_markup = ReplyKeyboardMarkup(keyboard, resize_keyboard=True)
+                await update.message.reply_text("🗑️ Foto berhasil dihapus!")
                 
-                await update.message.reply_text(confirmation_text, reply_markup=reply_markup)
-                return CONFIRM_DATA
+            except Exception as e:
+                logger.error(f"❌ Error deleting photo: {e}")
+                await update.message.reply_text("❌ Terjadi kesalahan saat menghapus foto.")
         
-        # Handle pilihan awal dan navigasi
-        if message_text == "🔙 Kembali ke Konfirmasi":
-            # Kembali ke konfirmasi data
-            session = self.session_service.get_session(user_id)
-            if not session:
-                await update.message.reply_text("❌ Session error. Silakan /start ulang.")
-                return ConversationHandler.END
-                
-            photo_info = ""
-            if session.get('photos'):
-                photo_info = f"\n📷 Foto Terupload: {len(session['photos'])} foto\n"
-                for i, photo in enumerate(session['photos'], 1):
-                    photo_info += f"   {i}. {photo['name']}\n"
-            else:
-                photo_info = "\n📷 Foto Eviden: Belum ada foto terupload\n"
-            
-            confirmation_text = (
-                f"✅ Konfirmasi Data Laporan\n\n"
-                f"Report Type: {session['data']['report_type']}\n"
-                f"ID Ticket: {session['data']['id_ticket']}\n"
-                f"Customer Name: {session['data']['customer_name']}\n"
-                f"Service No: {session['data']['service_no']}\n"
-                f"Segment: {session['data']['segment']}\n"
-                f"Teknisi 1: {session['data']['teknisi_1']}\n"
-                f"Teknisi 2: {session['data']['teknisi_2']}\n"
-                f"STO: {session['data']['sto']}\n"
-                f"Valins ID: {session['data']['valins_id']}"
-                f"{photo_info}\n"
-                f"Pilih tindakan:"
-            )
-            
-            keyboard = [
-                [KeyboardButton("✅ Kirim Laporan"), KeyboardButton("📝 Edit Data")],
-                [KeyboardButton("📷 Upload Foto Eviden"), KeyboardButton("❌ Batalkan")]
-            ]
-            reply_markup = ReplyKeyboardMarkup(keyboard, resize_keyboard=True)
-            
-            await update.message.reply_text(confirmation_text, reply_markup=reply_markup)
-            return CONFIRM_DATA
-    
-        elif message_text == "🗑️ Hapus Semua & Upload Ulang":
-            # Hapus semua foto yang sudah diupload
-            session = self.session_service.get_session(user_id)
-            if session and session.get('photos'):
-                try:
-                    # Hapus foto dari Drive
-                    for photo in session['photos']:
-                        try:
-                            self.google_service.service_drive.files().delete(fileId=photo['id']).execute()
-                            logger.info(f"🗑️ Deleted photo: {photo['name']}")
-                        except Exception as e:
-                            logger.error(f"❌ Error deleting photo {photo['name']}: {e}")
-                    
-                    # Hapus dari session
-                    self.session_service.update_session(user_id, {'photos': []})
-                    
-                    await update.message.reply_text("🗑️ Semua foto berhasil dihapus!")
-                    
-                except Exception as e:
-                    logger.error(f"❌ Error deleting photos: {e}")
-                    await update.message.reply_text("❌ Terjadi kesalahan saat menghapus foto.")
-            
-            # Kembali ke pilihan upload awal (tanpa opsi hapus karena sudah tidak ada foto)
-            keyboard = [
-                [KeyboardButton("🔸 Upload Satu-Satu (Custom Nama)")],
-                [KeyboardButton("📷 Upload Banyak (Auto Nama)")],
-                [KeyboardButton("🔙 Kembali ke Konfirmasi")]
-            ]
-            
-            await update.message.reply_text(
-                "📷 **Upload Foto Eviden**\n\n"
-                "⚡ **PENTING - Cara Upload Foto:**\n"
-                "• **Satu foto**: Kirim 1 foto → input deskripsi custom\n"
-                "• **Beberapa foto sekaligus**: Deskripsi akan otomatis random (foto_1, foto_2, dst)\n\n"
-                "🔧 **Pilih metode upload:**",
-                reply_markup=ReplyKeyboardMarkup(keyboard, resize_keyboard=True)
-            )
-            return UPLOAD_PHOTO
-    
-        elif message_text == "🔸 Upload Satu-Satu (Custom Nama)":
-            # Set mode upload satu-satu
-            context.user_data['upload_mode'] = 'single'
-            
-            # Cek apakah sudah ada foto
-            session = self.session_service.get_session(user_id)
-            has_photos = session.get('photos') and len(session['photos']) > 0
-            
-            if has_photos:
-                keyboard = [
-                    [KeyboardButton("✅ Selesai Upload")],
-                    [KeyboardButton("🗑️ Hapus Semua & Upload Ulang")],
-                    [KeyboardButton("🔙 Kembali ke Konfirmasi")]
-                ]
-            else:
-                keyboard = [
-                    [KeyboardButton("🔙 Kembali ke Konfirmasi")]
-                ]
-            
-            await update.message.reply_text(
-                "🔸 **Mode Upload Satu-Satu**\n\n"
-                "Kirimkan foto satu per satu. Setiap foto akan diminta deskripsi custom.\n\n"
-                "Kirimkan foto pertama:",
-                reply_markup=ReplyKeyboardMarkup(keyboard, resize_keyboard=True)
-            )
-            return UPLOAD_PHOTO
-            
-        elif message_text == "📷 Upload Banyak (Auto Nama)":
-            # Set mode upload banyak
-            context.user_data['upload_mode'] = 'multiple'
-            
-            # Cek apakah sudah ada foto
-            session = self.session_service.get_session(user_id)
-            has_photos = session.get('photos') and len(session['photos']) > 0
-            
-            if has_photos:
-                keyboard = [
-                    [KeyboardButton("✅ Selesai Upload")],
-                    [KeyboardButton("🗑️ Hapus Semua & Upload Ulang")],
-                    [KeyboardButton("🔙 Kembali ke Konfirmasi")]
-                ]
-            else:
-                keyboard = [
-                    [KeyboardButton("🔙 Kembali ke Konfirmasi")]
-                ]
-            
-            await update.message.reply_text(
-                "📷 **Mode Upload Banyak**\n\n"
-                "Kirimkan beberapa foto sekaligus. Nama file akan otomatis: foto_1, foto_2, dst.\n\n"
-                "Kirimkan foto-foto Anda:",
-                reply_markup=ReplyKeyboardMarkup(keyboard, resize_keyboard=True)
-            )
-            return UPLOAD_PHOTO
+        await update.message.reply_text(
+            "Kirimkan foto lagi atau pilih opsi:",
+            reply_markup=upload_keyboard(session.get('photos') if session else None)
+        )
+        return UPLOAD_PHOTO
+
+    async def _action_back_to_upload(self, update, context):
+        """Drop pending photo and return to single upload mode"""
+        context.user_data.pop('temp_photo', None)
+        session = self.session_service.get_session(update.effective_user.id)
+        await update.message.reply_text(SINGLE_MODE_AGAIN_TEXT, reply_markup=upload_keyboard(session.get('photos')))
+        return UPLOAD_PHOTO
+
+    async def upload_photo(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Handle photo upload state - FIXED VERSION with better controls"""
+        # Tombol: satu lookup di tabel routing, sisanya jalur foto/teks bebas
+        submode = CONFIRMING_PHOTO if context.user_data.get('confirming_single_photo') else None
+        next_state = await self._dispatch(UPLOAD_PHOTO, update, context, submode)
+        if next_state is not None:
+            return next_state
         
-        elif message_text == "✅ Selesai Upload":
-            # Reset upload mode
-            if 'upload_mode' in context.user_data:
-                del context.user_data['upload_mode']
-            
-            # Kembali ke konfirmasi data dengan info foto terbaru
-            session = self.session_service.get_session(user_id)
-            if not session:
-                await update.message.reply_text("❌ Session error. Silakan /start ulang.")
-                return ConversationHandler.END
-                
-            photo_info = ""
-            if session.get('photos'):
-                photo_info = f"\n📷 Foto Terupload: {len(session['photos'])} foto\n"
-                for i, photo in enumerate(session['photos'], 1):
-                    photo_info += f"   {i}. {photo['name']}\n"
-            else:
-                photo_info = "\n📷 Foto Eviden: Belum ada foto terupload\n"
-            
-            confirmation_text = (
-                f"✅ Konfirmasi Data Laporan\n\n"
-                f"Report Type: {session['data']['report_type']}\n"
-                f"ID Ticket: {session['data']['id_ticket']}\n"
-                f"Customer Name: {session['data']['customer_name']}\n"
-                f"Service No: {session['data']['service_no']}\n"
-                f"Segment: {session['data']['segment']}\n"
-                f"Teknisi 1: {session['data']['teknisi_1']}\n"
-                f"Teknisi 2: {session['data']['teknisi_2']}\n"
-                f"STO: {session['data']['sto']}\n"
-                f"Valins ID: {session['data']['valins_id']}"
-                f"{photo_info}\n"
-                f"Pilih tindakan:"
-            )
-            
-            keyboard = [
-                [KeyboardButton("✅ Kirim Laporan"), KeyboardButton("📝 Edit Data")],
-                [KeyboardButton("📷 Upload Foto Eviden"), KeyboardButton("❌ Batalkan")]
-            ]
-            reply_markup = ReplyKeyboardMarkup(keyboard, resize_keyboard=True)
-            
-            await update.message.reply_text(confirmation_text, reply_markup=reply_markup)
-            return CONFIRM_DATA
-    
-        elif message_text == "❌ Batalkan":
-            # Reset upload mode
-            if 'upload_mode' in context.user_data:
-                del context.user_data['upload_mode']
-            self.delete_folder_if_exists(user_id)
-            self.session_service.end_session(user_id)
-            await update.message.reply_text(
-                "❌ Laporan dibatalkan.",
-                reply_markup=ReplyKeyboardMarkup([[KeyboardButton("/start")]], resize_keyboard=True)
-            )
-            return ConversationHandler.END
+        user_id = update.effective_user.id
         
         # Handle photo message
         if update.message.photo:
@@ -787,15 +926,22 @@ class TelegramBot:
             if upload_mode == 'single':
                 # Mode upload satu-satu - minta deskripsi
                 photo = update.message.photo[-1]
-                context.user_data['temp_photo'] = photo
                 
-                await update.message.reply_text(
-                    "📝 Masukkan deskripsi untuk foto ini (akan digunakan sebagai nama file):\n\n"
-                    "Contoh: 'foto sebelum perbaikan', 'hasil instalasi', dll",
-                    reply_markup=ReplyKeyboardMarkup([
-                        [KeyboardButton("🔙 Kembali ke Upload")]
-                    ], resize_keyboard=True)
+                # Cek duplikat sebelum minta deskripsi (tanpa download)
+                session = self.session_service.get_session(user_id)
+                duplicate = self.photo_dedup.lookup_unique_id(
+                    session.get('folder_id') if session else None, photo.file_unique_id
                 )
+                if duplicate:
+                    await update.message.reply_text(
+                        f"⚠️ Foto ini sudah pernah diupload sebagai '{duplicate['name']}'. Foto dilewati.\n\n"
+                        f"Kirimkan foto lain atau pilih opsi."
+                    )
+                    return UPLOAD_PHOTO
+                
+                context.user_data['temp_photo'] = photo
+                
+                await update.message.reply_text(PHOTO_DESC_PROMPT, reply_markup=KEYBOARD_PHOTO_DESC)
                 return INPUT_PHOTO_DESC
             
             elif upload_mode == 'multiple':
@@ -804,7 +950,7 @@ class TelegramBot:
                 if not session or not session.get('folder_id'):
                     await update.message.reply_text(
                         "❌ Session tidak valid. Silakan mulai ulang.",
-                        reply_markup=ReplyKeyboardMarkup([[KeyboardButton("/start")]], resize_keyboard=True)
+                        reply_markup=KEYBOARD_START
                     )
                     return ConversationHandler.END
                 
@@ -814,36 +960,25 @@ class TelegramBot:
                 processing_msg = await update.message.reply_text("⏳ Mengupload foto...")
                 
                 try:
-                    # Get file info
-                    file = await context.bot.get_file(photo.file_id)
-                    
                     # Generate nama otomatis
                     photo_count = len(session.get('photos', [])) + 1
                     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
                     filename = f"foto_{photo_count}_{timestamp}.jpg"
-                    filepath = f"temp_{filename}"
-                    
-                    # Download file
-                    await file.download_to_drive(filepath)
-                    
-                    # Check if file was downloaded properly
-                    if not os.path.exists(filepath):
-                        raise Exception("File download failed")
-                    
-                    file_size = os.path.getsize(filepath)
-                    if file_size == 0:
-                        raise Exception("Downloaded file is empty")
                     
-                    logger.info(f"📥 File downloaded: {filename} ({file_size} bytes)")
-                    
-                    # Upload to Drive using new strategy
-                    file_id = self.google_service.upload_to_drive(filepath, filename, session['folder_id'])
-                    
-                    # Clean up local file
-                    if os.path.exists(filepath):
-                        os.remove(filepath)
+                    # Download dan upload ke Drive (dibatasi byte budget)
+                    file_id, duplicate = await self._download_and_upload_photo(
+                        context, photo, filename, session['folder_id']
+                    )
                     
-                    if file_id:
+                    if duplicate:
+                        # Foto sama sudah ada di folder laporan ini
+                        await context.bot.edit_message_text(
+                            chat_id=update.effective_chat.id,
+                            message_id=processing_msg.message_id,
+                            text=f"⚠️ Foto ini sudah pernah diupload sebagai '{duplicate['name']}'. Foto dilewati.\n\n"
+                                 f"📷 Total foto terupload: {len(session.get('photos', []))}"
+                        )
+                    elif file_id:
                         # Initialize photos list if not exists
                         if 'photos' not in session:
                             session['photos'] = []
@@ -857,13 +992,6 @@ class TelegramBot:
                         # Update session
                         self.session_service.update_session(user_id, {'photos': session['photos']})
                         
-                        # Update keyboard dengan tombol selesai upload
-                        keyboard = [
-                            [KeyboardButton("✅ Selesai Upload")],
-                            [KeyboardButton("🗑️ Hapus Semua & Upload Ulang")],
-                            [KeyboardButton("🔙 Kembali ke Konfirmasi")]
-                        ]
-                        
                         # Update processing message with success
                         await context.bot.edit_message_text(
                             chat_id=update.effective_chat.id,
@@ -873,11 +1001,8 @@ class TelegramBot:
                                  f"Kirim foto lain atau pilih opsi:"
                         )
                         
-                        # Send new keyboard
-                        await update.message.reply_text(
-                            "Pilih tindakan:",
-                            reply_markup=ReplyKeyboardMarkup(keyboard, resize_keyboard=True)
-                        )
+                        # Keyboard dengan tombol selesai upload
+                        await update.message.reply_text(CHOOSE_ACTION_TEXT, reply_markup=KEYBOARD_UPLOADING)
                     else:
                         # Update processing message with error
                         await context.bot.edit_message_text(
@@ -889,13 +1014,6 @@ class TelegramBot:
                 except Exception as e:
                     logger.error(f"❌ Error uploading photo: {e}")
                     
-                    # Clean up local file if exists
-                    try:
-                        if os.path.exists(filepath):
-                            os.remove(filepath)
-                    except:
-                        pass
-                    
                     # Update processing message with error
                     try:
                         await context.bot.edit_message_text(
@@ -927,40 +1045,15 @@ class TelegramBot:
         user_id = update.effective_user.id
         description = update.message.text.strip()
         
-        if description == "🔙 Kembali ke Upload":
-            # Clear temp photo dan kembali ke upload mode single
-            if 'temp_photo' in context.user_data:
-                del context.user_data['temp_photo']
-            
-            # Kembali ke upload mode single
-            session = self.session_service.get_session(user_id)
-            has_photos = session.get('photos') and len(session['photos']) > 0
-            
-            if has_photos:
-                keyboard = [
-                    [KeyboardButton("✅ Selesai Upload")],
-                    [KeyboardButton("🗑️ Hapus Semua & Upload Ulang")],
-                    [KeyboardButton("🔙 Kembali ke Konfirmasi")]
-                ]
-            else:
-                keyboard = [
-                    [KeyboardButton("🔙 Kembali ke Konfirmasi")]
-                ]
-            
-            await update.message.reply_text(
-                "🔸 **Mode Upload Satu-Satu**\n\n"
-                "Kirimkan foto satu per satu. Setiap foto akan diminta deskripsi custom.\n\n"
-                "Kirimkan foto:",
-                reply_markup=ReplyKeyboardMarkup(keyboard, resize_keyboard=True)
-            )
-            return UPLOAD_PHOTO
+        next_state = await self._dispatch(INPUT_PHOTO_DESC, update, context)
+        if next_state is not None:
+            return next_state
         
         if not description:
             await update.message.reply_text("Deskripsi tidak boleh kosong. Silakan masukkan deskripsi foto:")
             return INPUT_PHOTO_DESC
         
         # Clean description untuk nama file
-        import re
         clean_desc = re.sub(r'[^\w\s-]', '', description).strip()
         clean_desc = re.sub(r'[\s]+', '_', clean_desc)
         
@@ -973,31 +1066,30 @@ class TelegramBot:
             processing_msg = await update.message.reply_text("⏳ Mengupload foto...")
             
             try:
-                file = await context.bot.get_file(temp_photo.file_id)
-                
                 timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
                 filename = f"{clean_desc}_{timestamp}.jpg"
-                filepath = f"temp_{filename}"
-                
-                # Download file
-                await file.download_to_drive(filepath)
-                
-                # Check if file was downloaded properly
-                if not os.path.exists(filepath):
-                    raise Exception("File download failed")
-                
-                file_size = os.path.getsize(filepath)
-                if file_size == 0:
-                    raise Exception("Downloaded file is empty")
-                
-                logger.info(f"📥 File downloaded: {filename} ({file_size} bytes)")
                 
-                # Upload to Drive using new strategy
-                file_id = self.google_service.upload_to_drive(filepath, filename, session['folder_id'])
+                # Download dan upload ke Drive (dibatasi byte budget)
+                file_id, duplicate = await self._download_and_upload_photo(
+                    context, temp_photo, filename, session['folder_id']
+                )
                 
-                # Clean up local file
-                if os.path.exists(filepath):
-                    os.remove(filepath)
+                if duplicate:
+                    # Foto sama sudah ada di folder laporan ini
+                    if 'temp_photo' in context.user_data:
+                        del context.user_data['temp_photo']
+                    
+                    await context.bot.edit_message_text(
+                        chat_id=update.effective_chat.id,
+                        message_id=processing_msg.message_id,
+                        text=f"⚠️ Foto ini sudah pernah diupload sebagai '{duplicate['name']}'. Foto dilewati."
+                    )
+                    
+                    await update.message.reply_text(
+                        "Kirimkan foto lain atau pilih opsi:",
+                        reply_markup=upload_keyboard(session.get('photos'))
+                    )
+                    return UPLOAD_PHOTO
                 
                 if file_id:
                     # Initialize photos list if not exists
@@ -1028,15 +1120,7 @@ class TelegramBot:
                     )
                     
                     # Tampilkan opsi konfirmasi
-                    keyboard = [
-                        [KeyboardButton("✅ Benar, Lanjut Upload"), KeyboardButton("❌ Salah, Hapus Foto Ini")],
-                        [KeyboardButton("🏁 Selesai Upload"), KeyboardButton("🔙 Kembali ke Konfirmasi")]
-                    ]
-                    
-                    await update.message.reply_text(
-                        "Pilih tindakan:",
-                        reply_markup=ReplyKeyboardMarkup(keyboard, resize_keyboard=True)
-                    )
+                    await update.message.reply_text(CHOOSE_ACTION_TEXT, reply_markup=KEYBOARD_PHOTO_CHECK)
                     
                     # Set flag untuk confirmation state
                     context.user_data['confirming_single_photo'] = True
@@ -1058,13 +1142,6 @@ class TelegramBot:
             except Exception as e:
                 logger.error(f"❌ Error uploading photo: {e}")
                 
-                # Clean up local file if exists
-                try:
-                    if os.path.exists(filepath):
-                        os.remove(filepath)
-                except:
-                    pass
-                
                 # Update processing message with error
                 try:
                     await context.bot.edit_message_text(
@@ -1079,12 +1156,74 @@ class TelegramBot:
         
         return INPUT_PHOTO_DESC
 
+    async def _download_and_upload_photo(self, context, photo, filename, folder_id):
+        """Download photo from Telegram and upload it to Drive within the photo byte budget.
+        
+        Returns (file_id, duplicate) - duplicate is the existing photo entry if the same
+        photo was already uploaded to this report folder.
+        """
+        # Foto album satu user diproses berurutan (lock per-user), tapi user lain yang
+        # upload bersamaan bisa memakai nama auto yang sama: prefix acak per file
+        filepath = f"temp_{uuid.uuid4().hex[:8]}_{filename}"
+        
+        # Cek duplikat dari file_unique_id dulu, tanpa download
+        duplicate = self.photo_dedup.lookup_unique_id(folder_id, photo.file_unique_id)
+        if duplicate:
+            return None, duplicate
+        
+        # Ukuran dari PhotoSize.file_size dipakai sebelum download dimulai
+        async with self.photo_budget.reserve(photo.file_size):
+            try:
+                # Get file info
+                file = await context.bot.get_file(photo.file_id)
+                
+                # Download file
+                await file.download_to_drive(filepath)
+                
+                # Check if file was downloaded properly
+                if not os.path.exists(filepath):
+                    raise Exception("File download failed")
+                
+                file_size = os.path.getsize(filepath)
+                if file_size == 0:
+                    raise Exception("Downloaded file is empty")
+                
+                logger.info(f"📥 File downloaded: {filename} ({file_size} bytes)")
+                
+                # Cek duplikat dari isi file (foto forward/kirim ulang)
+                digest = await asyncio.to_thread(self.photo_dedup.hash_file, filepath)
+                duplicate = self.photo_dedup.lookup_hash(folder_id, digest)
+                if duplicate:
+                    self.photo_dedup.add_alias(folder_id, photo.file_unique_id, duplicate)
+                    return None, duplicate
+                
+                # Perkecil resolusi & buang metadata (opsional, di process pool)
+                await self.image_processor.process(filepath)
+                
+                # Upload di thread executor dengan client Drive milik thread itu, supaya
+                # upload bisa paralel (dibatasi photo budget) dan event loop tidak tertahan
+                file_id = await asyncio.to_thread(self._upload_to_drive, filepath, filename, folder_id)
+                if file_id:
+                    self.photo_dedup.add(folder_id, photo.file_unique_id, digest, file_id, filename)
+                
+                return file_id, None
+                
+            finally:
+                # Clean up local file
+                if os.path.exists(filepath):
+                    os.remove(filepath)
+
+    def _upload_to_drive(self, filepath, filename, folder_id):
+        """Upload from an executor thread (httplib2 client per thread)"""
+        return self.google_service.thread_client().upload_to_drive(filepath, filename, folder_id)
+
     def delete_folder_if_exists(self, user_id):
         """Delete folder if session exists"""
         try:
             session = self.session_service.get_session(user_id)
             if session and session.get('folder_id'):
-                self.google_service.service_drive.files().delete(fileId=session['folder_id']).execute()
-                logger.info(f"🗑️ Folder deleted for user {user_id}")
+                if self.google_service.delete_file(session['folder_id']):
+                    self.photo_dedup.forget_folder(session['folder_id'])
+                    logger.info(f"🗑️ Folder deleted for user {user_id}")
         except Exception as e:
             logger.error(f"❌ Error deleting folder: {e}")
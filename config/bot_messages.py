@@ -0,0 +1,245 @@
+# config/bot_messages.py
+from functools import lru_cache
+
+from telegram import ReplyKeyboardMarkup, KeyboardButton
+
+# Label tombol
+BTN_NON_B2B = "Non B2B"
+BTN_BGES = "BGES"
+BTN_SQUAD = "Squad"
+BTN_START = "/start"
+BTN_CANCEL = "❌ Batalkan"
+BTN_SUBMIT = "✅ Kirim Laporan"
+BTN_EDIT = "📝 Edit Data"
+BTN_UPLOAD = "📷 Upload Foto Eviden"
+BTN_MODE_SINGLE = "🔸 Upload Satu-Satu (Custom Nama)"
+BTN_MODE_MULTIPLE = "📷 Upload Banyak (Auto Nama)"
+BTN_DELETE_ALL = "🗑️ Hapus Semua & Upload Ulang"
+BTN_BACK_TO_CONFIRM = "🔙 Kembali ke Konfirmasi"
+BTN_FINISH_UPLOAD = "✅ Selesai Upload"
+BTN_FINISH_UPLOAD_ALT = "🏁 Selesai Upload"
+BTN_PHOTO_OK = "✅ Benar, Lanjut Upload"
+BTN_PHOTO_WRONG = "❌ Salah, Hapus Foto Ini"
+BTN_BACK_TO_UPLOAD = "🔙 Kembali ke Upload"
+BTN_CONTINUE_DUPLICATE = "✅ Lanjutkan Tetap"
+
+REPORT_TYPE_LABELS = (BTN_NON_B2B, BTN_BGES, BTN_SQUAD)
+
+# Semua label tombol keyboard (tidak mengandung data pribadi)
+BUTTON_LABELS = (
+    BTN_NON_B2B, BTN_BGES, BTN_SQUAD,
+    BTN_CANCEL,
+    BTN_SUBMIT, BTN_EDIT, BTN_UPLOAD,
+    BTN_MODE_SINGLE, BTN_MODE_MULTIPLE,
+    BTN_DELETE_ALL, BTN_BACK_TO_CONFIRM,
+    BTN_FINISH_UPLOAD, BTN_FINISH_UPLOAD_ALT,
+    BTN_PHOTO_OK, BTN_PHOTO_WRONG,
+    BTN_BACK_TO_UPLOAD, BTN_CONTINUE_DUPLICATE
+)
+
+class StaticKeyboard(ReplyKeyboardMarkup):
+    """ReplyKeyboardMarkup built once at import, with its request payload serialized once"""
+
+    __slots__ = ('_payload',)
+
+    def __init__(self, rows):
+        super().__init__(
+            [[KeyboardButton(label) for label in row] for row in rows],
+            resize_keyboard=True
+        )
+        with self._unfrozen():
+            self._payload = super().to_dict()
+
+    def to_dict(self, recursive=True):
+        # Dipakai PTB saat membangun request; dict hanya dibaca lalu di-json-kan
+        if recursive:
+            return self._payload
+        return super().to_dict(recursive=recursive)
+
+KEYBOARD_REPORT_TYPE = StaticKeyboard([[BTN_NON_B2B, BTN_BGES], [BTN_SQUAD]])
+KEYBOARD_CANCEL = StaticKeyboard([[BTN_CANCEL]])
+KEYBOARD_START = StaticKeyboard([[BTN_START]])
+KEYBOARD_CONFIRM = StaticKeyboard([
+    [BTN_SUBMIT, BTN_EDIT],
+    [BTN_UPLOAD, BTN_CANCEL]
+])
+KEYBOARD_UPLOAD_MODE = StaticKeyboard([
+    [BTN_MODE_SINGLE],
+    [BTN_MODE_MULTIPLE],
+    [BTN_BACK_TO_CONFIRM]
+])
+KEYBOARD_UPLOAD_MODE_WITH_DELETE = StaticKeyboard([
+    [BTN_MODE_SINGLE],
+    [BTN_MODE_MULTIPLE],
+    [BTN_DELETE_ALL],
+    [BTN_BACK_TO_CONFIRM]
+])
+KEYBOARD_UPLOADING = StaticKeyboard([
+    [BTN_FINISH_UPLOAD],
+    [BTN_DELETE_ALL],
+    [BTN_BACK_TO_CONFIRM]
+])
+KEYBOARD_BACK_TO_CONFIRM = StaticKeyboard([[BTN_BACK_TO_CONFIRM]])
+KEYBOARD_PHOTO_DESC = StaticKeyboard([[BTN_BACK_TO_UPLOAD]])
+KEYBOARD_DUPLICATE_TICKET = StaticKeyboard([[BTN_CONTINUE_DUPLICATE], [BTN_CANCEL]])
+KEYBOARD_PHOTO_CHECK = StaticKeyboard([
+    [BTN_PHOTO_OK, BTN_PHOTO_WRONG],
+    [BTN_FINISH_UPLOAD_ALT, BTN_BACK_TO_CONFIRM]
+])
+
+def upload_keyboard(photos):
+    """Keyboard while uploading: finish/delete options only once photos exist"""
+    return KEYBOARD_UPLOADING if photos else KEYBOARD_BACK_TO_CONFIRM
+
+def upload_mode_keyboard(photos):
+    """Upload method keyboard, with delete-all option once photos exist"""
+    return KEYBOARD_UPLOAD_MODE_WITH_DELETE if photos else KEYBOARD_UPLOAD_MODE
+
+# Template pesan
+PHOTO_LIST_HEADER = "📷 Foto Terupload: {count} foto\n"
+NO_PHOTOS_INFO = "📷 Foto Eviden: Belum ada foto terupload\n"
+
+# Baris field form di bawah header ini dibangun dari SpreadsheetConfig.form_fields
+FORM_CREATED_HEADER = (
+    "✅ Format Berhasil Dibuat\n\n"
+    "Report Type : {report_type}\n"
+    "ID Ticket : {id_ticket}\n"
+    "Folder Drive : {folder_link}\n"
+    "-------------------------------------------------------------\n"
+    "Salin Format Laporan dan isi dibawah ini :\n\n"
+)
+FORM_EDIT_HEADER = (
+    "📝 Edit Data Laporan\n\n"
+    "Report Type : {report_type}\n"
+    "ID Ticket : {id_ticket}\n"
+    "Folder Drive : {folder_link}\n"
+    "-------------------------------------------------------------\n"
+    "Salin Format Laporan dan edit dibawah ini :\n\n"
+)
+CONFIRMATION_HEADER = (
+    "✅ Konfirmasi Data Laporan\n\n"
+    "Report Type: {report_type}\n"
+    "ID Ticket: {id_ticket}\n"
+)
+
+UPLOAD_METHOD_TEXT = (
+    "📷 **Upload Foto Eviden**\n\n"
+    "⚡ **PENTING - Cara Upload Foto:**\n"
+    "• **Satu foto**: Kirim 1 foto → input deskripsi custom\n"
+    "• **Beberapa foto sekaligus**: Deskripsi akan otomatis random (foto_1, foto_2, dst)\n\n"
+    "🔧 **Pilih metode upload:**"
+)
+SINGLE_MODE_TEXT = (
+    "🔸 **Mode Upload Satu-Satu**\n\n"
+    "Kirimkan foto satu per satu. Setiap foto akan diminta deskripsi custom.\n\n"
+    "Kirimkan foto pertama:"
+)
+SINGLE_MODE_AGAIN_TEXT = (
+    "🔸 **Mode Upload Satu-Satu**\n\n"
+    "Kirimkan foto satu per satu. Setiap foto akan diminta deskripsi custom.\n\n"
+    "Kirimkan foto:"
+)
+MULTIPLE_MODE_TEXT = (
+    "📷 **Mode Upload Banyak**\n\n"
+    "Kirimkan beberapa foto sekaligus. Nama file akan otomatis: foto_1, foto_2, dst.\n\n"
+    "Kirimkan foto-foto Anda:"
+)
+PHOTO_DESC_PROMPT = (
+    "📝 Masukkan deskripsi untuk foto ini (akan digunakan sebagai nama file):\n\n"
+    "Contoh: 'foto sebelum perbaikan', 'hasil instalasi', dll"
+)
+DUPLICATE_TICKET_TEXT = (
+    "⚠️ ID Ticket {id_ticket} sudah pernah dilaporkan{location}.\n\n"
+    "Tekan \"✅ Lanjutkan Tetap\" untuk tetap membuat laporan, atau masukkan ID Ticket lain:"
+)
+SEARCH_USAGE_TEXT = (
+    "🔍 Gunakan: /cari <kata kunci>\n\n"
+    "Bisa mencari ID Ticket, nama customer, service no, STO atau nama teknisi.\n"
+    "Contoh: /cari INC123 atau /cari budi sto kbl"
+)
+SEARCH_LOADING_TEXT = "⏳ Data laporan sedang dimuat, coba lagi sebentar."
+REKAP_USAGE_TEXT = "📊 Gunakan: /rekap hari atau /rekap bulan"
+REPORT_QUERY_DENIED_TEXT = "⛔ Perintah ini hanya untuk pengguna yang terdaftar."
+CANCELLED_TEXT = "❌ Laporan dibatalkan."
+SESSION_ERROR_TEXT = "❌ Session error. Silakan /start ulang."
+CHOOSE_ACTION_TEXT = "Pilih tindakan:"
+
+def render_form_errors(errors):
+    """All form errors in one reply"""
+    lines = ["❌ Data belum lengkap/valid:"]
+    lines.extend(f"• {error}" for error in errors)
+    lines.append("\nSilakan kirim ulang format yang sudah diisi dengan lengkap.")
+    return '\n'.join(lines)
+
+def render_search_results(query, total, results):
+    """/cari reply: matching reports, newest first"""
+    if not total:
+        return f"🔍 Tidak ada laporan yang cocok dengan \"{query}\"."
+    lines = [f"🔍 {total} laporan cocok dengan \"{query}\":"]
+    for i, report in enumerate(results, 1):
+        lines.append(
+            f"\n{i}. {report['id_ticket']} - {report['customer_name'] or '-'} ({report['report_type'] or '-'})\n"
+            f"   Service No: {report['service_no'] or '-'} | STO: {report['sto'] or '-'}\n"
+            f"   Teknisi: {report['teknisi_1'] or '-'} / {report['teknisi_2'] or '-'}\n"
+            f"   Dilaporkan: {report['reported'] or '-'} ({report['location']})"
+        )
+    if total > len(results):
+        lines.append(f"\n... dan {total - len(results)} laporan lainnya. Persempit kata kunci.")
+    return '\n'.join(lines)
+
+def _format_duration(seconds):
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}j {minutes}m" if hours else f"{minutes}m {seconds}d"
+
+def render_rekap(summary):
+    """/rekap reply: counts per report type, STO, segment and technician"""
+    title = "Harian" if summary['period'] == 'hari' else "Bulanan"
+    lines = [f"📊 Rekap {title} {summary['label']}", f"Total laporan: {summary['total']}"]
+    sections = (
+        ("📝 Jenis Laporan", summary['report_type']),
+        ("🏢 STO", summary['sto']),
+        ("🔖 Segment", summary['segment']),
+        ("👷 Teknisi", summary['teknisi'])
+    )
+    for header, counts in sections:
+        if counts:
+            lines.append(f"\n{header}:")
+            lines.extend(f"• {name}: {count}" for name, count in counts)
+    turnaround = summary['turnaround']
+    if turnaround:
+        lines.append(
+            f"\n⏱️ Rata-rata waktu pengisian: {_format_duration(turnaround['average_seconds'])} "
+            f"({turnaround['reports']} laporan lewat bot)"
+        )
+    return '\n'.join(lines)
+
+def render_photo_list(photos):
+    """Numbered list of uploaded photos, rendered with a single join"""
+    if not photos:
+        return NO_PHOTOS_INFO
+    lines = [PHOTO_LIST_HEADER.format(count=len(photos))]
+    lines.extend(f"   {i}. {photo['name']}\n" for i, photo in enumerate(photos, 1))
+    return ''.join(lines)
+
+@lru_cache(maxsize=None)
+def _form_template(header, form_fields, separator, filled):
+    """Header plus one 'Label<separator>{key}' line per form field, built once per schema"""
+    lines = (f"{field.header}{separator}" + (f"{{{field.key}}}" if filled else '') for field in form_fields)
+    return header + '\n'.join(lines)
+
+def render_form_created(form_fields, report_type, id_ticket, folder_link):
+    """Blank report form sent after the Drive folder is created"""
+    return _form_template(FORM_CREATED_HEADER, tuple(form_fields), ' : ', False).format(
+        report_type=report_type, id_ticket=id_ticket, folder_link=folder_link
+    )
+
+def render_form_edit(form_fields, report_data):
+    """Report form filled with the current values, to copy and edit"""
+    return _form_template(FORM_EDIT_HEADER, tuple(form_fields), ' : ', True).format_map(report_data)
+
+def render_confirmation(form_fields, report_data, photos):
+    """Report confirmation text with uploaded photo list"""
+    # Template per skema di-cache, per update cukup satu format_map
+    fields = _form_template(CONFIRMATION_HEADER, tuple(form_fields), ': ', True).format_map(report_data)
+    return f"{fields}\n{render_photo_list(photos)}\nPilih tindakan:"
@@ -0,0 +1,62 @@
+# config/report_form.py
+import re
+
+# Spasi, titik, garis bawah dan strip diabaikan saat mencocokkan label
+_LABEL_NOISE = re.compile(r'[\s._\-]+')
+
+def normalize_label(label):
+    """'  teknisi_1 ' -> 'teknisi1'"""
+    return _LABEL_NOISE.sub('', label).lower()
+
+class ReportFormParser:
+    """Report form parser compiled once from SpreadsheetConfig.form_fields"""
+
+    def __init__(self, spreadsheet_config):
+        self.fields = spreadsheet_config.form_fields
+        self._lookup = {}
+        for field in self.fields:
+            for label in (field.header,) + tuple(field.aliases):
+                normalized = normalize_label(label)
+                if normalized in self._lookup and self._lookup[normalized] is not field:
+                    raise ValueError(f"Form label '{label}' is used by more than one field")
+                self._lookup[normalized] = field
+        # Label persis seperti di format dicocokkan tanpa normalisasi
+        self._exact = {field.header: field for field in self.fields}
+
+    def _field_for(self, label):
+        field = self._exact.get(label)
+        if field is None:
+            field = self._lookup.get(normalize_label(label))
+        return field
+
+    def parse(self, text):
+        """Parse form text; returns (values by field key, list of error messages)"""
+        values = {}
+        errors = []
+        for line in (text or '').split('\n'):
+            label, separator, value = line.partition(':')
+            if not separator:
+                continue
+            field = self._field_for(label.strip())
+            # Baris lain (Report Type, Folder Drive, ...) dari format diabaikan
+            if field is None or field.key in values:
+                continue
+            values[field.key] = value.strip()
+
+        missing = []
+        for field in self.fields:
+            value = values.get(field.key, '')
+            if not value:
+                values[field.key] = ''
+                if field.required:
+                    missing.append(field.header)
+                continue
+            if field.validator:
+                try:
+                    values[field.key] = field.validator(value)
+                except ValueError as e:
+                    errors.append(f"{field.header}: {e}")
+
+        if missing:
+            errors.insert(0, f"Field berikut harus diisi: {', '.join(missing)}")
+        return values, errors
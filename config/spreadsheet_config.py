@@ -1,7 +1,63 @@
 # config/spreadsheet_config.py
 import os
+import re
 from datetime import datetime
 
+def column_index(letter):
+    """Column letter to 0-based index (A -> 0, AA -> 26)"""
+    index = 0
+    for char in letter.upper():
+        index = index * 26 + (ord(char) - ord('A') + 1)
+    return index - 1
+
+def column_letter(index):
+    """0-based index to column letter"""
+    letter = ''
+    index += 1
+    while index:
+        index, remainder = divmod(index - 1, 26)
+        letter = chr(ord('A') + remainder) + letter
+    return letter
+
+def a1_sheet(sheet_name):
+    """Sheet name as used in A1 notation (quoted unless plain letters/digits)"""
+    if re.fullmatch(r'\w+', sheet_name):
+        return sheet_name
+    return "'" + sheet_name.replace("'", "''") + "'"
+
+# Bagian nama tab partisi, urutan tetap: bulan dulu lalu report type (2026-10_BGES)
+PARTITION_KEYS = ('month', 'report_type')
+_INVALID_TAB_CHARS = re.compile(r"[\[\]*?:/\\']")
+
+_SERVICE_NO = re.compile(r'(?=[^\d]*\d)[\w./-]+')
+_STO = re.compile(r'[A-Z]{2,5}')
+
+def validate_service_no(value):
+    """Service No tanpa spasi dan mengandung angka"""
+    value = value.replace(' ', '')
+    if not _SERVICE_NO.fullmatch(value):
+        raise ValueError("harus berupa nomor layanan (angka, tanpa spasi)")
+    return value
+
+def validate_sto(value):
+    """Kode STO huruf, disimpan kapital"""
+    value = value.strip().upper()
+    if not _STO.fullmatch(value):
+        raise ValueError("harus kode STO 2-5 huruf (contoh: BJM)")
+    return value
+
+class ReportField:
+    """One sheet column; form fields also describe how technicians type it"""
+
+    def __init__(self, header, key=None, form=False, required=False, aliases=(), validator=None):
+        self.header = header
+        self.key = key              # key di laporan_data (None = kolom dikosongkan)
+        self.form = form
+        self.required = required
+        self.aliases = aliases
+        self.validator = validator  # fungsi(value) -> value bersih, raise ValueError kalau salah
+        self.column = None
+
 class SpreadsheetConfig:
     def __init__(self):
         # Konfigurasi posisi tabel
@@ -9,31 +65,53 @@ class SpreadsheetConfig:
         self.table_start_col = "A"    # Kolom mulai 
         self.table_end_col = "U"      # Kolom terakhir (21 kolom: A-U)
         self.sheet_name = os.environ.get('SHEET_NAME', 'Sheet1')
+        # Partisi opsional: baris baru masuk ke tab per bulan dan/atau report type,
+        # sheet_name tetap dibaca (data lama) dan jadi template header tab baru
+        partition = [key.strip() for key in os.environ.get('SHEET_PARTITION', '').split(',') if key.strip()]
+        unknown = [key for key in partition if key not in PARTITION_KEYS]
+        if unknown:
+            raise ValueError(f"SHEET_PARTITION: unknown key(s) {', '.join(unknown)} (use {', '.join(PARTITION_KEYS)})")
+        self.partition_keys = [key for key in PARTITION_KEYS if key in partition]
         
-        # Konfigurasi header/kolom tabel
-        self.headers = [
-            "Report Type",          # A
-            "ID Ticket",            # B  
-            "Time",                 # C
-            "Reported",             # D
-            "Month",                # E
-            "Segmen",               # F
-            "Category",             # G
-            "Customer Name",        # H
-            "Service No",           # I
-            "Segment",              # J
-            "Teknisi 1",            # K
-            "Teknisi 2",            # L
-            "STO",                  # M
-            "Valins ID",            # N
-            "Service Type",         # O
-            "Status",               # P
-            "Resolve",              # Q
-            "Solution",             # R
-            "Job-ID",               # S
-            "Team",                 # T
-            "Foto Eviden",          # U
+        # Skema kolom tabel (urutan = urutan kolom A-U). Field dengan form=True diisi
+        # teknisi lewat format laporan; parser form dan prepare_row_data memakai skema ini
+        self.fields = [
+            ReportField("Report Type", 'report_type'),                          # A
+            ReportField("ID Ticket", 'id_ticket'),                              # B
+            ReportField("Time", 'time'),                                        # C (dari reported)
+            ReportField("Reported", 'reported'),                                # D
+            ReportField("Month", 'month'),                                      # E (otomatis)
+            ReportField("Segmen"),                                              # F (kosong)
+            ReportField("Category"),                                            # G (kosong)
+            ReportField("Customer Name", 'customer_name', form=True, required=True,
+                        aliases=("Nama Customer", "Nama Pelanggan", "Customer")),  # H
+            ReportField("Service No", 'service_no', form=True, required=True,
+                        aliases=("Service Number", "No Service", "No Layanan"),
+                        validator=validate_service_no),                         # I
+            ReportField("Segment", 'segment', form=True, required=True),        # J
+            ReportField("Teknisi 1", 'teknisi_1', form=True, required=True,
+                        aliases=("Teknisi",)),                                  # K
+            ReportField("Teknisi 2", 'teknisi_2', form=True, required=True),    # L
+            ReportField("STO", 'sto', form=True, required=True,
+                        validator=validate_sto),                                # M
+            ReportField("Valins ID", 'valins_id', form=True, required=True,
+                        aliases=("Valins", "ID Valins")),                       # N
+            ReportField("Service Type"),                                        # O (kosong)
+            ReportField("Status"),                                              # P (kosong)
+            ReportField("Resolve"),                                             # Q (kosong)
+            ReportField("Solution"),                                            # R (kosong)
+            ReportField("Job-ID"),                                              # S (kosong)
+            ReportField("Team"),                                                # T (kosong)
+            ReportField("Foto Eviden", 'folder_link'),                          # U (folder link)
         ]
+        for index, field in enumerate(self.fields):
+            field.column = column_letter(column_index(self.table_start_col) + index)
+        
+        self.headers = [field.header for field in self.fields]
+        self.form_fields = [field for field in self.fields if field.form]
+        self.row_keys = [field.key for field in self.fields]
+        self._time_index = self.row_keys.index('time')
+        self._month_index = self.row_keys.index('month')
         
         # Opsi report type
         self.report_type_options = {
@@ -41,19 +119,79 @@ class SpreadsheetConfig:
             'bges': 'BGES', 
             'squad': 'Squad'
         }
+        self._partition_tab_pattern = self._build_partition_tab_pattern()
+    
+    def _build_partition_tab_pattern(self):
+        parts = []
+        for key in self.partition_keys:
+            if key == 'month':
+                parts.append(r'\d{4}-\d{2}')
+            else:
+                names = (self.tab_title_part(name) for name in self.report_type_options.values())
+                parts.append('(?:' + '|'.join(re.escape(name) for name in names) + ')')
+        return re.compile('_'.join(parts)) if parts else None
     
-    def get_range(self, row_offset=0):
+    @staticmethod
+    def tab_title_part(value):
+        """Report value usable in a tab title"""
+        return _INVALID_TAB_CHARS.sub('', str(value)).strip() or '-'
+    
+    def partition_tab(self, laporan_data):
+        """Tab a report row goes to (sheet_name when partitioning is off)"""
+        if not self.partition_keys:
+            return self.sheet_name
+        parts = []
+        for key in self.partition_keys:
+            if key == 'month':
+                # Bulan dari tanggal Reported (dd/mm/YYYY ...), tanggal kirim kalau tidak terbaca
+                try:
+                    reported = datetime.strptime(laporan_data.get('reported', '')[:10], "%d/%m/%Y")
+                except ValueError:
+                    reported = datetime.now()
+                parts.append(reported.strftime("%Y-%m"))
+            else:
+                parts.append(self.tab_title_part(laporan_data.get('report_type', '')))
+        return '_'.join(parts)
+    
+    def is_partition_tab(self, title):
+        return self._partition_tab_pattern is not None and self._partition_tab_pattern.fullmatch(title) is not None
+    
+    def report_tabs(self, titles):
+        """Tabs holding report rows: sheet_name first, then partition tabs by name"""
+        tabs = [title for title in titles if title == self.sheet_name]
+        return tabs + sorted(title for title in titles if title != self.sheet_name and self.is_partition_tab(title))
+    
+    def tab_sort_key(self, tab):
+        """Sort key putting sheet_name (oldest data) before partition tabs"""
+        return (tab != self.sheet_name, tab)
+    
+    def describe_row(self, tab, row):
+        """Human readable location of a sheet row"""
+        if not self.partition_keys:
+            return f"baris {row}"
+        return f"baris {row} tab {tab}"
+    
+    def get_range(self, row_offset=0, sheet_name=None):
         """Get range string for spreadsheet operations"""
         start_row = self.table_start_row + row_offset
-        return f'{self.sheet_name}!{self.table_start_col}{start_row}:{self.table_end_col}{start_row}'
+        return f'{a1_sheet(sheet_name or self.sheet_name)}!{self.table_start_col}{start_row}:{self.table_end_col}{start_row}'
     
-    def get_column_range(self):
+    def get_column_range(self, sheet_name=None):
         """Get column range for reading all data"""
-        return f'{self.sheet_name}!{self.table_start_col}:{self.table_end_col}'
+        return f'{a1_sheet(sheet_name or self.sheet_name)}!{self.table_start_col}:{self.table_end_col}'
+    
+    def get_table_range(self, row_offset=0, sheet_name=None):
+        """Get range of all table columns from the table start (+row_offset) down"""
+        start_row = self.table_start_row + row_offset
+        return f'{a1_sheet(sheet_name or self.sheet_name)}!{self.table_start_col}{start_row}:{self.table_end_col}'
     
-    def get_append_range(self):
+    def get_header_range(self, sheet_name=None):
+        """Get range of the title/header rows above the table"""
+        return f'{a1_sheet(sheet_name or self.sheet_name)}!{self.table_start_col}1:{self.table_end_col}{self.table_start_row - 1}'
+    
+    def get_append_range(self, sheet_name=None):
         """Get range for appending data"""
-        return f'{self.sheet_name}!{self.table_start_col}:{self.table_end_col}'
+        return f'{a1_sheet(sheet_name or self.sheet_name)}!{self.table_start_col}:{self.table_end_col}'
     
     def prepare_row_data(self, laporan_data, row_number):
         """Prepare data row according to header configuration"""
@@ -70,29 +208,9 @@ class SpreadsheetConfig:
         # Auto-generate month
         current_month = datetime.now().strftime("%B")
         
-        # Prepare row data sesuai urutan header (21 kolom)
-        row_data = [
-            laporan_data.get('report_type', ''),           # A - Report Type
-            laporan_data.get('id_ticket', ''),             # B - ID Ticket  
-            time_part,                                      # C - Time
-            laporan_data.get('reported', ''),              # D - Reported
-            current_month,                                  # E - Month
-            '',                                             # F - Segmen (kosong)
-            '',                                             # G - Category (kosong)
-            laporan_data.get('customer_name', ''),         # H - Customer Name
-            laporan_data.get('service_no', ''),            # I - Service No
-            laporan_data.get('segment', ''),               # J - Segment
-            laporan_data.get('teknisi_1', ''),             # K - Teknisi 1
-            laporan_data.get('teknisi_2', ''),             # L - Teknisi 2
-            laporan_data.get('sto', ''),                   # M - STO
-            laporan_data.get('valins_id', ''),             # N - Valins ID
-            '',                                             # O - Service Type (kosong)
-            '',                                             # P - Status (kosong)
-            '',                                             # Q - Resolve (kosong)
-            '',                                             # R - Solution (kosong)
-            '',                                             # S - Job-ID (kosong)
-            '',                                             # T - Team (kosong)
-            laporan_data.get('folder_link', ''),           # U - Foto Eviden (folder link)
-        ]
+        # Prepare row data sesuai urutan skema (21 kolom), kolom tanpa key dikosongkan
+        row_data = [laporan_data.get(key, '') for key in self.row_keys]
+        row_data[self._time_index] = time_part
+        row_data[self._month_index] = current_month
         
         return row_data
@@ -0,0 +1,35 @@
+# gunicorn.conf.py - Worker setup for app.py
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '5000')}"
+timeout = 300
+
+# WEB_CONCURRENCY > 1: beberapa worker, state percakapan & session dibagi lewat
+# SQLite (BOT_STATE_DB) dan job latar belakang hanya di worker leader
+workers = int(os.environ.get('WEB_CONCURRENCY', '1'))
+
+# Multi-worker menunggu update selesai diproses sebelum menjawab webhook,
+# jadi tiap worker butuh beberapa thread request
+threads = int(os.environ.get('GUNICORN_THREADS', '8' if workers > 1 else '1'))
+
+# /export (EXPORT_TOKEN) men-stream file besar: di worker sync satu download
+# menahan satu-satunya thread (webhook ikut antre) dan dibunuh setelah timeout
+if os.environ.get('EXPORT_TOKEN') and threads < 4:
+    threads = 4
+
+worker_class = 'gthread' if threads > 1 else 'sync'
+
+# Jangan preload: thread event loop tidak ikut ter-fork, jadi tiap worker harus
+# import app.py sendiri (loop, bot dan Application per worker)
+preload_app = False
+
+# SIGTERM (Railway redeploy): worker berhenti menerima request lalu menguras
+# update yang sedang diproses; beri waktu lebih dari SHUTDOWN_TIMEOUT sebelum SIGKILL
+graceful_timeout = int(float(os.environ.get('SHUTDOWN_TIMEOUT', '25'))) + 10
+
+def worker_exit(server, worker):
+    """Drain in-flight updates and flush state before the worker process exits"""
+    import sys
+    app_module = sys.modules.get('app')
+    if app_module is not None:
+        app_module.shutdown()
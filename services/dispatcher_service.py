@@ -0,0 +1,306 @@
+# services/dispatcher_service.py
+import os
+import time
+import signal
+import queue
+import bisect
+import asyncio
+import hashlib
+import logging
+import threading
+import collections
+import multiprocessing
+
+from services.metrics_service import metrics
+from services.process_util import process_start_method
+
+logger = logging.getLogger(__name__)
+
+DISPATCH_QUEUE_DEPTH = metrics.gauge('dispatcher_queue_depth', 'Updates waiting in a worker IPC queue', ['worker'])
+DISPATCH_RESTARTS = metrics.counter('dispatcher_worker_restarts_total', 'Worker process restarts', ['worker'])
+DISPATCH_RESENT = metrics.counter(
+    'dispatcher_updates_resent_total',
+    'Updates resent to a restarted worker because the dead one never received them',
+    ['worker']
+)
+
+def _hash(value):
+    return int.from_bytes(hashlib.blake2b(value.encode(), digest_size=8).digest(), 'big')
+
+def update_user_key(data):
+    """User id of a raw webhook update (update_id if it has no sender)"""
+    for key in ('message', 'edited_message', 'callback_query', 'inline_query', 'my_chat_member'):
+        sender = (data.get(key) or {}).get('from')
+        if sender:
+            return sender.get('id')
+    return data.get('update_id')
+
+class HashRing:
+    """Consistent hash ring with virtual nodes"""
+
+    def __init__(self, nodes, vnodes=None):
+        if vnodes is None:
+            vnodes = int(os.environ.get('DISPATCH_VNODES', '128'))
+        points = sorted((_hash(f"{node}#{i}"), node) for node in nodes for i in range(vnodes))
+        self._points = [point for point, _ in points]
+        self._nodes = [node for _, node in points]
+
+    def node_for(self, key):
+        index = bisect.bisect(self._points, _hash(str(key)))
+        return self._nodes[index % len(self._nodes)]
+
+def _worker_main(index, workers, token, spreadsheet_id, conn, ready):
+    """Worker process: own event loop and Application, state only for users of its shard
+
+    Started via forkserver/spawn, so it imports everything itself and never
+    imports app.py (which starts a dispatcher at import time).
+    """
+    logging.basicConfig(
+        format=f'%(asctime)s - worker{index} - %(name)s - %(levelname)s - %(message)s',
+        level=logging.INFO,
+        force=True
+    )
+    # State worker tidak dibagi: user shard ini hanya pernah diproses di sini, tanpa lock antar proses
+    os.environ['WEB_CONCURRENCY'] = '1'
+    # Shutdown diatur dispatcher: worker baru berhenti setelah semua update shard-nya terkirim
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    from telegram import Update
+    from bot import TelegramBot
+    from services.leader_service import LeaderElection
+    from services.persistence_service import StateStore, shard_state_path
+    from services.health_service import HealthProber, google_health_checks
+    from services.tracing_service import tracer
+
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    ring = HashRing(range(workers))
+    owns_user = lambda user_id: ring.node_for(user_id) == index
+    # File state sendiri per shard (tanpa kontensi SQLite antar worker). Setelah DISPATCH_WORKERS
+    # diubah, user yang pindah shard mulai dari awal; baris lama mereka tidak dimuat
+    store = StateStore(
+        shard_state_path(index), shared=False, owns_user=owns_user,
+        peer_paths=[shard_state_path(peer) for peer in range(workers) if peer != index]
+    )
+    bot = TelegramBot(token, spreadsheet_id, state_store=store)
+    bot.owns_update = lambda data: owns_user(update_user_key(data))
+    if not loop.run_until_complete(bot.initialize_application()):
+        logger.error(f"❌ Worker {index} failed to initialize bot")
+        os._exit(1)
+
+    leader = LeaderElection()
+    prober = HealthProber(google_health_checks(bot.google_service.background_client(), spreadsheet_id, bot.spreadsheet_config))
+    leader.on_elected(prober.start)
+    leader.on_elected(bot.sheet_mirror.start)
+    leader.start()
+
+    # Dengan forkserver parent OS-nya adalah forkserver, bukan dispatcher
+    dispatcher_process = multiprocessing.parent_process()
+
+    def receive():
+        # poll berkala supaya worker berhenti sendiri kalau dispatcher mati
+        while not conn.poll(1):
+            if dispatcher_process is not None and not dispatcher_process.is_alive():
+                return None
+        item = conn.recv()
+        if item is not None:
+            # Ack: dispatcher membuang update ini dari daftar yang dikirim ulang kalau worker mati
+            try:
+                conn.send(True)
+            except OSError:
+                pass
+        return item
+
+    async def consume():
+        tasks = set()
+        while True:
+            try:
+                item = await loop.run_in_executor(None, receive)
+            except EOFError:
+                item = None
+            if item is None:
+                break
+            data, received_at = item
+            try:
+                update = Update.de_json(data, bot.application.bot)
+            except Exception as e:
+                logger.error(f"❌ Worker {index} failed to parse update: {e}")
+                continue
+            trace = tracer.start_trace('webhook', update_id=update.update_id, worker=index)
+            # Urutan per user dijaga lock per-user di process_update (FIFO)
+            task = loop.create_task(bot.process_update(update, received_at=received_at, trace=trace))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        prober.stop()
+        leader.stop()
+        await bot.shutdown(float(os.environ.get('SHUTDOWN_TIMEOUT', '25')))
+        tracer.close()
+
+    ready.set()
+    logger.info(f"✅ Worker {index} ready (pid {os.getpid()})")
+    loop.run_until_complete(consume())
+
+class UpdateDispatcher:
+    """Route webhook updates to a fixed set of worker processes by consistent hash of the user id.
+
+    Every worker slot has a buffer in this process and a sender thread that
+    writes to the current worker over a pipe. When a worker dies it is
+    restarted with a new pipe and the sender continues from its buffer, so
+    only updates of that shard wait and no other shard is affected. The
+    worker acks every update it takes from the pipe; updates still unacked
+    when it dies are resent to the new worker first.
+    """
+
+    def __init__(self, workers, token, spreadsheet_id):
+        self.workers = workers
+        self.token = token
+        self.spreadsheet_id = spreadsheet_id
+        self.ring = HashRing(range(workers))
+        # Bukan fork: _spawn dipanggil dari thread monitor saat thread lain (sender,
+        # event loop, gunicorn) memegang lock, child hasil fork bisa deadlock
+        self._context = multiprocessing.get_context(process_start_method())
+        self._buffers = [queue.Queue() for _ in range(workers)]
+        self._conns = [None] * workers
+        self._ready = [self._context.Event() for _ in range(workers)]
+        self._processes = [None] * workers
+        self._spawn_lock = threading.Lock()
+        self.restarts = [0] * workers
+        self.dispatched = [0] * workers
+        self.resent = [0] * workers
+        self.lost = [0] * workers
+        self._stopped = threading.Event()
+        self._threads = []
+
+        DISPATCH_QUEUE_DEPTH.set_function(lambda: {(str(i),): q.qsize() for i, q in enumerate(self._buffers)})
+
+    def _spawn(self, index):
+        with self._spawn_lock:
+            self._ready[index].clear()
+            # Duplex: update ke worker, ack kembali ke sender
+            worker_conn, conn = self._context.Pipe()
+            process = self._context.Process(
+                target=_worker_main,
+                args=(index, self.workers, self.token, self.spreadsheet_id, worker_conn, self._ready[index]),
+                name=f'bot-worker-{index}'
+            )
+            process.start()
+            # Ujung worker hanya di worker, supaya pipe putus (EPIPE) saat worker mati
+            worker_conn.close()
+            old_conn = self._conns[index]
+            self._conns[index] = conn
+            self._processes[index] = process
+            if old_conn is not None:
+                old_conn.close()
+        logger.info(f"🚀 Started worker {index} (pid {process.pid})")
+
+    def start(self, timeout=60):
+        """Start all workers and wait until they are ready"""
+        for index in range(self.workers):
+            self._spawn(index)
+        ready = all(event.wait(timeout) for event in self._ready)
+        for index in range(self.workers):
+            thread = threading.Thread(target=self._sender, args=(index,), name=f'dispatcher-sender-{index}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        monitor = threading.Thread(target=self._watch, name='dispatcher-monitor', daemon=True)
+        monitor.start()
+        return ready
+
+    def _watch(self):
+        while not self._stopped.wait(1):
+            for index, process in enumerate(self._processes):
+                if process is not None and not process.is_alive() and not self._stopped.is_set():
+                    logger.error(f"❌ Worker {index} exited with code {process.exitcode} - restarting")
+                    self.restarts[index] += 1
+                    DISPATCH_RESTARTS.inc(worker=str(index))
+                    self._spawn(index)
+
+    def _sender(self, index):
+        buffer = self._buffers[index]
+        # Update yang belum di-ack worker, urut; `sent` pertama sudah ditulis ke pipe worker sekarang
+        unacked = collections.deque()
+        sent = 0
+        conn = self._conns[index]
+        stopping = False
+        while True:
+            if self._conns[index] is not conn:
+                # Worker di-restart: isi pipe lama hilang bersama worker, kirim ulang dari awal
+                if sent:
+                    logger.warning(f"⚠️ Worker {index} died before receiving {sent} updates - resending them")
+                    self.resent[index] += sent
+                    DISPATCH_RESENT.inc(sent, worker=str(index))
+                conn = self._conns[index]
+                sent = 0
+            try:
+                while sent and conn.poll():
+                    conn.recv()
+                    unacked.popleft()
+                    sent -= 1
+                while sent < len(unacked):
+                    conn.send(unacked[sent])
+                    sent += 1
+                if stopping:
+                    conn.send(None)
+                    return
+            except (OSError, EOFError, ValueError):
+                if self._stopped.is_set():
+                    # Tidak ada restart lagi
+                    if unacked:
+                        logger.error(f"❌ Worker {index} gone at shutdown - {len(unacked)} updates lost")
+                        self.lost[index] += len(unacked)
+                    return
+                # Worker mati: tunggu di-restart
+                time.sleep(0.1)
+                continue
+            try:
+                # Selama ada yang belum di-ack, bangun berkala untuk membaca ack
+                item = buffer.get(timeout=0.05 if unacked else None)
+            except queue.Empty:
+                continue
+            if item is None:
+                stopping = True
+            else:
+                unacked.append(item)
+
+    def dispatch(self, data, received_at=None):
+        """Queue a raw update for the worker owning its user; returns worker index"""
+        index = self.ring.node_for(update_user_key(data))
+        self._buffers[index].put((data, received_at))
+        self.dispatched[index] += 1
+        return index
+
+    def close(self, timeout=30):
+        """Let workers finish queued updates, then stop them"""
+        self._stopped.set()
+        for buffer in self._buffers:
+            buffer.put(None)
+        for thread in self._threads:
+            thread.join(timeout)
+        for index, process in enumerate(self._processes):
+            if process is None:
+                continue
+            process.join(timeout)
+            if process.is_alive():
+                # SIGTERM diabaikan worker (lihat _worker_main), jadi terminate() tidak berguna
+                logger.warning(f"⚠️ Worker {index} did not stop in {timeout}s - killing")
+                process.kill()
+                process.join(5)
+
+    def get_stats(self):
+        return {
+            'workers': [
+                {
+                    'index': index,
+                    'pid': process.pid if process else None,
+                    'alive': bool(process and process.is_alive()),
+                    'ready': self._ready[index].is_set(),
+                    'restarts': self.restarts[index],
+                    'dispatched': self.dispatched[index],
+                    'queued': self._buffers[index].qsize(),
+                    'resent': self.resent[index],
+                    'lost': self.lost[index]
+                }
+                for index, process in enumerate(self._processes)
+            ]
+        }
@@ -0,0 +1,173 @@
+# services/export_service.py
+import io
+import os
+import csv
+import sqlite3
+import logging
+from datetime import datetime
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pyarrow ada di requirements; kalau tidak terpasang export hanya CSV
+    pa = None
+    pq = None
+
+from services.metrics_service import metrics
+from services.sheet_mirror_service import mirror_column
+
+logger = logging.getLogger(__name__)
+
+EXPORT_ROWS = metrics.counter('export_rows_total', 'Report rows streamed by /export', ['format'])
+EXPORT_REQUESTS = metrics.counter('export_requests_total', 'Report exports started', ['format'])
+
+FORMATS = ('csv', 'parquet')
+
+class ExportFilterError(ValueError):
+    pass
+
+def _parse_date(value, name):
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').strftime('%Y%m%d')
+    except ValueError:
+        raise ExportFilterError(f"{name} must be YYYY-MM-DD")
+
+def _split_values(value):
+    return [item.strip() for item in value.split(',') if item.strip()]
+
+def parse_filters(args):
+    """Query args (from, to, report_type, sto) -> filters dict"""
+    filters = {}
+    if args.get('from'):
+        filters['date_from'] = _parse_date(args['from'], 'from')
+    if args.get('to'):
+        filters['date_to'] = _parse_date(args['to'], 'to')
+    if args.get('report_type'):
+        filters['report_type'] = _split_values(args['report_type'])
+    if args.get('sto'):
+        filters['sto'] = [sto.upper() for sto in _split_values(args['sto'])]
+    return filters
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file that keeps written bytes until drained (Parquet writer -> HTTP chunks)"""
+
+    def __init__(self):
+        super().__init__()
+        self._chunks = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+class ReportExporter:
+    """Streams the report table out of the local sheet mirror.
+
+    Rows are read page by page with keyset pagination on the mirror id,
+    each page in its own short read, so a long download neither holds a
+    snapshot of the mirror open nor keeps more than one page in memory.
+    Every page becomes one CSV chunk or one Parquet row group.
+    """
+
+    def __init__(self, spreadsheet_config, path=None, page_rows=None):
+        self.path = path or os.environ.get('BOT_SHEET_MIRROR_DB', 'sheet_mirror.db')
+        self.page_rows = page_rows or int(os.environ.get('EXPORT_PAGE_ROWS', '2000'))
+        self.columns = [mirror_column(field) for field in spreadsheet_config.fields]
+        self.headers = list(spreadsheet_config.headers)
+        self.formats = FORMATS if pa is not None else ('csv',)
+
+    def _connect(self):
+        # Read-only: penulis mirror hanya leader
+        return sqlite3.connect(f'file:{self.path}?mode=ro', uri=True, timeout=30)
+
+    def available(self):
+        """True once the mirror has been synced at least once"""
+        if not os.path.exists(self.path):
+            return False
+        try:
+            conn = self._connect()
+            try:
+                return conn.execute("SELECT 1 FROM sync_meta WHERE key = 'rows_synced'").fetchone() is not None
+            finally:
+                conn.close()
+        except sqlite3.Error as e:
+            logger.warning(f"⚠️ Sheet mirror not readable for export: {e}")
+            return False
+
+    def _where(self, filters):
+        clauses = []
+        params = []
+        if filters.get('date_from'):
+            clauses.append('reported_date >= ?')
+            params.append(filters['date_from'])
+        if filters.get('date_to'):
+            clauses.append('reported_date <= ?')
+            params.append(filters['date_to'])
+        for key in ('report_type', 'sto'):
+            if filters.get(key):
+                # Tanpa beda huruf besar/kecil: baris lama (sebelum validasi form) tersimpan apa adanya
+                clauses.append(f"UPPER({key}) IN ({', '.join('?' * len(filters[key]))})")
+                params.extend(value.upper() for value in filters[key])
+        return ''.join(f' AND {clause}' for clause in clauses), params
+
+    def pages(self, filters=None):
+        """Yield matching rows (tuples in sheet column order), one page at a time"""
+        where, params = self._where(filters or {})
+        sql = f"SELECT id, {', '.join(self.columns)} FROM reports WHERE id > ?{where} ORDER BY id LIMIT ?"
+        conn = self._connect()
+        try:
+            last_id = 0
+            while True:
+                rows = conn.execute(sql, (last_id, *params, self.page_rows)).fetchall()
+                if not rows:
+                    return
+                last_id = rows[-1][0]
+                yield [row[1:] for row in rows]
+                if len(rows) < self.page_rows:
+                    return
+        finally:
+            conn.close()
+
+    def stream_csv(self, filters=None):
+        """CSV chunks (header first), one per page"""
+        EXPORT_REQUESTS.inc(format='csv')
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        # BOM supaya Excel membaca UTF-8
+        buffer.write('\ufeff')
+        writer.writerow(self.headers)
+        yield buffer.getvalue()
+        for page in self.pages(filters):
+            buffer.seek(0)
+            buffer.truncate()
+            writer.writerows(page)
+            EXPORT_ROWS.inc(len(page), format='csv')
+            yield buffer.getvalue()
+
+    def stream_parquet(self, filters=None):
+        """Parquet file bytes, one row group per page (requires pyarrow)"""
+        EXPORT_REQUESTS.inc(format='parquet')
+        schema = pa.schema([(header, pa.string()) for header in self.headers])
+        sink = _ChunkSink()
+        writer = pq.ParquetWriter(sink, schema, compression='snappy')
+        try:
+            for page in self.pages(filters):
+                columns = [pa.array(values, type=pa.string()) for values in zip(*page)]
+                writer.write_table(pa.Table.from_arrays(columns, schema=schema))
+                EXPORT_ROWS.inc(len(page), format='parquet')
+                yield sink.drain()
+        finally:
+            writer.close()
+        yield sink.drain()
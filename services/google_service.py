@@ -1,23 +1,39 @@
 # services/google_service.py - OAuth Version with Service Account for Sheets
 import os
+import copy
 import json
 import base64
 import logging
+import threading
 import time
 from googleapiclient.discovery import build
 from google.oauth2 import service_account
 from google.oauth2.credentials import Credentials
 from google.auth.transport.requests import Request
-from googleapiclient.http import MediaFileUpload
+from google.auth.credentials import AnonymousCredentials
+from googleapiclient.http import MediaFileUpload, HttpRequest
 from googleapiclient.errors import HttpError
 from datetime import datetime
 
+from services.metrics_service import metrics, timed
+from services.tracing_service import traced
+
 logger = logging.getLogger(__name__)
 
+class SheetTabMissing(Exception):
+    """Append range names a tab that does not exist (deleted or renamed by hand)"""
+
 # Scopes untuk Google API
 DRIVE_SCOPES = ['https://www.googleapis.com/auth/drive']
 SHEETS_SCOPES = ['https://www.googleapis.com/auth/spreadsheets']
 
+# Latency per pemanggilan GoogleService
+GOOGLE_CALL_LATENCY = metrics.histogram(
+    'google_service_call_duration_seconds',
+    'Latency of GoogleService calls',
+    ['method']
+)
+
 class GoogleService:
     def __init__(self):
         # Get environment variables - HAPUS HARDCODED VALUES
@@ -32,12 +48,19 @@ class GoogleService:
         # Service account for Sheets (spreadsheet operations)
         self.service_account_key = os.environ.get('GOOGLE_SERVICE_ACCOUNT_KEY')
         
+        # Base URL server Google lokal (tools/fake_servers.py) untuk benchmark/test offline
+        self.api_base_url = os.environ.get('GOOGLE_API_BASE_URL')
+        
         # Validate required environment variables
         self._validate_environment_variables()
         
         # Services
         self.service_drive = None  # Will use OAuth
         self.service_sheets = None  # Will use Service Account
+        self._drive_credentials = None
+        self._sheets_credentials = None
+        # background_client() per thread executor (upload lewat asyncio.to_thread)
+        self._thread_clients = threading.local()
 
     def _validate_environment_variables(self):
         """Validate that all required environment variables are set"""
@@ -50,6 +73,11 @@ class GoogleService:
             'GOOGLE_SERVICE_ACCOUNT_KEY': self.service_account_key
         }
         
+        if self.api_base_url:
+            # Server lokal tidak butuh kredensial asli
+            logger.warning(f"⚠️ GOOGLE_API_BASE_URL set - using local Google API at {self.api_base_url}")
+            required_vars = {'PARENT_FOLDER_ID': self.parent_folder_id}
+        
         # Optional vars with defaults
         optional_vars = {
             'SHEET_NAME': os.environ.get('SHEET_NAME', 'Sheet1')
@@ -74,6 +102,8 @@ class GoogleService:
             logger.warning("⚠️ Invalid sheet name, using 'Sheet1' as fallback")
             os.environ['SHEET_NAME'] = 'Sheet1'
         
+    @timed(GOOGLE_CALL_LATENCY, method='authenticate')
+    @traced('google.authenticate')
     def authenticate(self):
         """Authenticate with Google APIs using OAuth for Drive and Service Account for Sheets"""
         try:
@@ -94,9 +124,33 @@ class GoogleService:
             logger.error(f"❌ Error during authentication: {e}")
             return False
 
+    def _build_local_service(self, api_name, version, service_path):
+        """Build API client against GOOGLE_API_BASE_URL with anonymous credentials"""
+        base_url = self.api_base_url.rstrip('/')
+        secure_prefix = 'https://' + base_url.split('://', 1)[-1]
+        
+        def request_builder(http, postproc, uri, **kwargs):
+            # URL upload media hanya diganti host-nya oleh client, skema tetap https
+            if uri.startswith(secure_prefix) and not base_url.startswith('https://'):
+                uri = base_url + uri[len(secure_prefix):]
+            return HttpRequest(http, postproc, uri, **kwargs)
+        
+        return build(
+            api_name,
+            version,
+            credentials=AnonymousCredentials(),
+            client_options={'api_endpoint': f'{base_url}/{service_path}'},
+            requestBuilder=request_builder
+        )
+
     def _authenticate_drive_oauth(self):
         """Authenticate Drive service with OAuth credentials"""
         try:
+            if self.api_base_url:
+                self.service_drive = self._build_local_service('drive', 'v3', 'drive/v3/')
+                logger.info("✅ Drive service connected to local API")
+                return True
+            
             if not all([self.oauth_client_id, self.oauth_client_secret, self.oauth_refresh_token]):
                 logger.error("❌ Missing OAuth credentials for Drive")
                 logger.error("Required: OAUTH_CLIENT_ID, OAUTH_CLIENT_SECRET, OAUTH_REFRESH_TOKEN")
@@ -116,6 +170,7 @@ class GoogleService:
             creds.refresh(Request())
             
             # Build Drive service
+            self._drive_credentials = creds
             self.service_drive = build('drive', 'v3', credentials=creds)
             
             logger.info("✅ Drive service authenticated with OAuth")
@@ -128,6 +183,11 @@ class GoogleService:
     def _authenticate_sheets_service_account(self):
         """Authenticate Sheets service with Service Account"""
         try:
+            if self.api_base_url:
+                self.service_sheets = self._build_local_service('sheets', 'v4', '')
+                logger.info("✅ Sheets service connected to local API")
+                return True
+            
             if not self.service_account_key:
                 logger.error("❌ Missing GOOGLE_SERVICE_ACCOUNT_KEY for Sheets")
                 return False
@@ -145,6 +205,7 @@ class GoogleService:
                 return False
             
             # Build Sheets service
+            self._sheets_credentials = creds
             self.service_sheets = build('sheets', 'v4', credentials=creds)
             
             logger.info("✅ Sheets service authenticated with Service Account")
@@ -154,6 +215,27 @@ class GoogleService:
             logger.error(f"❌ Error authenticating Sheets with Service Account: {e}")
             return False
 
+    def background_client(self):
+        """Copy with its own HTTP connections, for use from a background thread"""
+        # httplib2 tidak thread-safe: thread lain tidak boleh memakai service milik event loop
+        client = copy.copy(self)
+        if self.api_base_url:
+            client.service_drive = self._build_local_service('drive', 'v3', 'drive/v3/')
+            client.service_sheets = self._build_local_service('sheets', 'v4', '')
+        else:
+            client.service_drive = build('drive', 'v3', credentials=self._drive_credentials)
+            client.service_sheets = build('sheets', 'v4', credentials=self._sheets_credentials)
+        return client
+
+    def thread_client(self):
+        """background_client() of the calling thread, built once per thread"""
+        client = getattr(self._thread_clients, 'client', None)
+        if client is None:
+            client = self._thread_clients.client = self.background_client()
+        return client
+
+    @timed(GOOGLE_CALL_LATENCY, method='create_folder')
+    @traced('google.create_folder')
     def create_folder(self, folder_name, parent_folder_id=None):
         """Create folder using OAuth Drive service"""
         try:
@@ -185,6 +267,8 @@ class GoogleService:
             logger.error(f"❌ Error creating folder: {e}")
             return None
 
+    @timed(GOOGLE_CALL_LATENCY, method='upload_to_drive')
+    @traced('google.upload_to_drive')
     def upload_to_drive(self, file_path, file_name, folder_id):
         """Upload file to Drive using OAuth credentials"""
         try:
@@ -223,12 +307,30 @@ class GoogleService:
             logger.error(f"❌ OAuth upload failed: {e}")
             return None
 
+    @timed(GOOGLE_CALL_LATENCY, method='delete_file')
+    @traced('google.delete_file')
+    def delete_file(self, file_id):
+        """Delete file or folder from Drive using OAuth credentials"""
+        try:
+            if not self.service_drive:
+                logger.error("❌ Drive service not authenticated")
+                return False
+            
+            self.service_drive.files().delete(fileId=file_id).execute()
+            return True
+            
+        except Exception as e:
+            logger.error(f"❌ Error deleting Drive file {file_id}: {e}")
+            return False
+
     def get_folder_link(self, folder_id):
         """Get shareable link for Google Drive folder"""
         return f"https://drive.google.com/drive/folders/{folder_id}"
 
-    def update_spreadsheet(self, spreadsheet_id, spreadsheet_config, laporan_data):
-        """Update Google Spreadsheet using Service Account"""
+    @timed(GOOGLE_CALL_LATENCY, method='update_spreadsheet')
+    @traced('google.update_spreadsheet')
+    def update_spreadsheet(self, spreadsheet_id, spreadsheet_config, laporan_data, sheet_name=None):
+        """Update Google Spreadsheet using Service Account (sheet_name: partition tab)"""
         try:
             if not self.service_sheets:
                 logger.error("❌ Sheets service not authenticated")
@@ -240,7 +342,7 @@ class GoogleService:
             
             result = self.service_sheets.spreadsheets().values().append(
                 spreadsheetId=spreadsheet_id,
-                range=spreadsheet_config.get_append_range(),
+                range=spreadsheet_config.get_append_range(sheet_name),
                 valueInputOption='RAW',
                 body=body
             ).execute()
@@ -248,10 +350,128 @@ class GoogleService:
             logger.info(f"✅ Successfully added row to spreadsheet")
             return True
             
+        except HttpError as e:
+            # Hanya error ini yang pasti belum menulis baris: aman dibuat ulang tab-nya lalu diulang
+            if e.resp.status == 400 and 'Unable to parse range' in str(e):
+                logger.warning(f"⚠️ Spreadsheet tab {sheet_name} not found: {e}")
+                raise SheetTabMissing(sheet_name) from e
+            logger.error(f"❌ Error updating spreadsheet: {e}")
+            return False
         except Exception as e:
             logger.error(f"❌ Error updating spreadsheet: {e}")
             return False
 
+    @timed(GOOGLE_CALL_LATENCY, method='read_values')
+    @traced('google.read_values')
+    def read_values(self, spreadsheet_id, a1_range):
+        """Read cell values of a range using Service Account (None on error)"""
+        try:
+            if not self.service_sheets:
+                logger.error("❌ Sheets service not authenticated")
+                return None
+            
+            result = self.service_sheets.spreadsheets().values().get(
+                spreadsheetId=spreadsheet_id,
+                range=a1_range
+            ).execute()
+            
+            return result.get('values', [])
+            
+        except Exception as e:
+            logger.error(f"❌ Error reading spreadsheet range {a1_range}: {e}")
+            return None
+
+    @timed(GOOGLE_CALL_LATENCY, method='read_values_batch')
+    @traced('google.read_values_batch')
+    def read_values_batch(self, spreadsheet_id, ranges):
+        """Read cell values of several ranges in one call, list per range (None on error)"""
+        try:
+            if not self.service_sheets:
+                logger.error("❌ Sheets service not authenticated")
+                return None
+            
+            result = self.service_sheets.spreadsheets().values().batchGet(
+                spreadsheetId=spreadsheet_id,
+                ranges=ranges
+            ).execute()
+            
+            return [value_range.get('values', []) for value_range in result.get('valueRanges', [])]
+            
+        except Exception as e:
+            logger.error(f"❌ Error reading {len(ranges)} spreadsheet ranges: {e}")
+            return None
+
+    @timed(GOOGLE_CALL_LATENCY, method='write_values')
+    @traced('google.write_values')
+    def write_values(self, spreadsheet_id, a1_range, values):
+        """Overwrite cell values of a range using Service Account"""
+        try:
+            if not self.service_sheets:
+                logger.error("❌ Sheets service not authenticated")
+                return False
+            
+            self.service_sheets.spreadsheets().values().update(
+                spreadsheetId=spreadsheet_id,
+                range=a1_range,
+                valueInputOption='RAW',
+                body={'values': values}
+            ).execute()
+            return True
+            
+        except Exception as e:
+            logger.error(f"❌ Error writing spreadsheet range {a1_range}: {e}")
+            return False
+
+    @timed(GOOGLE_CALL_LATENCY, method='get_sheet_titles')
+    @traced('google.get_sheet_titles')
+    def get_sheet_titles(self, spreadsheet_id):
+        """Titles of all tabs in the spreadsheet (None on error)"""
+        try:
+            if not self.service_sheets:
+                logger.error("❌ Sheets service not authenticated")
+                return None
+            
+            result = self.service_sheets.spreadsheets().get(
+                spreadsheetId=spreadsheet_id,
+                fields='sheets.properties.title'
+            ).execute()
+            
+            return [sheet['properties']['title'] for sheet in result.get('sheets', [])]
+            
+        except Exception as e:
+            logger.error(f"❌ Error reading spreadsheet tabs: {e}")
+            return None
+
+    @timed(GOOGLE_CALL_LATENCY, method='add_sheet')
+    @traced('google.add_sheet')
+    def add_sheet(self, spreadsheet_id, title):
+        """Add a tab; True if it was created or already exists"""
+        try:
+            if not self.service_sheets:
+                logger.error("❌ Sheets service not authenticated")
+                return False
+            
+            self.service_sheets.spreadsheets().batchUpdate(
+                spreadsheetId=spreadsheet_id,
+                body={'requests': [{'addSheet': {'properties': {'title': title}}}]}
+            ).execute()
+            
+            logger.info(f"✅ Created spreadsheet tab: {title}")
+            return True
+            
+        except HttpError as e:
+            # Worker lain membuat tab yang sama lebih dulu
+            if e.resp.status == 400 and 'already exists' in str(e):
+                logger.info(f"ℹ️ Spreadsheet tab already exists: {title}")
+                return True
+            logger.error(f"❌ Error creating spreadsheet tab {title}: {e}")
+            return False
+        except Exception as e:
+            logger.error(f"❌ Error creating spreadsheet tab {title}: {e}")
+            return False
+
+    @timed(GOOGLE_CALL_LATENCY, method='test_oauth_drive_access')
+    @traced('google.test_oauth_drive_access')
     def test_oauth_drive_access(self):
         """Test if OAuth Drive access is working"""
         try:
@@ -270,8 +490,11 @@ class GoogleService:
             
         except Exception as e:
             logger.error(f"❌ OAuth Drive access test failed: {e}")
+            logger.warning("⚠️ Check OAuth credentials: OAUTH_CLIENT_ID, OAUTH_CLIENT_SECRET, OAUTH_REFRESH_TOKEN")
             return False
 
+    @timed(GOOGLE_CALL_LATENCY, method='get_drive_quota_info')
+    @traced('google.get_drive_quota_info')
     def get_drive_quota_info(self):
         """Get Drive quota information using OAuth"""
         try:
@@ -302,6 +525,25 @@ class GoogleService:
             logger.error(f"❌ Error getting quota info: {e}")
             return None
 
+    @timed(GOOGLE_CALL_LATENCY, method='check_sheets_access')
+    @traced('google.check_sheets_access')
+    def check_sheets_access(self, spreadsheet_id, a1_range):
+        """Check the spreadsheet is reachable with the service account (reads one cell)"""
+        try:
+            if not self.service_sheets:
+                logger.error("❌ Sheets service not authenticated")
+                return False
+
+            self.service_sheets.spreadsheets().values().get(
+                spreadsheetId=spreadsheet_id,
+                range=a1_range
+            ).execute()
+            return True
+
+        except Exception as e:
+            logger.error(f"❌ Sheets access check failed: {e}")
+            return False
+
     def cleanup_service_account_files(self):
         """This method is no longer needed since we're using OAuth for Drive"""
         logger.info("ℹ️ Cleanup not needed - using OAuth for Drive uploads")
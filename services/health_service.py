@@ -0,0 +1,161 @@
+# services/health_service.py
+import os
+import json
+import time
+import logging
+import threading
+from datetime import datetime
+
+from services.metrics_service import metrics
+
+logger = logging.getLogger(__name__)
+
+HEALTH_CHECK_OK = metrics.gauge('health_check_ok', 'Last cached result of a background health check (1 = ok)', ['check'])
+HEALTH_CHECK_AGE = metrics.gauge('health_check_age_seconds', 'Age of the cached health check result', ['check'])
+
+def google_health_checks(google_service, spreadsheet_id, spreadsheet_config):
+    """Standard checks: OAuth Drive access, Drive quota and Sheets reachability"""
+    return {
+        'drive_oauth': google_service.test_oauth_drive_access,
+        'drive_quota': google_service.get_drive_quota_info,
+        'sheets': lambda: google_service.check_sheets_access(spreadsheet_id, spreadsheet_config.get_range())
+    }
+
+class HealthProber:
+    """Run health checks on a schedule and cache the results with timestamps.
+
+    The results are written to a small JSON file, so every worker process
+    (and the dispatcher front, which has no Google client) serves the
+    snapshot made by the leader without calling Google itself.
+    """
+
+    def __init__(self, checks=None, path=None, interval=None):
+        self.checks = dict(checks or {})
+        self.path = path or os.environ.get('BOT_HEALTH_FILE', 'bot_health.json')
+        if interval is None:
+            interval = float(os.environ.get('HEALTH_PROBE_INTERVAL', '300'))
+        self.interval = interval
+        self.runs = 0
+        self._results = {}
+        self._mtime = None
+        self._lock = threading.Lock()
+        # Satu run sekaligus: cek ?deep=1 dari thread request dan thread prober memakai client yang sama
+        self._run_lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = None
+
+        HEALTH_CHECK_OK.set_function(lambda: {
+            (name,): 1 if result['ok'] else 0 for name, result in self.get_results().items()
+        })
+        HEALTH_CHECK_AGE.set_function(lambda: {
+            (name,): result['age_seconds'] for name, result in self.get_results().items()
+        })
+
+    def _run_check(self, name, check):
+        started = time.perf_counter()
+        error = None
+        try:
+            value = check()
+        except Exception as e:
+            value = None
+            error = str(e)
+        # Check mengembalikan bool, atau data (mis. kuota Drive) / None kalau gagal
+        ok = value is not None and value is not False
+        return {
+            'ok': ok,
+            'value': None if isinstance(value, bool) else value,
+            'error': error,
+            'checked_at': time.time(),
+            'duration_ms': round((time.perf_counter() - started) * 1000, 1)
+        }
+
+    def run_checks(self):
+        """Run all checks now, update the cache and return the results"""
+        with self._run_lock:
+            results = {name: self._run_check(name, check) for name, check in self.checks.items()}
+        with self._lock:
+            previous = self._results
+            self._results = {**previous, **results}
+            merged = dict(self._results)
+        self.runs += 1
+
+        for name, result in results.items():
+            was_ok = previous.get(name, {}).get('ok')
+            if result['ok'] and was_ok is not True:
+                logger.info(f"✅ Health check {name} OK ({result['duration_ms']}ms)")
+            elif not result['ok'] and was_ok is not False:
+                logger.warning(f"⚠️ Health check {name} failing: {result['error'] or 'no result'}")
+
+        self._write(merged)
+        return self._with_age(results)
+
+    def _write(self, results):
+        temp_path = f"{self.path}.{os.getpid()}.tmp"
+        try:
+            with open(temp_path, 'w') as f:
+                json.dump(results, f)
+            # Ganti atomik supaya worker lain tidak membaca file setengah tertulis
+            os.replace(temp_path, self.path)
+        except Exception as e:
+            logger.error(f"❌ Error writing health cache: {e}")
+
+    def _load(self):
+        try:
+            mtime = os.stat(self.path).st_mtime
+        except OSError:
+            return
+        if mtime == self._mtime:
+            return
+        try:
+            with open(self.path) as f:
+                results = json.load(f)
+        except Exception as e:
+            logger.error(f"❌ Error reading health cache: {e}")
+            return
+        with self._lock:
+            self._results = results
+            self._mtime = mtime
+
+    def _with_age(self, results):
+        now = time.time()
+        return {
+            name: {
+                **result,
+                'checked_at': datetime.fromtimestamp(result['checked_at']).isoformat(timespec='seconds'),
+                'age_seconds': round(now - result['checked_at'], 1),
+                # Lebih dari dua interval tanpa hasil baru: leader mati atau prober macet
+                'stale': now - result['checked_at'] > 2 * self.interval
+            }
+            for name, result in results.items()
+        }
+
+    def get_results(self):
+        """Cached results (from the leader's last run) with their age"""
+        self._load()
+        with self._lock:
+            results = dict(self._results)
+        return self._with_age(results)
+
+    def _loop(self):
+        while not self._stopped.is_set():
+            self.run_checks()
+            self._stopped.wait(self.interval)
+
+    def start(self):
+        """Start probing in the background (leader job)"""
+        if self._thread is not None or not self.checks:
+            return
+        logger.info(f"🩺 Health prober started ({len(self.checks)} checks every {self.interval:g}s)")
+        self._thread = threading.Thread(target=self._loop, name='health-prober', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+
+    def get_stats(self):
+        return {
+            'cache_file': self.path,
+            'interval_seconds': self.interval,
+            'probing': self._thread is not None and not self._stopped.is_set(),
+            'runs': self.runs
+        }
@@ -0,0 +1,152 @@
+# services/image_service.py
+import os
+import time
+import asyncio
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from services.metrics_service import metrics
+from services.process_util import process_start_method
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Pillow opsional, tanpa Pillow foto diupload apa adanya
+    Image = None
+    ImageOps = None
+
+logger = logging.getLogger(__name__)
+
+PHOTO_BYTES_SAVED = metrics.counter('photo_processing_bytes_saved_total', 'Bytes saved by photo downscaling')
+PHOTO_PROCESSING_LATENCY = metrics.histogram(
+    'photo_processing_duration_seconds',
+    'Time to downscale and re-encode one photo in the process pool'
+)
+
+def _transcode_photo(file_path, max_dimension, quality):
+    """Resize, re-encode as JPEG and strip metadata (runs in worker process)"""
+    start = time.perf_counter()
+    original_bytes = os.path.getsize(file_path)
+    tmp_path = f"{file_path}.processed"
+
+    with Image.open(file_path) as img:
+        # Terapkan orientasi EXIF dulu karena metadata akan dibuang
+        img = ImageOps.exif_transpose(img)
+        if img.mode not in ('RGB', 'L'):
+            img = img.convert('RGB')
+        img.thumbnail((max_dimension, max_dimension), Image.LANCZOS)
+        # Tanpa parameter exif/icc_profile, metadata tidak ikut tersimpan
+        img.save(tmp_path, 'JPEG', quality=quality, optimize=True)
+
+    processed_bytes = os.path.getsize(tmp_path)
+    kept_original = processed_bytes >= original_bytes
+    if kept_original:
+        # Foto kecil/sudah terkompresi bisa membesar setelah re-encode: pakai file asli
+        os.remove(tmp_path)
+        processed_bytes = original_bytes
+    else:
+        os.replace(tmp_path, file_path)
+
+    return {
+        'original_bytes': original_bytes,
+        'processed_bytes': processed_bytes,
+        'kept_original': kept_original,
+        'bytes_saved': original_bytes - processed_bytes,
+        'processing_ms': (time.perf_counter() - start) * 1000
+    }
+
+class ImageProcessor:
+    """Optional photo downscaling stage before Drive upload, executed in a process pool"""
+
+    def __init__(self):
+        self.max_dimension = int(os.environ.get('PHOTO_MAX_DIMENSION', '0'))
+        self.jpeg_quality = int(os.environ.get('PHOTO_JPEG_QUALITY', '85'))
+        self.workers = int(os.environ.get('PHOTO_PROCESS_WORKERS', '1'))
+        self._pool = None
+
+        self.enabled = self.max_dimension > 0
+        if self.enabled and Image is None:
+            logger.warning("⚠️ PHOTO_MAX_DIMENSION is set but Pillow is not installed - photos uploaded unchanged")
+            self.enabled = False
+
+        # Statistik pemrosesan
+        self.photos_processed = 0
+        self.photos_failed = 0
+        self.pool_restarts = 0
+        self.total_bytes_saved = 0
+        self.total_processing_ms = 0.0
+
+        if self.enabled:
+            logger.info(f"🖼️ Photo processing enabled: max {self.max_dimension}px, JPEG quality {self.jpeg_quality}")
+
+    def _get_pool(self):
+        if self._pool is None:
+            # Bukan fork: pool dibuat dari thread event loop saat thread lain (Drive upload,
+            # leader, gunicorn) bisa memegang lock; _transcode_photo cukup modul ini + Pillow
+            self._pool = ProcessPoolExecutor(
+                max_workers=max(1, self.workers),
+                mp_context=multiprocessing.get_context(process_start_method())
+            )
+        return self._pool
+
+    async def process(self, file_path):
+        """Downscale photo in place; returns processing stats or None if skipped/failed"""
+        if not self.enabled:
+            return None
+
+        pool = self._get_pool()
+        try:
+            loop = asyncio.get_running_loop()
+            result = await loop.run_in_executor(
+                pool,
+                _transcode_photo,
+                file_path,
+                self.max_dimension,
+                self.jpeg_quality
+            )
+        except BrokenProcessPool as e:
+            # Proses pool mati (mis. OOM): pool dibuat ulang untuk foto berikutnya
+            if self._pool is pool:
+                self._pool = None
+                pool.shutdown(wait=False)
+                self.pool_restarts += 1
+            self.photos_failed += 1
+            logger.error(f"❌ Photo process pool broken, recreating it for the next photo: {e}")
+            return None
+        except Exception as e:
+            # Gagal proses bukan alasan gagal upload, kirim file asli
+            self.photos_failed += 1
+            logger.error(f"❌ Error processing photo {file_path}: {e}")
+            return None
+
+        self.photos_processed += 1
+        self.total_bytes_saved += result['bytes_saved']
+        PHOTO_BYTES_SAVED.inc(result['bytes_saved'])
+        self.total_processing_ms += result['processing_ms']
+        PHOTO_PROCESSING_LATENCY.observe(result['processing_ms'] / 1000)
+
+        logger.info(
+            f"🖼️ Photo processed: {result['original_bytes']} -> {result['processed_bytes']} bytes "
+            f"(saved {result['bytes_saved']}) in {result['processing_ms']:.1f}ms"
+        )
+        return result
+
+    def get_stats(self):
+        """Get photo processing metrics"""
+        return {
+            'enabled': self.enabled,
+            'max_dimension': self.max_dimension,
+            'jpeg_quality': self.jpeg_quality,
+            'photos_processed': self.photos_processed,
+            'photos_failed': self.photos_failed,
+            'pool_restarts': self.pool_restarts,
+            'total_bytes_saved': self.total_bytes_saved,
+            'avg_processing_ms': (self.total_processing_ms / self.photos_processed) if self.photos_processed else 0.0
+        }
+
+    def shutdown(self):
+        """Stop worker processes"""
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
@@ -0,0 +1,97 @@
+# services/leader_service.py
+import os
+import logging
+import threading
+
+try:
+    import fcntl
+except ImportError:
+    # Bukan POSIX: hanya ada satu proses, selalu leader
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+class LeaderElection:
+    """Pick one worker process to run background jobs, via an exclusive fcntl lock on a shared file"""
+
+    def __init__(self, path=None, retry_seconds=None):
+        self.path = path or os.environ.get('BOT_LEADER_LOCK', 'bot_leader.lock')
+        if retry_seconds is None:
+            retry_seconds = float(os.environ.get('BOT_LEADER_RETRY_SECONDS', '5'))
+        self.retry_seconds = retry_seconds
+        self.is_leader = False
+        self._file = None
+        self._callbacks = []
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def on_elected(self, callback):
+        """Run callback once this process becomes leader (immediately if it already is)"""
+        with self._lock:
+            self._callbacks.append(callback)
+            is_leader = self.is_leader
+        if is_leader:
+            self._run(callback)
+
+    def _run(self, callback):
+        try:
+            callback()
+        except Exception as e:
+            logger.error(f"❌ Error in leader job {getattr(callback, '__name__', callback)}: {e}")
+
+    def _try_acquire(self):
+        if fcntl is None:
+            return True
+        lock_file = open(self.path, 'a+')
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        lock_file.seek(0)
+        lock_file.truncate()
+        lock_file.write(str(os.getpid()))
+        lock_file.flush()
+        # File tetap terbuka selama proses hidup; lock lepas otomatis saat proses mati
+        self._file = lock_file
+        return True
+
+    def _become_leader(self):
+        with self._lock:
+            self.is_leader = True
+            callbacks = list(self._callbacks)
+        logger.info(f"👑 Worker {os.getpid()} is leader - running background jobs")
+        for callback in callbacks:
+            self._run(callback)
+
+    def _wait_for_leadership(self):
+        while not self._stopped.wait(self.retry_seconds):
+            if self._try_acquire():
+                self._become_leader()
+                return
+
+    def start(self):
+        """Try to become leader now, otherwise keep retrying in the background"""
+        if self._try_acquire():
+            self._become_leader()
+            return
+        logger.info(f"ℹ️ Worker {os.getpid()} is follower - background jobs run in another worker")
+        self._thread = threading.Thread(target=self._wait_for_leadership, name='leader-election', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Release leadership so another worker can take over"""
+        self._stopped.set()
+        with self._lock:
+            self.is_leader = False
+        if self._file:
+            self._file.close()
+            self._file = None
+
+    def get_stats(self):
+        return {
+            'pid': os.getpid(),
+            'is_leader': self.is_leader,
+            'lock_file': self.path
+        }
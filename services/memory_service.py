@@ -0,0 +1,110 @@
+# services/memory_service.py
+import os
+import sys
+import logging
+import tracemalloc
+from collections import defaultdict
+
+logger = logging.getLogger(__name__)
+
+class MemoryInspector:
+    """tracemalloc snapshots diffed against the previous snapshot, grouped by module"""
+
+    def __init__(self):
+        self.frames = int(os.environ.get('TRACEMALLOC_FRAMES', '1'))
+        self._previous = None
+        self._module_cache = {}
+        # Path prefix terpanjang dulu supaya site-packages menang atas prefix umum
+        self._search_paths = sorted(
+            {os.path.abspath(path) for path in sys.path if path},
+            key=len,
+            reverse=True
+        )
+
+    def _module_name(self, filename):
+        """Map source filename to dotted module name"""
+        module = self._module_cache.get(filename)
+        if module is not None:
+            return module
+
+        module = filename
+        path = os.path.abspath(filename)
+        for prefix in self._search_paths:
+            if path.startswith(prefix + os.sep):
+                relative = os.path.splitext(path[len(prefix) + 1:])[0]
+                module = relative.replace(os.sep, '.')
+                if module.endswith('.__init__'):
+                    module = module[:-len('.__init__')]
+                break
+
+        self._module_cache[filename] = module
+        return module
+
+    def _filtered(self, snapshot):
+        return snapshot.filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap_external>'),
+            tracemalloc.Filter(False, '<unknown>'),
+        ))
+
+    def snapshot(self, limit=30):
+        """Take snapshot and diff it against the previous one"""
+        if not tracemalloc.is_tracing():
+            # Alokasi sebelum start tidak terlacak, snapshot pertama jadi baseline
+            tracemalloc.start(self.frames)
+            self._previous = self._filtered(tracemalloc.take_snapshot())
+            logger.info("🧠 tracemalloc started, baseline snapshot taken")
+            return {
+                'status': 'started',
+                'message': 'tracemalloc started; call again to get a diff against this baseline'
+            }
+
+        current = self._filtered(tracemalloc.take_snapshot())
+        previous = self._previous
+        self._previous = current
+
+        by_module = defaultdict(lambda: {'size_bytes': 0, 'count': 0, 'size_diff_bytes': 0, 'count_diff': 0})
+        if previous is not None:
+            stats = current.compare_to(previous, 'filename')
+        else:
+            stats = current.statistics('filename')
+
+        for stat in stats:
+            module = self._module_name(stat.traceback[0].filename)
+            entry = by_module[module]
+            entry['size_bytes'] += stat.size
+            entry['count'] += stat.count
+            entry['size_diff_bytes'] += getattr(stat, 'size_diff', 0)
+            entry['count_diff'] += getattr(stat, 'count_diff', 0)
+
+        # Ringkasan per package (telegram, googleapiclient, services, ...)
+        by_package = defaultdict(lambda: {'size_bytes': 0, 'size_diff_bytes': 0})
+        for module, entry in by_module.items():
+            package = by_package[module.split('.', 1)[0]]
+            package['size_bytes'] += entry['size_bytes']
+            package['size_diff_bytes'] += entry['size_diff_bytes']
+
+        def top(items, key):
+            return [
+                {'name': name, **entry}
+                for name, entry in sorted(items.items(), key=lambda item: abs(item[1][key]), reverse=True)[:limit]
+            ]
+
+        traced_current, traced_peak = tracemalloc.get_traced_memory()
+        return {
+            'status': 'success',
+            'traced_current_bytes': traced_current,
+            'traced_peak_bytes': traced_peak,
+            'tracemalloc_overhead_bytes': tracemalloc.get_tracemalloc_memory(),
+            'top_growth_by_module': top(by_module, 'size_diff_bytes'),
+            'top_size_by_module': top(by_module, 'size_bytes'),
+            'by_package': top(by_package, 'size_bytes')
+        }
+
+    def stop(self):
+        """Stop tracing and drop the stored snapshot"""
+        self._previous = None
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+            logger.info("🧠 tracemalloc stopped")
@@ -0,0 +1,106 @@
+# services/mirror_index_service.py
+import time
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+class MirrorIndex:
+    """Base for in-memory indexes built from the local sheet mirror.
+
+    Only the leader reads the sheet (SheetMirror job); every worker and
+    dispatcher shard builds its indexes from the mirror file. A refresh
+    reads the mirror rows with id > last seen id, and rebuilds the index
+    from all rows when the mirror reports rewritten rows (last_rewrite),
+    i.e. rows edited or deleted by hand. Subclasses define the columns to
+    read and how rows are indexed.
+    """
+
+    name = 'mirror index'
+    # Kolom mirror yang dibaca (urutan = urutan sel di _apply)
+    columns = ()
+
+    def __init__(self, mirror, spreadsheet_config, sync_interval):
+        self.mirror = mirror
+        self.spreadsheet_config = spreadsheet_config
+        self.sync_interval = sync_interval
+
+        self.loaded = False
+        self.last_id = 0
+        self.rows_loaded = 0
+        self.last_sync = None
+        self.syncs = 0
+        self.rebuilds = 0
+        self._rewrite_mark = None
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        # Dibangunkan lebih awal setelah append sendiri (request_sync)
+        self._wake = threading.Event()
+        self._thread = None
+
+    def _apply(self, rows, full):
+        """Index (tab, row number, cells) rows read from the mirror; full=True replaces the whole index (called under lock)"""
+        raise NotImplementedError
+
+    def sync(self):
+        """Index mirror rows added since the last sync (everything again if old rows were rewritten)"""
+        meta = self.mirror.get_meta()
+        if 'rows_synced' not in meta:
+            # Leader belum pernah sync mirror
+            return False
+        mark = meta.get('last_rewrite')
+        full = not self.loaded or mark != self._rewrite_mark
+        rows = self.mirror.query(
+            f"SELECT id, tab, row, {', '.join(self.columns)} FROM reports WHERE id > ? ORDER BY id",
+            (0 if full else self.last_id,)
+        )
+        with self._lock:
+            self._apply(((row['tab'], row['row'], [row[column] for column in self.columns]) for row in rows), full)
+            if full:
+                self.rows_loaded = 0
+                self._rewrite_mark = mark
+                self.rebuilds += 1
+            if rows:
+                self.last_id = rows[-1]['id']
+            self.rows_loaded += len(rows)
+            self.loaded = True
+            self.last_sync = time.time()
+            self.syncs += 1
+        if full:
+            logger.info(f"✅ {self.name.capitalize()} built from {len(rows)} mirror rows")
+        return True
+
+    def request_sync(self):
+        """Sync soon instead of waiting for the next interval"""
+        self._wake.set()
+
+    def _loop(self):
+        while not self._stopped.is_set():
+            try:
+                self.sync()
+            except Exception as e:
+                logger.error(f"❌ Error syncing {self.name}: {e}")
+            self._wake.wait(self.sync_interval)
+            self._wake.clear()
+
+    def start(self):
+        """Build the index and keep it synced with the mirror in a background thread"""
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._loop, name=self.name.replace(' ', '-'), daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        self._wake.set()
+
+    def get_stats(self):
+        return {
+            'loaded': self.loaded,
+            'rows_loaded': self.rows_loaded,
+            'last_id': self.last_id,
+            'syncs': self.syncs,
+            'rebuilds': self.rebuilds,
+            'last_sync': self.last_sync,
+            'sync_interval_seconds': self.sync_interval
+        }
@@ -0,0 +1,458 @@
+# services/persistence_service.py
+import os
+import json
+import zlib
+import sqlite3
+import asyncio
+import logging
+import threading
+
+try:
+    import fcntl
+except ImportError:
+    # Bukan POSIX: mode multi-worker tidak didukung
+    fcntl = None
+
+import telegram
+from telegram import TelegramObject
+from telegram.ext import BasePersistence, PersistenceInput
+
+from services.metrics_service import metrics, timed
+
+logger = logging.getLogger(__name__)
+
+STATE_COMMIT_LATENCY = metrics.histogram(
+    'state_store_commit_duration_seconds',
+    'Latency of writing staged conversation/session changes to SQLite'
+)
+STATE_COMMIT_ROWS = metrics.counter(
+    'state_store_rows_written_total',
+    'Rows written or deleted by state store commits',
+    ['table']
+)
+
+_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS conversations ("
+    " name TEXT NOT NULL, key TEXT NOT NULL, state TEXT NOT NULL, PRIMARY KEY (name, key))",
+    "CREATE TABLE IF NOT EXISTS user_data (user_id INTEGER PRIMARY KEY, data TEXT NOT NULL)",
+    "CREATE TABLE IF NOT EXISTS sessions (user_id TEXT PRIMARY KEY, data TEXT NOT NULL)",
+    # Update yang sudah diterima tapi belum diproses saat shutdown, diproses ulang saat start
+    "CREATE TABLE IF NOT EXISTS pending_updates (update_id INTEGER PRIMARY KEY, data TEXT NOT NULL)",
+    # Durasi /start -> kirim laporan untuk /rekap (tidak ada di sheet)
+    "CREATE TABLE IF NOT EXISTS turnaround (report_key TEXT PRIMARY KEY, day TEXT, month TEXT, seconds REAL)",
+    "CREATE INDEX IF NOT EXISTS turnaround_day ON turnaround (day)",
+    "CREATE INDEX IF NOT EXISTS turnaround_month ON turnaround (month)"
+)
+# Kolom key tabel selain conversations
+_KEY_COLUMNS = {'user_data': 'user_id', 'sessions': 'user_id', 'pending_updates': 'update_id'}
+
+def _turnaround_totals(conn, period_key, value):
+    """(sum of seconds, reports) of one day/month in a state store file"""
+    return conn.execute(
+        f"SELECT COALESCE(SUM(seconds), 0), COUNT(*) FROM turnaround WHERE {period_key} = ?", (value,)
+    ).fetchone()
+
+def _empty_stage():
+    return {'conversations': {}, **{table: {} for table in _KEY_COLUMNS}}
+
+def _json_default(obj):
+    # Objek Telegram di user_data (mis. temp_photo: PhotoSize) disimpan sebagai dict
+    if isinstance(obj, TelegramObject):
+        return {'__telegram__': type(obj).__name__, 'data': obj.to_dict()}
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+def default_state_path():
+    """bot_state.db on the Railway volume when one is attached, else in the working directory"""
+    volume = os.environ.get('RAILWAY_VOLUME_MOUNT_PATH')
+    return os.path.join(volume, 'bot_state.db') if volume else 'bot_state.db'
+
+def shard_state_path(index):
+    """State store file of one dispatcher worker, next to BOT_STATE_DB (bot_state.shard<index>.db)"""
+    root, ext = os.path.splitext(os.environ.get('BOT_STATE_DB') or default_state_path())
+    return f"{root}.shard{index}{ext}"
+
+def _warn_if_ephemeral(path):
+    # Di Railway filesystem container hilang tiap redeploy, hanya volume yang bertahan
+    if not (os.environ.get('RAILWAY_ENVIRONMENT_NAME') or os.environ.get('RAILWAY_ENVIRONMENT')):
+        return
+    volume = os.environ.get('RAILWAY_VOLUME_MOUNT_PATH')
+    if volume and os.path.realpath(path).startswith(os.path.realpath(volume) + os.sep):
+        return
+    logger.warning(
+        f"⚠️⚠️ State store {os.path.realpath(path)} is NOT on a persistent volume - conversations, "
+        f"sessions and queued updates are lost on every redeploy. Attach a Railway volume "
+        f"(BOT_STATE_DB defaults to it) or point BOT_STATE_DB at the volume."
+    )
+
+def conversation_key(name, key):
+    """Row key of one ConversationHandler conversation"""
+    return (name, json.dumps(list(key)))
+
+class StateStore:
+    """SQLite store for conversation state, user_data and sessions.
+
+    Changes are staged in memory and written in one transaction by commit(),
+    so the two halves of a conversation (PTB state and report session) never
+    end up out of sync on disk. With shared=True (more than one gunicorn
+    worker) every worker re-reads a user's rows before handling their update,
+    under a cross-process per-user lock. Every staged change gets a sequence
+    number; commit_through(seq) returns only once that change is on disk,
+    also when another caller's commit took it from the stage first.
+    owns_user (dispatcher shard) limits loading to the rows of those users;
+    peer_paths are the other shards' files, read for /rekap turnaround.
+    """
+
+    # Jumlah slot lock per-user di file lock (user di-hash ke satu byte)
+    LOCK_SLOTS = 65536
+
+    def __init__(self, path=None, legacy_session_file='user_sessions.json', shared=None, owns_user=None, peer_paths=()):
+        self.path = path or os.environ.get('BOT_STATE_DB') or default_state_path()
+        _warn_if_ephemeral(self.path)
+        self.legacy_session_file = legacy_session_file
+        self.owns_user = owns_user
+        self.peer_paths = list(peer_paths)
+        if shared is None:
+            shared = int(os.environ.get('WEB_CONCURRENCY', '1')) > 1
+        if shared and fcntl is None:
+            logger.warning("⚠️ fcntl not available - shared state store disabled")
+            shared = False
+        self.shared = shared
+        self._lock_file = open(f"{self.path}.locks", 'a+b') if shared else None
+        # slot -> jumlah pemegang di proses ini (lock fcntl milik proses, bukan per pemanggil)
+        self._slot_holders = {}
+        self.lock_waits = 0
+        self._conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        for statement in _SCHEMA:
+            self._conn.execute(statement)
+        self._conn.commit()
+        # Koneksi terpisah untuk baca dari event loop, commit() jalan di thread lain
+        self._reader = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+
+        self._stage_lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        # table -> {key: value JSON atau None (hapus)}
+        self._staged = _empty_stage()
+        # Nomor urut perubahan terakhir yang di-stage / yang sudah tertulis ke disk
+        self.staged_seq = 0
+        self.committed_seq = 0
+        self.commits = 0
+        self.commit_errors = 0
+        self.closed = False
+
+    def load_table(self, table):
+        """Read all rows of one table as {key: decoded JSON}"""
+        key_column = 'name, key' if table == 'conversations' else _KEY_COLUMNS[table]
+        value_column = 'state' if table == 'conversations' else 'data'
+        rows = self._reader.execute(f"SELECT {key_column}, {value_column} FROM {table}").fetchall()
+        if table == 'conversations':
+            return {(name, key): json.loads(value) for name, key, value in rows if self._owns(table, key)}
+        return {key: json.loads(value) for key, value in rows if self._owns(table, key)}
+
+    def _owns(self, table, key):
+        """Row belongs to a user of this store (always without owns_user)"""
+        if self.owns_user is None or table == 'pending_updates':
+            return True
+        if table == 'conversations':
+            # key = [chat_id, user_id]
+            key = json.loads(key)[-1]
+        return self.owns_user(key)
+
+    def load_row(self, table, key):
+        """Read one row straight from the database (None if missing)"""
+        if table == 'conversations':
+            row = self._reader.execute(
+                "SELECT state FROM conversations WHERE name = ? AND key = ?", key
+            ).fetchone()
+        else:
+            row = self._reader.execute(
+                f"SELECT data FROM {table} WHERE {_KEY_COLUMNS[table]} = ?", (key,)
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def count(self, table):
+        return self._reader.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+
+    def _slot(self, user_id):
+        return zlib.crc32(str(user_id).encode()) % self.LOCK_SLOTS
+
+    async def lock_user(self, user_id):
+        """Take the cross-process lock of one user (no-op unless shared)"""
+        if not self.shared:
+            return
+        slot = self._slot(user_id)
+        if self._slot_holders.get(slot):
+            self._slot_holders[slot] += 1
+            return
+        delay = 0.005
+        while True:
+            try:
+                fcntl.lockf(self._lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB, 1, slot)
+                break
+            except OSError:
+                # Dipegang worker lain; tunggu tanpa memblokir event loop
+                self.lock_waits += 1
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 0.1)
+        self._slot_holders[slot] = 1
+
+    def unlock_user(self, user_id):
+        if not self.shared:
+            return
+        slot = self._slot(user_id)
+        self._slot_holders[slot] -= 1
+        if not self._slot_holders[slot]:
+            del self._slot_holders[slot]
+            fcntl.lockf(self._lock_file, fcntl.LOCK_UN, 1, slot)
+
+    def load_sessions(self):
+        """All sessions, importing user_sessions.json once if the store is still empty"""
+        sessions = self.load_table('sessions')
+        if sessions or not self.legacy_session_file or not os.path.exists(self.legacy_session_file):
+            return sessions
+        try:
+            with open(self.legacy_session_file, 'r') as f:
+                sessions = {
+                    user_id: session for user_id, session in json.load(f).items()
+                    if self._owns('sessions', user_id)
+                }
+            for user_id, session in sessions.items():
+                self.stage('sessions', user_id, session)
+            self.commit()
+            logger.info(f"✅ Imported {len(sessions)} sessions from {self.legacy_session_file}")
+        except Exception as e:
+            logger.error(f"❌ Error importing legacy sessions: {e}")
+            sessions = {}
+        return sessions
+
+    def stage(self, table, key, value):
+        """Stage a row change (value None deletes the row) for the next commit"""
+        encoded = None if value is None else json.dumps(value, default=_json_default)
+        with self._stage_lock:
+            self._staged[table][key] = encoded
+            self.staged_seq += 1
+
+    @property
+    def pending(self):
+        return sum(len(rows) for rows in self._staged.values())
+
+    @timed(STATE_COMMIT_LATENCY)
+    def commit(self):
+        """Write all staged changes in one transaction"""
+        # Ambil stage di dalam write lock: commit lain yang sedang menulis perubahan
+        # kita harus selesai dulu sebelum commit ini boleh melapor berhasil
+        with self._write_lock:
+            with self._stage_lock:
+                staged = self._staged
+                self._staged = _empty_stage()
+                seq = self.staged_seq
+            if not any(staged.values()):
+                self.committed_seq = max(self.committed_seq, seq)
+                return self.committed_seq >= seq
+
+            try:
+                with self._conn:
+                    for (name, key), state in staged['conversations'].items():
+                        if state is None:
+                            self._conn.execute("DELETE FROM conversations WHERE name = ? AND key = ?", (name, key))
+                        else:
+                            self._conn.execute(
+                                "INSERT OR REPLACE INTO conversations (name, key, state) VALUES (?, ?, ?)",
+                                (name, key, state)
+                            )
+                    for table, key_column in _KEY_COLUMNS.items():
+                        for key, data in staged[table].items():
+                            if data is None:
+                                self._conn.execute(f"DELETE FROM {table} WHERE {key_column} = ?", (key,))
+                            else:
+                                self._conn.execute(
+                                    f"INSERT OR REPLACE INTO {table} ({key_column}, data) VALUES (?, ?)",
+                                    (key, data)
+                                )
+                self.commits += 1
+                self.committed_seq = seq
+                for table, rows in staged.items():
+                    if rows:
+                        STATE_COMMIT_ROWS.inc(len(rows), table=table)
+                return True
+            except Exception as e:
+                self.commit_errors += 1
+                logger.error(f"❌ Error committing state store: {e}")
+                # Kembalikan perubahan yang gagal, kecuali yang sudah ditimpa perubahan lebih baru
+                with self._stage_lock:
+                    for table, rows in staged.items():
+                        for key, value in rows.items():
+                            self._staged[table].setdefault(key, value)
+                return False
+
+    def commit_through(self, seq):
+        """Make sure every change staged up to seq is on disk (False if the write failed)"""
+        if self.committed_seq >= seq:
+            return True
+        return self.commit() and self.committed_seq >= seq
+
+    def claim_pending_updates(self, accept=None):
+        """Remove and return saved updates (ordered by update_id) in one transaction"""
+        with self._write_lock:
+            try:
+                with self._conn:
+                    # IMMEDIATE: worker lain yang start bersamaan tidak mengambil update yang sama
+                    self._conn.execute("BEGIN IMMEDIATE")
+                    rows = self._conn.execute(
+                        "SELECT update_id, data FROM pending_updates ORDER BY update_id"
+                    ).fetchall()
+                    claimed = []
+                    for update_id, data in rows:
+                        data = json.loads(data)
+                        if accept is None or accept(data):
+                            claimed.append(data)
+                            self._conn.execute("DELETE FROM pending_updates WHERE update_id = ?", (update_id,))
+                return claimed
+            except Exception as e:
+                logger.error(f"❌ Error claiming pending updates: {e}")
+                return []
+
+    def record_turnaround(self, report_key, day, month, seconds):
+        """Store how long one report took from /start to submit (blocking, call off the event loop)"""
+        with self._write_lock:
+            with self._conn:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO turnaround (report_key, day, month, seconds) VALUES (?, ?, ?, ?)",
+                    (report_key, day, month, seconds)
+                )
+
+    def turnaround(self, period_key, value):
+        """(sum of seconds, reports) for a day or month ('day'/'month'), including the other shards"""
+        total, reports = _turnaround_totals(self._reader, period_key, value)
+        for path in self.peer_paths:
+            try:
+                conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True, timeout=30)
+            except sqlite3.Error:
+                # Shard belum pernah jalan
+                continue
+            try:
+                peer_total, peer_reports = _turnaround_totals(conn, period_key, value)
+                total += peer_total
+                reports += peer_reports
+            except sqlite3.Error as e:
+                logger.warning(f"⚠️ Cannot read turnaround from {path}: {e}")
+            finally:
+                conn.close()
+        return total, reports
+
+    def close(self):
+        """Commit pending changes and close the connection"""
+        if self.closed:
+            return
+        self.commit()
+        self.closed = True
+        with self._write_lock:
+            self._conn.close()
+        self._reader.close()
+        if self._lock_file:
+            self._lock_file.close()
+
+    def get_stats(self):
+        return {
+            'path': self.path,
+            'shared': self.shared,
+            'lock_waits': self.lock_waits,
+            'commits': self.commits,
+            'commit_errors': self.commit_errors,
+            'pending_rows': self.pending
+        }
+
+class SQLitePersistence(BasePersistence):
+    """PTB persistence for conversation states and user_data backed by StateStore.
+
+    update_* only stage the changed chats; flush() writes them together with
+    staged session changes. The bot calls Application.update_persistence() and
+    flush() after every update since the Application is never start()ed.
+    """
+
+    def __init__(self, store):
+        super().__init__(
+            store_data=PersistenceInput(bot_data=False, chat_data=False, user_data=True, callback_data=False),
+            update_interval=60
+        )
+        self.store = store
+
+    def _decode(self, value):
+        if isinstance(value, dict):
+            if '__telegram__' in value:
+                cls = getattr(telegram, value['__telegram__'])
+                return cls.de_json(value['data'], self.bot)
+            return {key: self._decode(item) for key, item in value.items()}
+        if isinstance(value, list):
+            return [self._decode(item) for item in value]
+        return value
+
+    async def get_user_data(self):
+        return {int(user_id): self._decode(data) for user_id, data in self.store.load_table('user_data').items()}
+
+    async def get_chat_data(self):
+        return {}
+
+    async def get_bot_data(self):
+        return {}
+
+    async def get_callback_data(self):
+        return None
+
+    async def get_conversations(self, name):
+        conversations = {}
+        for (conversation_name, key), state in self.store.load_table('conversations').items():
+            if conversation_name == name:
+                conversations[tuple(json.loads(key))] = state
+        logger.info(f"✅ Restored {len(conversations)} '{name}' conversations")
+        return conversations
+
+    async def update_conversation(self, name, key, new_state):
+        self.store.stage('conversations', conversation_key(name, key), new_state)
+
+    async def update_user_data(self, user_id, data):
+        self.store.stage('user_data', user_id, data)
+
+    async def drop_user_data(self, user_id):
+        self.store.stage('user_data', user_id, None)
+
+    async def update_chat_data(self, chat_id, data):
+        pass
+
+    async def drop_chat_data(self, chat_id):
+        pass
+
+    async def update_bot_data(self, data):
+        pass
+
+    async def update_callback_data(self, data):
+        pass
+
+    async def refresh_user_data(self, user_id, user_data):
+        # Worker lain mungkin sudah mengubah user_data user ini
+        if self.store.shared:
+            data = self.store.load_row('user_data', user_id)
+            user_data.clear()
+            if data:
+                user_data.update(self._decode(data))
+
+    async def refresh_chat_data(self, chat_id, chat_data):
+        pass
+
+    async def refresh_bot_data(self, bot_data):
+        pass
+
+    async def flush(self):
+        """Write staged changes without blocking the event loop.
+
+        Returns only once everything staged before the call is on disk, even
+        if a concurrent flush (another user's update) is writing it.
+        """
+        seq = self.store.staged_seq
+        if self.store.committed_seq >= seq:
+            return True
+        if not await asyncio.to_thread(self.store.commit_through, seq):
+            # Lock user tidak boleh dilepas seolah state sudah tersimpan
+            raise RuntimeError("State store commit failed, changes kept for the next flush")
+        return True
@@ -0,0 +1,115 @@
+# services/photo_budget_service.py
+import os
+import asyncio
+import logging
+from collections import deque
+from contextlib import asynccontextmanager
+
+logger = logging.getLogger(__name__)
+
+# Estimasi ukuran foto jika Telegram tidak mengirim file_size
+DEFAULT_PHOTO_SIZE = 512 * 1024
+
+def bot_processes():
+    """Processes handling updates: dispatcher workers, else gunicorn workers"""
+    return int(os.environ.get('DISPATCH_WORKERS', '0')) or int(os.environ.get('WEB_CONCURRENCY', '1'))
+
+class PhotoByteBudget:
+    """Per-process byte semaphore for photo data in flight (download + Drive upload).
+
+    The counter is not shared between processes: PHOTO_INFLIGHT_BUDGET_MB is
+    the limit for the whole instance and every bot process gets an equal
+    share of it.
+    """
+
+    def __init__(self, budget_bytes=None, processes=None):
+        self.processes = max(1, processes or bot_processes())
+        if budget_bytes is None:
+            budget_mb = float(os.environ.get('PHOTO_INFLIGHT_BUDGET_MB', '64'))
+            budget_bytes = int(budget_mb * 1024 * 1024) // self.processes
+            if self.processes > 1:
+                logger.info(f"📦 Photo byte budget: {budget_bytes} bytes per process ({budget_mb:g} MB / {self.processes} processes)")
+        self.budget_bytes = max(1, budget_bytes)
+
+        self.in_flight_bytes = 0
+        self.peak_in_flight_bytes = 0
+        self.in_flight_photos = 0
+        self.total_admitted = 0
+        self.total_queued = 0
+
+        # FIFO antrian foto yang menunggu budget (future, nbytes)
+        self._waiters = deque()
+
+    def _fits(self, nbytes):
+        # Foto yang lebih besar dari budget tetap boleh jalan sendirian
+        if self.in_flight_bytes == 0:
+            return True
+        return self.in_flight_bytes + nbytes <= self.budget_bytes
+
+    def _admit(self, nbytes):
+        self.in_flight_bytes += nbytes
+        self.in_flight_photos += 1
+        self.total_admitted += 1
+        if self.in_flight_bytes > self.peak_in_flight_bytes:
+            self.peak_in_flight_bytes = self.in_flight_bytes
+
+    def _wake_waiters(self):
+        """Admit queued photos in arrival order while they fit"""
+        while self._waiters:
+            future, nbytes = self._waiters[0]
+            if future.done():
+                self._waiters.popleft()
+                continue
+            if not self._fits(nbytes):
+                break
+            self._waiters.popleft()
+            self._admit(nbytes)
+            future.set_result(True)
+
+    async def acquire(self, nbytes):
+        """Wait until nbytes fit into the budget (over-budget photos are queued, not rejected)"""
+        if not self._waiters and self._fits(nbytes):
+            self._admit(nbytes)
+            return
+
+        self.total_queued += 1
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.append((future, nbytes))
+        logger.info(f"⏳ Photo queued for byte budget ({nbytes} bytes, {self.in_flight_bytes} in flight)")
+
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Sudah di-admit tepat sebelum dibatalkan, kembalikan budget
+                self.release(nbytes)
+            raise
+
+    def release(self, nbytes):
+        """Return nbytes to the budget and admit queued photos"""
+        self.in_flight_bytes = max(0, self.in_flight_bytes - nbytes)
+        self.in_flight_photos = max(0, self.in_flight_photos - 1)
+        self._wake_waiters()
+
+    @asynccontextmanager
+    async def reserve(self, file_size):
+        """Reserve budget for one photo, sized from PhotoSize.file_size"""
+        nbytes = file_size or DEFAULT_PHOTO_SIZE
+        await self.acquire(nbytes)
+        try:
+            yield nbytes
+        finally:
+            self.release(nbytes)
+
+    def get_stats(self):
+        """Get current byte budget metrics"""
+        return {
+            'budget_bytes': self.budget_bytes,
+            'processes': self.processes,
+            'in_flight_bytes': self.in_flight_bytes,
+            'peak_in_flight_bytes': self.peak_in_flight_bytes,
+            'in_flight_photos': self.in_flight_photos,
+            'queued_photos': sum(1 for future, _ in self._waiters if not future.done()),
+            'total_admitted': self.total_admitted,
+            'total_queued': self.total_queued
+        }
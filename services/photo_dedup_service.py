@@ -0,0 +1,108 @@
+# services/photo_dedup_service.py
+import os
+import hashlib
+import logging
+from collections import OrderedDict
+
+from services.metrics_service import metrics
+
+logger = logging.getLogger(__name__)
+
+PHOTO_DEDUP_HITS = metrics.counter('photo_dedup_hits_total', 'Duplicate photos skipped', ['method'])
+
+class PhotoDedupIndex:
+    """LRU index of uploaded photos per report folder (file_unique_id + content hash)"""
+
+    def __init__(self, max_entries=None):
+        if max_entries is None:
+            max_entries = int(os.environ.get('PHOTO_DEDUP_MAX_ENTRIES', '5000'))
+        self.max_entries = max(1, max_entries)
+
+        # (folder_id, file_unique_id) -> {'id', 'name'}
+        self._by_unique_id = OrderedDict()
+        # (folder_id, sha256) -> {'id', 'name'}
+        self._by_hash = OrderedDict()
+
+        self.unique_id_hits = 0
+        self.hash_hits = 0
+        self.evictions = 0
+
+    @staticmethod
+    def hash_file(file_path):
+        """Compute SHA-256 of downloaded photo bytes"""
+        digest = hashlib.sha256()
+        with open(file_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(64 * 1024), b''):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def _get(self, index, key):
+        entry = index.get(key)
+        if entry is not None:
+            index.move_to_end(key)
+        return entry
+
+    def _put(self, index, key, entry):
+        index[key] = entry
+        index.move_to_end(key)
+        while len(index) > self.max_entries:
+            index.popitem(last=False)
+            self.evictions += 1
+
+    def lookup_unique_id(self, folder_id, file_unique_id):
+        """Find duplicate by Telegram file_unique_id (no download needed)"""
+        if not folder_id or not file_unique_id:
+            return None
+        entry = self._get(self._by_unique_id, (folder_id, file_unique_id))
+        if entry:
+            self.unique_id_hits += 1
+            PHOTO_DEDUP_HITS.inc(method='file_unique_id')
+            logger.info(f"♻️ Duplicate photo by file_unique_id: {entry['name']}")
+        return entry
+
+    def lookup_hash(self, folder_id, digest):
+        """Find duplicate by content hash of downloaded bytes"""
+        if not folder_id or not digest:
+            return None
+        entry = self._get(self._by_hash, (folder_id, digest))
+        if entry:
+            self.hash_hits += 1
+            PHOTO_DEDUP_HITS.inc(method='content_hash')
+            logger.info(f"♻️ Duplicate photo by content hash: {entry['name']}")
+        return entry
+
+    def add(self, folder_id, file_unique_id, digest, file_id, name):
+        """Register uploaded photo"""
+        entry = {'id': file_id, 'name': name}
+        if file_unique_id:
+            self._put(self._by_unique_id, (folder_id, file_unique_id), entry)
+        if digest:
+            self._put(self._by_hash, (folder_id, digest), entry)
+
+    def add_alias(self, folder_id, file_unique_id, entry):
+        """Map another file_unique_id to an already uploaded photo"""
+        if file_unique_id:
+            self._put(self._by_unique_id, (folder_id, file_unique_id), entry)
+
+    def forget_file(self, file_id):
+        """Remove entries pointing to a deleted Drive file"""
+        for index in (self._by_unique_id, self._by_hash):
+            for key in [key for key, entry in index.items() if entry['id'] == file_id]:
+                del index[key]
+
+    def forget_folder(self, folder_id):
+        """Remove all entries of a deleted report folder"""
+        for index in (self._by_unique_id, self._by_hash):
+            for key in [key for key in index if key[0] == folder_id]:
+                del index[key]
+
+    def get_stats(self):
+        """Get de-duplication metrics"""
+        return {
+            'unique_id_entries': len(self._by_unique_id),
+            'hash_entries': len(self._by_hash),
+            'max_entries': self.max_entries,
+            'unique_id_hits': self.unique_id_hits,
+            'hash_hits': self.hash_hits,
+            'evictions': self.evictions
+        }
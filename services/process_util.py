@@ -0,0 +1,6 @@
+# services/process_util.py
+import multiprocessing
+
+def process_start_method():
+    """forkserver where available, else spawn: never fork from a threaded process"""
+    return 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
@@ -0,0 +1,255 @@
+# services/profiling_service.py
+import io
+import sys
+import time
+import uuid
+import marshal
+import pstats
+import logging
+import threading
+from collections import Counter
+
+logger = logging.getLogger(__name__)
+
+# Batas durasi satu sesi profiling
+MAX_PROFILE_SECONDS = 30
+# Hasil job profiling yang disimpan untuk diambil request berikutnya
+MAX_PROFILE_JOBS = 10
+
+class _SlowCallbackCollector(logging.Handler):
+    """Collect asyncio debug-mode 'Executing ... took N seconds' warnings"""
+
+    def __init__(self):
+        super().__init__(level=logging.WARNING)
+        self.records = []
+
+    def emit(self, record):
+        message = record.getMessage()
+        if 'took' in message and 'Executing' in message:
+            self.records.append({'time': record.created, 'message': message})
+
+class _CollectedStats:
+    """pstats.Stats source for an already collected stats dict"""
+
+    def __init__(self, stats):
+        self.stats = stats
+
+    def create_stats(self):
+        pass
+
+class ProcessProfiler:
+    """Time-boxed profiling of the live bot process.
+
+    Sessions run as background jobs (start_job), so the HTTP request that
+    starts one returns at once instead of holding a web worker thread
+    while the event loop is being profiled; the result is fetched later
+    by job id. Only one session runs at a time.
+    """
+
+    def __init__(self):
+        # Hanya satu sesi profiling dalam satu waktu
+        self._lock = threading.Lock()
+        self._jobs = {}
+
+    def _clamp(self, seconds):
+        return max(0.1, min(float(seconds), MAX_PROFILE_SECONDS))
+
+    def _run_in_loop(self, loop, func, timeout=5):
+        """Run func inside the event loop thread and wait for it"""
+        done = threading.Event()
+        result = {}
+
+        def runner():
+            try:
+                result['value'] = func()
+            finally:
+                done.set()
+
+        loop.call_soon_threadsafe(runner)
+        if not done.wait(timeout):
+            raise TimeoutError("Event loop did not respond (blocked?)")
+        return result.get('value')
+
+    def _enable_in_loop(self, loop, enable, disable):
+        """Run enable in the loop; if the loop does not respond, queue disable right behind it"""
+        try:
+            self._run_in_loop(loop, enable)
+        except TimeoutError:
+            # enable masih antre dan tetap akan jalan nanti: pastikan langsung dimatikan lagi
+            loop.call_soon_threadsafe(disable)
+            raise
+
+    def start_job(self, mode, func, **kwargs):
+        """Run one profiling session in a background thread; returns the job dict"""
+        if not self._lock.acquire(blocking=False):
+            raise RuntimeError("Another profiling session is running")
+        job = {
+            'id': uuid.uuid4().hex[:12],
+            'mode': mode,
+            'status': 'running',
+            'started_at': time.time(),
+            'finished_at': None,
+            'result': None,
+            'error': None
+        }
+
+        def run():
+            outcome = {'status': 'done'}
+            try:
+                outcome['result'] = func(**kwargs)
+            except Exception as e:
+                logger.error(f"❌ Profiling job {job['id']} failed: {e}")
+                outcome.update(status='error', error=str(e))
+            finally:
+                self._lock.release()
+            # Status diisi terakhir: begitu job terlihat selesai, sesi baru sudah bisa dimulai
+            job.update(finished_at=time.time(), **outcome)
+
+        self._jobs[job['id']] = job
+        while len(self._jobs) > MAX_PROFILE_JOBS:
+            self._jobs.pop(next(iter(self._jobs)))
+        threading.Thread(target=run, name=f"profile-{job['id']}", daemon=True).start()
+        logger.info(f"🔬 Profiling job {job['id']} started: {mode}")
+        return job
+
+    def get_job(self, job_id):
+        return self._jobs.get(job_id)
+
+    def profile_event_loop(self, loop, seconds, output='text', sort='cumulative', limit=60, interval=0.001):
+        """Profile the event loop thread; returns pstats text or marshalled pstats data.
+
+        cProfile cannot be used here: since Python 3.12 it is built on the
+        process-wide sys.monitoring and records every thread (request and
+        executor threads included), with calls of other threads attributed
+        to whatever the loop was running. Instead only the loop thread's
+        stack is sampled every interval seconds and turned into pstats
+        stats: call counts are sample counts, times are sampled wall time.
+        """
+        seconds = self._clamp(seconds)
+        interval = max(0.0005, float(interval))
+        loop_thread = self._run_in_loop(loop, threading.get_ident)
+        # Sampler baru mendapat GIL saat loop melepasnya: tanpa ini burst CPU yang lebih pendek
+        # dari switch interval (default 5ms) tidak pernah terlihat
+        switch_interval = sys.getswitchinterval()
+        sys.setswitchinterval(min(switch_interval, interval))
+        try:
+            stats, samples = self._sample_thread(loop_thread, seconds, interval)
+        finally:
+            sys.setswitchinterval(switch_interval)
+
+        logger.info(f"🔬 Event loop profile done: {samples} samples, {len(stats)} functions")
+        if output == 'pstats':
+            # Bisa dibuka dengan pstats.Stats('<file>')
+            return marshal.dumps(stats)
+
+        stream = io.StringIO()
+        report = pstats.Stats(_CollectedStats(stats), stream=stream)
+        report.sort_stats(sort).print_stats(limit)
+        return stream.getvalue()
+
+    def _sample_thread(self, thread_id, seconds, interval):
+        """Sample one thread's stack into a pstats stats dict; returns (stats, samples)"""
+        # func -> [sampel, sampel, waktu sendiri, waktu kumulatif, {caller: [sampel, sampel, waktu sendiri, waktu kumulatif]}]
+        collected = {}
+        samples = 0
+        previous = time.perf_counter()
+        deadline = previous + seconds
+
+        while time.perf_counter() < deadline:
+            time.sleep(interval)
+            now = time.perf_counter()
+            weight, previous = now - previous, now
+            frame = sys._current_frames().get(thread_id)
+            if frame is None:
+                raise RuntimeError("Event loop thread is gone")
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append((code.co_filename, code.co_firstlineno, code.co_name))
+                frame = frame.f_back
+            samples += 1
+
+            seen = set()
+            for depth, func in enumerate(stack):
+                entry = collected.setdefault(func, [0, 0, 0.0, 0.0, {}])
+                own = weight if depth == 0 else 0.0
+                entry[2] += own
+                # Rekursi: kumulatif dihitung sekali per sampel
+                if func not in seen:
+                    seen.add(func)
+                    entry[0] += 1
+                    entry[1] += 1
+                    entry[3] += weight
+                if depth + 1 < len(stack):
+                    edge = entry[4].setdefault(stack[depth + 1], [0, 0, 0.0, 0.0])
+                    edge[0] += 1
+                    edge[1] += 1
+                    edge[2] += own
+                    edge[3] += weight
+
+        stats = {
+            func: (primitive, calls, own, cumulative, {caller: tuple(edge) for caller, edge in callers.items()})
+            for func, (primitive, calls, own, cumulative, callers) in collected.items()
+        }
+        return stats, samples
+
+    def sample_stacks(self, seconds, interval=0.01):
+        """Sample stacks of all threads; returns collapsed-stack text (flamegraph input)"""
+        seconds = self._clamp(seconds)
+        interval = max(0.001, float(interval))
+        own_thread = threading.get_ident()
+        stacks = Counter()
+        samples = 0
+        deadline = time.perf_counter() + seconds
+
+        while time.perf_counter() < deadline:
+            thread_names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_thread:
+                    continue
+                frames = []
+                while frame is not None:
+                    code = frame.f_code
+                    frames.append(f"{code.co_name} ({code.co_filename}:{frame.f_lineno})")
+                    frame = frame.f_back
+                frames.append(thread_names.get(thread_id, f"thread-{thread_id}"))
+                stacks[';'.join(reversed(frames))] += 1
+            samples += 1
+            time.sleep(interval)
+
+        lines = [f"{stack} {count}" for stack, count in stacks.most_common()]
+        logger.info(f"🔬 Stack sampling done: {samples} samples, {len(stacks)} unique stacks")
+        return '\n'.join(lines) + '\n'
+
+    def detect_slow_callbacks(self, loop, seconds, threshold):
+        """Enable asyncio debug mode for a while and collect callbacks slower than threshold (seconds)"""
+        seconds = self._clamp(seconds)
+        collector = _SlowCallbackCollector()
+        asyncio_logger = logging.getLogger('asyncio')
+        previous = {}
+
+        def enable():
+            previous['debug'] = loop.get_debug()
+            previous['threshold'] = loop.slow_callback_duration
+            loop.slow_callback_duration = threshold
+            loop.set_debug(True)
+
+        def restore():
+            loop.set_debug(previous.get('debug', False))
+            loop.slow_callback_duration = previous.get('threshold', 0.1)
+
+        asyncio_logger.addHandler(collector)
+        try:
+            self._enable_in_loop(loop, enable, restore)
+            try:
+                time.sleep(seconds)
+            finally:
+                self._run_in_loop(loop, restore, timeout=seconds + 30)
+
+            return {
+                'threshold_ms': threshold * 1000,
+                'duration_seconds': seconds,
+                'slow_callbacks': collector.records
+            }
+        finally:
+            asyncio_logger.removeHandler(collector)
@@ -0,0 +1,192 @@
+# services/report_summary_service.py
+import array
+import logging
+import threading
+from collections import Counter
+from datetime import datetime
+
+try:
+    import numpy as np
+except ImportError:  # numpy ada di requirements; kalau tidak terpasang agregasi memakai Counter per baris
+    np = None
+
+from services.metrics_service import metrics
+
+logger = logging.getLogger(__name__)
+
+REKAP_LATENCY = metrics.histogram('rekap_summary_duration_seconds', 'Latency of /rekap aggregation', ['period'])
+
+# Kolom yang dihitung per nilai; teknisi_1 dan teknisi_2 digabung jadi satu hitungan teknisi
+DIMENSIONS = ('report_type', 'sto', 'segment')
+TECHNICIAN_KEYS = ('teknisi_1', 'teknisi_2')
+# Argumen /rekap -> periode
+PERIODS = {'hari': 'hari', 'harian': 'hari', 'bulan': 'bulan', 'bulanan': 'bulan'}
+TOP_VALUES = 10
+
+def period_keys(reported):
+    """'19/10/2026 10:00' -> ('19/10/2026', '10/2026')"""
+    day = reported[:10]
+    return day, day[3:]
+
+class _Vocabulary:
+    """Value <-> int code mapping of a dictionary-encoded column"""
+
+    def __init__(self):
+        self.codes = {}
+        self.values = []
+
+    def encode(self, value):
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+class _Column:
+    def __init__(self, vocabulary):
+        self.vocabulary = vocabulary
+        self.codes = array.array('i')
+
+    def append(self, value):
+        self.codes.append(self.vocabulary.encode(value))
+
+class ReportAggregator:
+    """Daily/monthly report counts over columns built from the sheet mirror.
+
+    Every column is dictionary-encoded into an int array, so a summary is
+    one comparison over the period column plus one bincount per column
+    (numpy), instead of a Python loop over report dicts. New mirror rows
+    are appended incrementally; our own submits are counted at once and
+    skipped when the mirror later syncs the same row. Turnaround times are
+    not in the sheet; they are kept in the state store (the mirror is
+    written by the leader only).
+    """
+
+    def __init__(self, mirror, spreadsheet_config, state_store=None):
+        self.mirror = mirror
+        self.state_store = state_store
+        self.report_types = list(spreadsheet_config.report_type_options.values())
+        self.engine = 'numpy' if np is not None else 'python'
+        # (id_ticket, reported) -> report; submit sendiri yang belum ada di mirror
+        self._pending = {}
+        self.rebuilds = 0
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        vocabularies = {key: _Vocabulary() for key in (*DIMENSIONS, 'teknisi', 'day', 'month')}
+        self._columns = {key: _Column(vocabularies[key]) for key in DIMENSIONS}
+        self._columns.update({key: _Column(vocabularies['teknisi']) for key in TECHNICIAN_KEYS})
+        self._columns['day'] = _Column(vocabularies['day'])
+        self._columns['month'] = _Column(vocabularies['month'])
+        self.last_id = 0
+        self.rows = 0
+        self._rewrite_mark = None
+
+    def _append(self, report):
+        day, month = period_keys(report.get('reported') or '')
+        for key in DIMENSIONS + TECHNICIAN_KEYS:
+            self._columns[key].append((report.get(key) or '').strip())
+        self._columns['day'].append(day)
+        self._columns['month'].append(month)
+        self.rows += 1
+
+    def record(self, report_data, turnaround_seconds=None):
+        """Count a report we just submitted, before the mirror has synced it"""
+        key = (report_data.get('id_ticket'), report_data.get('reported'))
+        with self._lock:
+            self._pending[key] = report_data
+            self._append(report_data)
+        if turnaround_seconds is not None and self.state_store is not None:
+            day, month = period_keys(report_data.get('reported') or '')
+            self.state_store.record_turnaround('|'.join(key), day, month, turnaround_seconds)
+
+    def refresh(self):
+        """Append mirror rows synced since the last call (rebuild if old rows were edited)"""
+        mark = self.mirror.get_meta().get('last_rewrite')
+        rebuild = mark != self._rewrite_mark
+        if rebuild:
+            # Baris lama diedit/dihapus di sheet: bangun ulang semua kolom
+            self._reset()
+            self._rewrite_mark = mark
+            self.rebuilds += 1
+
+        rows = self.mirror.query(
+            "SELECT id, id_ticket, reported, report_type, sto, segment, teknisi_1, teknisi_2 "
+            "FROM reports WHERE id > ? ORDER BY id",
+            (self.last_id,)
+        )
+        for row in rows:
+            # Sudah dihitung saat submit (kecuali kolom baru dibangun ulang)
+            if self._pending.pop((row['id_ticket'], row['reported']), None) is None or rebuild:
+                self._append(row)
+        if rows:
+            self.last_id = rows[-1]['id']
+        if rebuild:
+            for report in self._pending.values():
+                self._append(report)
+
+    def _selection(self, period_key, value):
+        column = self._columns[period_key]
+        code = column.vocabulary.codes.get(value)
+        if code is None:
+            return None
+        if np is not None:
+            return np.flatnonzero(np.frombuffer(column.codes, dtype=np.int32) == code)
+        return [i for i, row_code in enumerate(column.codes) if row_code == code]
+
+    def _count(self, key, selection):
+        column = self._columns[key]
+        values = column.vocabulary.values
+        if np is not None:
+            counts = np.bincount(np.frombuffer(column.codes, dtype=np.int32)[selection], minlength=len(values))
+            present = np.flatnonzero(counts)
+            return Counter(dict(zip((values[code] for code in present), counts[present].tolist())))
+        return Counter(values[column.codes[i]] for i in selection)
+
+    def _turnaround(self, period_key, value):
+        if self.state_store is None:
+            return None
+        total, reports = self.state_store.turnaround(period_key, value)
+        if not reports:
+            return None
+        return {'average_seconds': total / reports, 'reports': reports}
+
+    def summary(self, period='hari', now=None):
+        """Counts per report type, STO, segment and technician for today ('hari') or this month ('bulan')"""
+        day, month = period_keys((now or datetime.now()).strftime("%d/%m/%Y"))
+        period_key, label = ('day', day) if period == 'hari' else ('month', month)
+        with REKAP_LATENCY.time(period=period), self._lock:
+            self.refresh()
+            selection = self._selection(period_key, label)
+            counts = {key: Counter() for key in DIMENSIONS}
+            technicians = Counter()
+            if selection is not None and len(selection):
+                counts = {key: self._count(key, selection) for key in DIMENSIONS}
+                for key in TECHNICIAN_KEYS:
+                    technicians.update(self._count(key, selection))
+            total = len(selection) if selection is not None else 0
+
+        for counter in (*counts.values(), technicians):
+            counter.pop('', None)
+        report_types = counts.pop('report_type')
+        return {
+            'period': period,
+            'label': label,
+            'total': total,
+            # Semua jenis laporan dari konfigurasi ditampilkan, termasuk yang 0
+            'report_type': [(name, report_types.pop(name, 0)) for name in self.report_types] + report_types.most_common(),
+            'sto': counts['sto'].most_common(TOP_VALUES),
+            'segment': counts['segment'].most_common(TOP_VALUES),
+            'teknisi': technicians.most_common(TOP_VALUES),
+            'turnaround': self._turnaround(period_key, label)
+        }
+
+    def get_stats(self):
+        return {
+            'engine': self.engine,
+            'rows': self.rows,
+            'last_id': self.last_id,
+            'pending_submits': len(self._pending),
+            'rebuilds': self.rebuilds
+        }
@@ -0,0 +1,122 @@
+# services/search_service.py
+import os
+import re
+import bisect
+import logging
+
+from services.metrics_service import metrics, timed
+from services.mirror_index_service import MirrorIndex
+from services.sheet_mirror_service import mirror_column
+
+logger = logging.getLogger(__name__)
+
+SEARCH_LATENCY = metrics.histogram('search_query_duration_seconds', 'Latency of /cari index lookups')
+SEARCH_INDEX_TOKENS = metrics.gauge('search_index_tokens', 'Distinct tokens in the report search index')
+
+# Kolom yang bisa dicari lewat /cari
+SEARCH_KEYS = ('id_ticket', 'customer_name', 'service_no', 'sto', 'teknisi_1', 'teknisi_2')
+
+_TOKEN_PATTERN = re.compile(r'\w+')
+
+def tokenize(text):
+    return _TOKEN_PATTERN.findall(str(text).lower())
+
+class SearchIndex(MirrorIndex):
+    """Inverted index (token -> sheet rows) over the searchable report columns.
+
+    Built from the sheet mirror. Tokens are kept sorted as well, so a
+    query term matches every token it is a prefix of with one bisect.
+    Terms of a query are ANDed.
+    """
+
+    name = 'search index'
+
+    def __init__(self, mirror, spreadsheet_config, sync_interval=None):
+        if sync_interval is None:
+            # Hanya baca SQLite lokal, bukan Sheets
+            sync_interval = float(os.environ.get('SEARCH_INDEX_SYNC_SECONDS', '10'))
+        super().__init__(mirror, spreadsheet_config, sync_interval)
+        self.columns = [mirror_column(field) for field in spreadsheet_config.fields]
+        # Posisi kolom dari skema sheet (urutan headers)
+        self._columns = [index for index, field in enumerate(spreadsheet_config.fields) if field.key in SEARCH_KEYS]
+        self._ticket_column = spreadsheet_config.row_keys.index('id_ticket')
+        self._width = len(spreadsheet_config.fields)
+
+        self._records = {}    # (tab, nomor baris) -> nilai sel baris
+        self._postings = {}   # token -> set (tab, nomor baris)
+        self._tokens = []     # token terurut untuk pencarian prefix
+        self.queries = 0
+
+        SEARCH_INDEX_TOKENS.set_function(lambda: len(self._tokens))
+
+    def _apply(self, rows, full):
+        if full:
+            self._records = {}
+            self._postings = {}
+        new_tokens = []
+        for tab, row_number, row in rows:
+            if len(row) <= self._ticket_column or not row[self._ticket_column]:
+                continue
+            if row[self._ticket_column] == self.spreadsheet_config.headers[self._ticket_column]:
+                continue
+            location = (tab, row_number)
+            self._records[location] = tuple(row) + ('',) * (self._width - len(row))
+            for column in self._columns:
+                if column >= len(row):
+                    continue
+                for token in tokenize(row[column]):
+                    rows = self._postings.get(token)
+                    if rows is None:
+                        rows = self._postings[token] = set()
+                        new_tokens.append(token)
+                    rows.add(location)
+
+        if full:
+            self._tokens = sorted(self._postings)
+        else:
+            for token in new_tokens:
+                bisect.insort(self._tokens, token)
+
+    def _match(self, term):
+        rows = set()
+        index = bisect.bisect_left(self._tokens, term)
+        while index < len(self._tokens) and self._tokens[index].startswith(term):
+            rows |= self._postings[self._tokens[index]]
+            index += 1
+        return rows
+
+    def _record(self, location):
+        values = self._records[location]
+        record = {key: values[i] for i, key in enumerate(self.spreadsheet_config.row_keys) if key}
+        record['tab'], record['row'] = location
+        record['location'] = self.spreadsheet_config.describe_row(*location)
+        return record
+
+    def _newest_first(self, location):
+        tab, row_number = location
+        return self.spreadsheet_config.tab_sort_key(tab), row_number
+
+    @timed(SEARCH_LATENCY)
+    def search(self, query, limit=10):
+        """Reports matching all query terms (token or prefix), newest first: (total, [record])"""
+        terms = tokenize(query)
+        if not terms:
+            return 0, []
+        self.queries += 1
+        with self._lock:
+            matched = None
+            for term in terms:
+                rows = self._match(term)
+                matched = rows if matched is None else matched & rows
+                if not matched:
+                    return 0, []
+            rows = sorted(matched, key=self._newest_first, reverse=True)
+            return len(rows), [self._record(row) for row in rows[:limit]]
+
+    def get_stats(self):
+        return {
+            **super().get_stats(),
+            'reports': len(self._records),
+            'tokens': len(self._tokens),
+            'queries': self.queries
+        }
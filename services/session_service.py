@@ -1,40 +1,47 @@
 # services/session_service.py
-import json
-import os
+import copy
 import logging
 from datetime import datetime
 
+from services.metrics_service import metrics, timed
+from services.tracing_service import traced
+
 logger = logging.getLogger(__name__)
 
+# Latency operasi session store
+SESSION_STORE_LATENCY = metrics.histogram(
+    'session_store_operation_duration_seconds',
+    'Latency of SessionService operations',
+    ['operation']
+)
+
 class SessionService:
-    def __init__(self, google_service):
+    """Report sessions kept in memory, persisted through StateStore"""
+
+    def __init__(self, google_service, store):
         self.google_service = google_service
-        self.session_file = 'user_sessions.json'
+        self.store = store
+        self._sessions = store.load_sessions()
+        logger.info(f"✅ Loaded {len(self._sessions)} sessions from {store.path}")
     
-    def _load_sessions(self):
-        """Load sessions from file"""
-        if os.path.exists(self.session_file):
-            try:
-                with open(self.session_file, 'r') as f:
-                    return json.load(f)
-            except Exception as e:
-                logger.error(f"❌ Error loading sessions: {e}")
-                return {}
-        return {}
+    def refresh(self, user_id):
+        """Reload one session from the store (written by another worker)"""
+        session = self.store.load_row('sessions', str(user_id))
+        if session is None:
+            self._sessions.pop(str(user_id), None)
+        else:
+            self._sessions[str(user_id)] = session
     
-    def _save_sessions(self, sessions):
-        """Save sessions to file"""
-        try:
-            with open(self.session_file, 'w') as f:
-                json.dump(sessions, f, indent=2)
-        except Exception as e:
-            logger.error(f"❌ Error saving sessions: {e}")
+    def _save(self, user_id):
+        """Stage one session for the next store commit"""
+        self.store.stage('sessions', user_id, self._sessions.get(user_id))
     
+    @timed(SESSION_STORE_LATENCY, operation='create')
+    @traced('session.create')
     def create_session(self, user_id):
         """Create new session"""
         try:
-            sessions = self._load_sessions()
-            sessions[str(user_id)] = {
+            self._sessions[str(user_id)] = {
                 'report_type': None,
                 'id_ticket': None,
                 'folder_id': None,
@@ -42,29 +49,33 @@ class SessionService:
                 'data': None,
                 'created_at': datetime.now().isoformat()
             }
-            self._save_sessions(sessions)
+            self._save(str(user_id))
             logger.info(f"✅ Session created for user {user_id}")
-            return sessions[str(user_id)]
+            return copy.deepcopy(self._sessions[str(user_id)])
         except Exception as e:
             logger.error(f"❌ Error creating session: {e}")
             return None
     
+    @timed(SESSION_STORE_LATENCY, operation='get')
+    @traced('session.get')
     def get_session(self, user_id):
         """Get current session"""
         try:
-            sessions = self._load_sessions()
-            return sessions.get(str(user_id))
+            # Salinan, supaya perubahan di handler hanya tersimpan lewat update_session
+            session = self._sessions.get(str(user_id))
+            return copy.deepcopy(session) if session is not None else None
         except Exception as e:
             logger.error(f"❌ Error getting session: {e}")
             return None
     
+    @timed(SESSION_STORE_LATENCY, operation='update')
+    @traced('session.update')
     def update_session(self, user_id, data):
         """Update session data"""
         try:
-            sessions = self._load_sessions()
-            if str(user_id) in sessions:
-                sessions[str(user_id)].update(data)
-                self._save_sessions(sessions)
+            if str(user_id) in self._sessions:
+                self._sessions[str(user_id)].update(copy.deepcopy(data))
+                self._save(str(user_id))
                 logger.info(f"✅ Session updated for user {user_id}")
                 return True
             else:
@@ -74,16 +85,26 @@ class SessionService:
             logger.error(f"❌ Error updating session: {e}")
             return False
     
+    @timed(SESSION_STORE_LATENCY, operation='end')
+    @traced('session.end')
     def end_session(self, user_id):
         """End current session"""
         try:
-            sessions = self._load_sessions()
-            if str(user_id) in sessions:
-                del sessions[str(user_id)]
-                self._save_sessions(sessions)
+            if str(user_id) in self._sessions:
+                del self._sessions[str(user_id)]
+                self._save(str(user_id))
                 logger.info(f"✅ Session ended for user {user_id}")
                 return True
             return False
         except Exception as e:
             logger.error(f"❌ Error ending session: {e}")
             return False
+    
+    @timed(SESSION_STORE_LATENCY, operation='count')
+    @traced('session.count')
+    def count_sessions(self):
+        """Count active sessions"""
+        if self.store.shared:
+            # Cache worker ini hanya berisi user yang pernah ditangani di sini
+            return self.store.count('sessions')
+        return len(self._sessions)
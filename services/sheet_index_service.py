@@ -0,0 +1,157 @@
+# services/sheet_index_service.py
+import time
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+class SheetIndex:
+    """Base for in-memory indexes over the report sheet.
+
+    Loaded once with a full read, then synced in a background thread by
+    reading only the rows below the last known one. A full reload runs
+    every full_sync_interval to pick up rows edited or deleted by hand.
+    With SHEET_PARTITION every sync lists the tabs once and reads all
+    report tabs in one batchGet, each from its own last known row; rows
+    are then identified by (tab, row). Subclasses define the range to
+    read and how rows are indexed.
+    """
+
+    name = 'sheet index'
+
+    def __init__(self, google_service, spreadsheet_id, spreadsheet_config, sync_interval, full_sync_interval):
+        self.google_service = google_service
+        self.spreadsheet_id = spreadsheet_id
+        self.spreadsheet_config = spreadsheet_config
+        self.sync_interval = sync_interval
+        self.full_sync_interval = full_sync_interval
+
+        self.tab_rows = {}    # tab -> jumlah baris tabel yang sudah dibaca
+        self.loaded = False
+        self.last_sync = None
+        self.last_full_sync = None
+        self.syncs = 0
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        # Dibangunkan lebih awal setelah append sendiri (request_sync)
+        self._wake = threading.Event()
+        self._thread = None
+
+    @property
+    def rows_loaded(self):
+        return sum(self.tab_rows.values())
+
+    def _range(self, row_offset, tab):
+        raise NotImplementedError
+
+    def _apply(self, rows, full):
+        """Index (tab, row number, cells) rows read from the sheet; full=True replaces the whole index (called under lock)"""
+        raise NotImplementedError
+
+    def _synced(self, full):
+        """Called under lock after a sync, once rows and tab_rows are updated"""
+
+    def _tabs(self):
+        if not self.spreadsheet_config.partition_keys:
+            return [self.spreadsheet_config.sheet_name]
+        titles = self.google_service.get_sheet_titles(self.spreadsheet_id)
+        return None if titles is None else self.spreadsheet_config.report_tabs(titles)
+
+    def _read(self, tab_rows):
+        """Rows below tab_rows[tab] of every report tab: {tab: values} (None on error)"""
+        tabs = self._tabs()
+        if tabs is None:
+            return None
+        ranges = [self._range(tab_rows.get(tab, 0), tab) for tab in tabs]
+        if len(ranges) == 1:
+            values = [self.google_service.read_values(self.spreadsheet_id, ranges[0])]
+        else:
+            values = self.google_service.read_values_batch(self.spreadsheet_id, ranges) if ranges else []
+        if values is None or any(tab_values is None for tab_values in values):
+            return None
+        return dict(zip(tabs, values))
+
+    def _iter_rows(self, tab_values, tab_rows):
+        for tab, values in tab_values.items():
+            first_row = self.spreadsheet_config.table_start_row + tab_rows.get(tab, 0)
+            for i, row in enumerate(values):
+                yield tab, first_row + i, row
+
+    def load(self):
+        """Full load"""
+        tab_values = self._read({})
+        if tab_values is None:
+            return False
+        with self._lock:
+            self._apply(self._iter_rows(tab_values, {}), True)
+            self.tab_rows = {tab: len(values) for tab, values in tab_values.items()}
+            self.loaded = True
+            self.last_sync = self.last_full_sync = time.time()
+            self.syncs += 1
+            self._synced(True)
+        tabs = f" in {len(tab_values)} tabs" if self.spreadsheet_config.partition_keys else ""
+        logger.info(f"✅ {self.name.capitalize()} loaded from {self.rows_loaded} rows{tabs}")
+        return True
+
+    def sync(self):
+        """Incremental sync: read only rows below the last loaded one of each tab"""
+        tab_rows = dict(self.tab_rows)
+        tab_values = self._read(tab_rows)
+        if tab_values is None:
+            return False
+        with self._lock:
+            self._apply(self._iter_rows(tab_values, tab_rows), False)
+            for tab, values in tab_values.items():
+                self.tab_rows[tab] = tab_rows.get(tab, 0) + len(values)
+            self.last_sync = time.time()
+            self.syncs += 1
+            self._synced(False)
+        new_rows = sum(len(values) for values in tab_values.values())
+        if new_rows:
+            logger.info(f"🔄 {self.name.capitalize()} synced: {new_rows} new rows")
+        return True
+
+    def request_sync(self):
+        """Sync soon instead of waiting for the next interval"""
+        self._wake.set()
+
+    def _wait(self):
+        self._wake.wait(self.sync_interval)
+        self._wake.clear()
+        return self._stopped.is_set()
+
+    def _run_sync(self, full):
+        try:
+            return self.load() if full else self.sync()
+        except Exception as e:
+            logger.error(f"❌ Error syncing {self.name}: {e}")
+            return False
+
+    def _loop(self):
+        while not self.loaded and not self._stopped.is_set():
+            if self._run_sync(True):
+                break
+            self._wait()
+        while not self._wait():
+            self._run_sync(time.time() - self.last_full_sync >= self.full_sync_interval)
+
+    def start(self):
+        """Load the index and keep it synced in a background thread"""
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._loop, name=self.name.replace(' ', '-'), daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        self._wake.set()
+
+    def get_stats(self):
+        return {
+            'loaded': self.loaded,
+            'rows_loaded': self.rows_loaded,
+            'tabs': len(self.tab_rows),
+            'syncs': self.syncs,
+            'last_sync': self.last_sync,
+            'sync_interval_seconds': self.sync_interval
+        }
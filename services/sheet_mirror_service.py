@@ -0,0 +1,225 @@
+# services/sheet_mirror_service.py
+import os
+import re
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from datetime import datetime
+
+from services.metrics_service import metrics
+from services.sheet_index_service import SheetIndex
+
+logger = logging.getLogger(__name__)
+
+MIRROR_ROWS_WRITTEN = metrics.counter('sheet_mirror_rows_written_total', 'Rows written to the local sheet mirror', ['change'])
+MIRROR_ROWS = metrics.gauge('sheet_mirror_rows', 'Report rows in the local sheet mirror')
+
+# Kolom yang sering difilter/di-group (rekap, export); reported_date untuk filter rentang tanggal
+MIRROR_INDEXES = (('id_ticket',), ('sto',), ('teknisi_1',), ('teknisi_2',), ('reported_date',))
+
+def reported_date(reported):
+    """'dd/mm/YYYY HH:MM' -> 'YYYYMMDD', comparable for date ranges ('' if unreadable)"""
+    try:
+        return datetime.strptime(str(reported)[:10], '%d/%m/%Y').strftime('%Y%m%d')
+    except ValueError:
+        return ''
+
+def mirror_column(field):
+    """SQLite column name of a sheet field (report key, or header for hand-filled columns)"""
+    return field.key or re.sub(r'\W+', '_', field.header.lower()).strip('_')
+
+def _row_hash(values):
+    return hashlib.blake2b(json.dumps(values).encode(), digest_size=8).hexdigest()
+
+class SheetMirror(SheetIndex):
+    """Local SQLite copy of the report table (A:U), one row per sheet row.
+
+    New rows are appended by incremental syncs; the last synced row of
+    every tab is kept in the database, so a restart continues where it
+    stopped. id only grows with new rows (edits keep theirs), so readers
+    page through new rows with id > last seen id. Every
+    edit_check_interval the whole table is re-read and only rows whose
+    content changed (Status, Resolve, ... filled in by hand) are rewritten.
+    One process writes (leader job), every worker can read. reported_date
+    (YYYYMMDD from Reported) is stored next to the sheet columns and
+    indexed for date range queries.
+    """
+
+    name = 'sheet mirror'
+
+    def __init__(self, google_service, spreadsheet_id, spreadsheet_config, path=None, sync_interval=None, edit_check_interval=None):
+        if sync_interval is None:
+            sync_interval = float(os.environ.get('SHEET_MIRROR_SYNC_SECONDS', '60'))
+        if edit_check_interval is None:
+            edit_check_interval = float(os.environ.get('SHEET_MIRROR_EDIT_CHECK_SECONDS', '600'))
+        super().__init__(google_service, spreadsheet_id, spreadsheet_config, sync_interval, edit_check_interval)
+        self.path = path or os.environ.get('BOT_SHEET_MIRROR_DB', 'sheet_mirror.db')
+        self.columns = [mirror_column(field) for field in spreadsheet_config.fields]
+        self._width = len(self.columns)
+        self._ticket_column = spreadsheet_config.row_keys.index('id_ticket')
+        self._reported_column = spreadsheet_config.row_keys.index('reported')
+        self.edits = 0
+
+        self._conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._migrate()
+        # Koneksi terpisah untuk query (event loop / request Flask), sync jalan di thread sendiri
+        self._reader = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        self._reader.row_factory = sqlite3.Row
+        self._read_lock = threading.Lock()
+
+        self._load_meta()
+
+        MIRROR_ROWS.set_function(lambda: self.count())
+
+    def _migrate(self):
+        """Create or upgrade the schema in one write transaction.
+
+        Every worker opens the mirror at start; BEGIN IMMEDIATE makes them
+        take turns, so only the first one migrates and the others find the
+        new schema.
+        """
+        conn = self._conn
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            existing_columns = [row[1] for row in conn.execute('PRAGMA table_info(reports)')]
+            if existing_columns and 'tab' not in existing_columns:
+                # Mirror dari versi satu tab: hanya cache, dibuang lalu sync ulang penuh
+                logger.info("🔄 Sheet mirror schema changed, resyncing from the sheet")
+                conn.execute('DROP TABLE IF EXISTS reports')
+                conn.execute('DROP TABLE IF EXISTS sync_meta')
+                conn.execute('DROP TABLE IF EXISTS sync_tabs')
+                existing_columns = []
+            column_defs = ', '.join(f'{column} TEXT' for column in self.columns)
+            conn.execute(
+                f'CREATE TABLE IF NOT EXISTS reports (id INTEGER PRIMARY KEY, tab TEXT NOT NULL, row INTEGER NOT NULL, '
+                f'{column_defs}, row_hash TEXT, reported_date TEXT, UNIQUE (tab, row))'
+            )
+            if existing_columns and 'reported_date' not in existing_columns:
+                logger.info("🔄 Sheet mirror: adding reported_date column")
+                conn.execute('ALTER TABLE reports ADD COLUMN reported_date TEXT')
+                conn.executemany(
+                    'UPDATE reports SET reported_date = ? WHERE id = ?',
+                    [(reported_date(reported), row_id) for row_id, reported in conn.execute('SELECT id, reported FROM reports')]
+                )
+            # Index lama di nama bulan (kolom Month) tidak membantu filter tanggal
+            conn.execute('DROP INDEX IF EXISTS reports_month')
+            for columns in MIRROR_INDEXES:
+                conn.execute(f"CREATE INDEX IF NOT EXISTS reports_{'_'.join(columns)} ON reports ({', '.join(columns)})")
+            conn.execute('CREATE TABLE IF NOT EXISTS sync_meta (key TEXT PRIMARY KEY, value REAL)')
+            conn.execute('CREATE TABLE IF NOT EXISTS sync_tabs (tab TEXT PRIMARY KEY, rows_synced INTEGER)')
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+    def _load_meta(self):
+        meta = dict(self._conn.execute('SELECT key, value FROM sync_meta'))
+        if 'rows_synced' in meta:
+            # Lanjut sync incremental dari baris terakhir (run sebelumnya / leader sebelumnya)
+            self.tab_rows = dict(self._conn.execute('SELECT tab, rows_synced FROM sync_tabs'))
+            self.last_full_sync = meta.get('last_edit_check', 0)
+            self.loaded = True
+
+    def start(self):
+        """Start syncing (leader job)"""
+        with self._lock:
+            self._load_meta()
+        super().start()
+
+    def _range(self, row_offset, tab):
+        return self.spreadsheet_config.get_table_range(row_offset, tab)
+
+    def _is_report(self, row):
+        if not any(str(cell).strip() for cell in row):
+            return False
+        return not (len(row) > self._ticket_column and row[self._ticket_column] == self.spreadsheet_config.headers[self._ticket_column])
+
+    def _apply(self, rows, full):
+        reports = {}
+        for tab, row_number, row in rows:
+            if self._is_report(row):
+                cells = [str(cell) for cell in row[:self._width]]
+                cells += [''] * (self._width - len(cells))
+                reports[(tab, row_number)] = cells
+        hashes = {location: _row_hash(cells) for location, cells in reports.items()}
+
+        removed = []
+        if full:
+            existing = {(tab, row_number): row_hash for tab, row_number, row_hash in self._conn.execute('SELECT tab, row, row_hash FROM reports')}
+            changed = [location for location, row_hash in hashes.items() if existing.get(location) != row_hash]
+            edited = sum(1 for location in changed if location in existing)
+            removed = [location for location in existing if location not in reports]
+        else:
+            changed = list(reports)
+            edited = 0
+
+        placeholders = ', '.join('?' * (self._width + 4))
+        updates = ', '.join(f'{column} = excluded.{column}' for column in (*self.columns, 'row_hash', 'reported_date'))
+        with self._conn:
+            # Upsert: baris yang diedit tetap memakai id lamanya
+            self._conn.executemany(
+                f"INSERT INTO reports (tab, row, {', '.join(self.columns)}, row_hash, reported_date) VALUES ({placeholders}) "
+                f"ON CONFLICT (tab, row) DO UPDATE SET {updates}",
+                [
+                    (*location, *reports[location], hashes[location], reported_date(reports[location][self._reported_column]))
+                    for location in changed
+                ]
+            )
+            if removed:
+                self._conn.executemany('DELETE FROM reports WHERE tab = ? AND row = ?', removed)
+            if edited or removed:
+                # Pembaca dengan cache (rekap) membangun ulang kalau nilai ini berubah
+                self._conn.execute("INSERT OR REPLACE INTO sync_meta (key, value) VALUES ('last_rewrite', ?)", (time.time(),))
+
+        MIRROR_ROWS_WRITTEN.inc(len(changed) - edited, change='new')
+        if edited or removed:
+            self.edits += edited
+            MIRROR_ROWS_WRITTEN.inc(edited, change='edited')
+            MIRROR_ROWS_WRITTEN.inc(len(removed), change='deleted')
+            logger.info(f"✏️ Sheet mirror: {edited} rows edited, {len(removed)} removed in the sheet")
+
+    def _synced(self, full):
+        meta = {'rows_synced': self.rows_loaded}
+        if full:
+            meta['last_edit_check'] = time.time()
+        with self._conn:
+            if full:
+                self._conn.execute('DELETE FROM sync_tabs')
+            self._conn.executemany('INSERT OR REPLACE INTO sync_tabs (tab, rows_synced) VALUES (?, ?)', self.tab_rows.items())
+            self._conn.executemany('INSERT OR REPLACE INTO sync_meta (key, value) VALUES (?, ?)', meta.items())
+
+    def get_meta(self):
+        with self._read_lock:
+            return dict(self._reader.execute('SELECT key, value FROM sync_meta').fetchall())
+
+    def query(self, sql, params=()):
+        """Run a read query on the mirror, rows as dicts"""
+        with self._read_lock:
+            return [dict(row) for row in self._reader.execute(sql, params).fetchall()]
+
+    def count(self):
+        with self._read_lock:
+            return self._reader.execute('SELECT COUNT(*) FROM reports').fetchone()[0]
+
+    def close(self):
+        self.stop()
+        if self._thread is not None:
+            self._thread.join(5)
+        with self._lock:
+            self._conn.close()
+        with self._read_lock:
+            self._reader.close()
+
+    def get_stats(self):
+        return {
+            **super().get_stats(),
+            'path': self.path,
+            'reports': self.count(),
+            'edits_detected': self.edits,
+            'edit_check_interval_seconds': self.full_sync_interval
+        }
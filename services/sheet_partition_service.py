@@ -0,0 +1,156 @@
+# services/sheet_partition_service.py
+import logging
+import threading
+
+from services.metrics_service import metrics
+from services.google_service import SheetTabMissing
+
+logger = logging.getLogger(__name__)
+
+PARTITION_TABS_CREATED = metrics.counter('sheet_partition_tabs_created_total', 'Partition tabs created for a new month/report type')
+PARTITION_METADATA_READS = metrics.counter('sheet_partition_metadata_reads_total', 'Spreadsheet tab list reads by the partition registry')
+PARTITION_HEADERS_REPAIRED = metrics.counter('sheet_partition_headers_repaired_total', 'Partition tabs found without title/header rows and fixed')
+
+class SheetPartitions:
+    """Routes report rows to their partition tab (SHEET_PARTITION).
+
+    Tab titles are cached after one metadata read, so a submit only reads
+    spreadsheet metadata when its tab is not known yet (first report of a
+    new month or report type). Missing tabs are created on first use with
+    the title/header rows of the SHEET_NAME tab as template. A cached title
+    is dropped when an append to it fails because the tab is gone (deleted or
+    renamed by hand) and the append is retried once; other failures are not
+    retried, the row may already be written. A tab found without header
+    rows (creation interrupted) gets them.
+    """
+
+    def __init__(self, google_service, spreadsheet_id, spreadsheet_config):
+        self.google_service = google_service
+        self.spreadsheet_id = spreadsheet_id
+        self.spreadsheet_config = spreadsheet_config
+        self.enabled = bool(spreadsheet_config.partition_keys)
+
+        self._tabs = None       # judul tab yang diketahui ada (None = belum dibaca)
+        self._template = None   # baris judul/header untuk tab baru
+        self._lock = threading.Lock()
+        self.tabs_created = 0
+        self.headers_repaired = 0
+        self.append_retries = 0
+        self.metadata_reads = 0
+
+    def _refresh(self):
+        titles = self.google_service.get_sheet_titles(self.spreadsheet_id)
+        self.metadata_reads += 1
+        PARTITION_METADATA_READS.inc()
+        if titles is None:
+            return False
+        self._tabs = set(titles)
+        return True
+
+    def _header_rows(self):
+        """Rows above the table, copied from the SHEET_NAME tab (None on error)"""
+        if self._template is None:
+            values = self.google_service.read_values(self.spreadsheet_id, self.spreadsheet_config.get_header_range())
+            if values is None:
+                return None
+            if not any(values):
+                # Template kosong: cukup header kolom tepat di atas tabel
+                values = [[] for _ in range(self.spreadsheet_config.table_start_row - 2)] + [self.spreadsheet_config.headers]
+            self._template = values
+        return self._template
+
+    def _write_header(self, title):
+        header_rows = self._header_rows()
+        if header_rows is None:
+            return False
+        return self.google_service.write_values(self.spreadsheet_id, self.spreadsheet_config.get_header_range(title), header_rows)
+
+    def _create(self, title):
+        if self._header_rows() is None:
+            return False
+        if not self.google_service.add_sheet(self.spreadsheet_id, title):
+            return False
+        # Kalau header gagal ditulis tab sudah ada: diperbaiki _ensure_header di pemakaian berikutnya
+        if not self._write_header(title):
+            return False
+        self.tabs_created += 1
+        PARTITION_TABS_CREATED.inc()
+        return True
+
+    def _ensure_header(self, title):
+        """Write the header rows if an existing tab has none (False on error)"""
+        values = self.google_service.read_values(self.spreadsheet_id, self.spreadsheet_config.get_header_range(title))
+        if values is None:
+            return False
+        if any(values):
+            return True
+        logger.warning(f"⚠️ Partition tab {title} has no header rows, writing them")
+        if not self._write_header(title):
+            return False
+        self.headers_repaired += 1
+        PARTITION_HEADERS_REPAIRED.inc()
+        return True
+
+    def tab_for(self, laporan_data):
+        """Tab a report row goes to, created on first use (None if it could not be created)"""
+        title = self.spreadsheet_config.partition_tab(laporan_data)
+        if not self.enabled:
+            return title
+
+        with self._lock:
+            if self._tabs is not None and title in self._tabs:
+                return title
+
+            # Tidak ada di cache: baca ulang daftar tab sekali (mungkin dibuat worker lain)
+            if not self._refresh():
+                return None
+            if title not in self._tabs:
+                logger.info(f"🗂️ Creating partition tab {title}")
+                if not self._create(title):
+                    return None
+            elif not self._ensure_header(title):
+                return None
+            self._tabs.add(title)
+            return title
+
+    def forget(self, title):
+        """Drop a cached tab title, so the next tab_for looks it up (or creates it) again"""
+        with self._lock:
+            if self._tabs is not None:
+                self._tabs.discard(title)
+
+    def _append_to(self, sheet_name, laporan_data):
+        try:
+            return self.google_service.update_spreadsheet(self.spreadsheet_id, self.spreadsheet_config, laporan_data, sheet_name)
+        except SheetTabMissing:
+            return None
+
+    def append(self, laporan_data):
+        """Append a report row to its tab; retried once with a fresh tab lookup if the tab is gone"""
+        sheet_name = self.tab_for(laporan_data)
+        if sheet_name is None:
+            return False
+        result = self._append_to(sheet_name, laporan_data)
+        if result is not None:
+            # Timeout/5xx tidak diulang: baris mungkin sudah masuk
+            return result
+        if not self.enabled:
+            return False
+
+        # Judul di cache sudah tidak ada (tab dihapus/di-rename): cari atau buat ulang
+        self.forget(sheet_name)
+        self.append_retries += 1
+        logger.warning(f"⚠️ Partition tab {sheet_name} is gone, checking the tab and retrying once")
+        sheet_name = self.tab_for(laporan_data)
+        return sheet_name is not None and bool(self._append_to(sheet_name, laporan_data))
+
+    def get_stats(self):
+        return {
+            'enabled': self.enabled,
+            'partition_keys': self.spreadsheet_config.partition_keys,
+            'tabs_known': len(self._tabs) if self._tabs is not None else None,
+            'tabs_created': self.tabs_created,
+            'headers_repaired': self.headers_repaired,
+            'append_retries': self.append_retries,
+            'metadata_reads': self.metadata_reads
+        }
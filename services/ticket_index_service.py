@@ -0,0 +1,79 @@
+# services/ticket_index_service.py
+import os
+import logging
+
+from services.metrics_service import metrics
+from services.mirror_index_service import MirrorIndex
+
+logger = logging.getLogger(__name__)
+
+TICKET_INDEX_SIZE = metrics.gauge('ticket_index_size', 'Ticket IDs known in the duplicate index')
+TICKET_DUPLICATES = metrics.counter('ticket_duplicates_detected_total', 'Ticket IDs entered that were already reported')
+
+def normalize_ticket_id(ticket_id):
+    return ticket_id.strip().upper()
+
+class TicketIndex(MirrorIndex):
+    """In-memory index of ticket IDs already in the sheet (column "ID Ticket").
+
+    Only the ticket column of the sheet mirror is read. Our own appends
+    are added right away, so a duplicate check never needs a Sheets call.
+    """
+
+    name = 'ticket index'
+    columns = ('id_ticket',)
+
+    def __init__(self, mirror, spreadsheet_config, sync_interval=None):
+        if sync_interval is None:
+            # Hanya baca SQLite lokal, bukan Sheets
+            sync_interval = float(os.environ.get('TICKET_INDEX_SYNC_SECONDS', '10'))
+        super().__init__(mirror, spreadsheet_config, sync_interval)
+        self.header = spreadsheet_config.fields[spreadsheet_config.row_keys.index('id_ticket')].header
+
+        # ticket id (normalized) -> (tab, nomor baris) di sheet (None = append sendiri, belum tersync)
+        self._rows = {}
+        self.duplicates = 0
+
+        TICKET_INDEX_SIZE.set_function(lambda: len(self._rows))
+
+    def _apply(self, rows, full):
+        indexed = {}
+        for tab, row_number, row in rows:
+            if not row or not str(row[0]).strip() or row[0] == self.header:
+                continue
+            # Baris pertama yang memakai ID ini yang disimpan
+            indexed.setdefault(normalize_ticket_id(str(row[0])), (tab, row_number))
+
+        if full:
+            # Append sendiri yang belum terbaca di sheet tetap disimpan
+            for ticket_id, row in self._rows.items():
+                if row is None:
+                    indexed.setdefault(ticket_id, None)
+            self._rows = indexed
+            return
+        for ticket_id, row in indexed.items():
+            if self._rows.get(ticket_id) is None:
+                self._rows[ticket_id] = row
+
+    def add(self, ticket_id):
+        """Record a ticket we just appended ourselves"""
+        with self._lock:
+            self._rows.setdefault(normalize_ticket_id(ticket_id), None)
+
+    def contains(self, ticket_id):
+        return normalize_ticket_id(ticket_id) in self._rows
+
+    def row_of(self, ticket_id):
+        """(tab, row) of an indexed ticket in the sheet (None if not yet synced or unknown)"""
+        return self._rows.get(normalize_ticket_id(ticket_id))
+
+    def record_duplicate(self):
+        self.duplicates += 1
+        TICKET_DUPLICATES.inc()
+
+    def get_stats(self):
+        return {
+            **super().get_stats(),
+            'tickets': len(self._rows),
+            'duplicates_detected': self.duplicates
+        }
@@ -0,0 +1,265 @@
+# services/tracing_service.py
+import os
+import json
+import time
+import uuid
+import queue
+import random
+import asyncio
+import threading
+import functools
+import contextvars
+import logging
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:
+    # Bukan POSIX: rotasi tidak dikoordinasi antar worker
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Span aktif untuk task/thread saat ini
+_current_span = contextvars.ContextVar('current_span', default=None)
+
+class Span:
+    """One timed operation inside a trace"""
+
+    def __init__(self, trace, name, parent_id=None, attributes=None):
+        self.trace = trace
+        self.name = name
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent_id
+        self.attributes = dict(attributes or {})
+        self.start_time = time.time()
+        self._start = time.perf_counter()
+        self.duration_ms = None
+        self.status = 'ok'
+
+    def set_attribute(self, key, value):
+        self.attributes[key] = value
+
+    def end(self, error=None):
+        if self.duration_ms is not None:
+            return
+        self.duration_ms = (time.perf_counter() - self._start) * 1000
+        if error is not None:
+            self.status = 'error'
+            self.attributes['error'] = str(error)[:200]
+        self.trace.spans.append(self)
+
+    def to_dict(self):
+        return {
+            'span_id': self.span_id,
+            'parent_id': self.parent_id,
+            'name': self.name,
+            'start': self.start_time,
+            'duration_ms': round(self.duration_ms, 3) if self.duration_ms is not None else None,
+            'status': self.status,
+            'attributes': self.attributes
+        }
+
+class Trace:
+    """All spans of one webhook update"""
+
+    def __init__(self, sampled):
+        self.trace_id = uuid.uuid4().hex
+        self.sampled = sampled
+        self.spans = []
+
+class Tracer:
+    """Lightweight per-update tracer writing finished traces to a JSONL sink.
+
+    Opt-in (TRACE_SINK_PATH). Finished traces are queued and written by a
+    background thread, never on the event loop; when the queue is full
+    they are dropped. The sink is rotated at TRACE_SINK_MAX_MB into
+    <sink>.1 ... <sink>.<TRACE_SINK_MAX_FILES>, the oldest one dropped.
+    """
+
+    def __init__(self):
+        self.sink_path = os.environ.get('TRACE_SINK_PATH', '')
+        self.sample_rate = float(os.environ.get('TRACE_SAMPLE_RATE', '0.01'))
+        # Trace lebih lambat dari ini selalu disimpan walaupun tidak tersampling
+        self.slow_threshold_ms = float(os.environ.get('TRACE_SLOW_MS', '5000'))
+        self.max_bytes = int(float(os.environ.get('TRACE_SINK_MAX_MB', '50')) * 1024 * 1024)
+        self.max_files = max(1, int(os.environ.get('TRACE_SINK_MAX_FILES', '5')))
+        self.enabled = bool(self.sink_path)
+        self._lock = threading.Lock()
+        self._queue = queue.Queue(maxsize=1000)
+        self._thread = None
+        self._file = None
+
+        self.traces_started = 0
+        self.traces_written = 0
+        self.traces_dropped = 0
+        self.rotations = 0
+        self.slow_traces = 0
+
+    def start_trace(self, name, **attributes):
+        """Open root span of a new trace (not bound to the current context)"""
+        if not self.enabled:
+            return None
+        self.traces_started += 1
+        trace = Trace(sampled=random.random() < self.sample_rate)
+        return Span(trace, name, attributes=attributes)
+
+    @contextmanager
+    def activate(self, span):
+        """Make span the parent of spans opened in this block"""
+        token = _current_span.set(span)
+        try:
+            yield span
+        finally:
+            _current_span.reset(token)
+
+    @contextmanager
+    def span(self, name, **attributes):
+        """Open child span of the active span; no-op when no trace is active"""
+        parent = _current_span.get()
+        if parent is None:
+            yield None
+            return
+
+        span = Span(parent.trace, name, parent_id=parent.span_id, attributes=attributes)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.end(error=e)
+            raise
+        finally:
+            _current_span.reset(token)
+            span.end()
+
+    def finish_trace(self, root, error=None):
+        """Close root span and write trace if sampled or slow"""
+        if root is None:
+            return
+        root.end(error=error)
+
+        is_slow = root.duration_ms >= self.slow_threshold_ms
+        if is_slow:
+            self.slow_traces += 1
+        if not (root.trace.sampled or is_slow):
+            return
+
+        record = {
+            'trace_id': root.trace.trace_id,
+            'root': root.name,
+            'duration_ms': round(root.duration_ms, 3),
+            'slow': is_slow,
+            'spans': [span.to_dict() for span in sorted(root.trace.spans, key=lambda s: s.start_time)]
+        }
+        self._start_writer()
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            self.traces_dropped += 1
+
+    def _start_writer(self):
+        # Thread dibuat saat trace pertama, bukan saat import (proses worker dispatcher)
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._writer, name='trace-writer', daemon=True)
+                self._thread.start()
+
+    def _is_current_file(self):
+        """False when the sink was rotated (by another worker) or removed since it was opened"""
+        try:
+            return os.stat(self.sink_path).st_ino == os.fstat(self._file.fileno()).st_ino
+        except FileNotFoundError:
+            return False
+
+    def _open_file(self):
+        self._close_file()
+        self._file = open(self.sink_path, 'a', encoding='utf-8')
+
+    def _close_file(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _rotate(self):
+        """sink -> sink.1 -> ... -> sink.<max_files>, then continue in a new sink"""
+        self._file.flush()
+        # Worker gunicorn lain menulis file yang sama: satu yang merotasi
+        if fcntl is not None:
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_EX)
+        try:
+            if self._is_current_file():
+                for index in range(self.max_files - 1, 0, -1):
+                    if os.path.exists(f'{self.sink_path}.{index}'):
+                        os.replace(f'{self.sink_path}.{index}', f'{self.sink_path}.{index + 1}')
+                os.replace(self.sink_path, f'{self.sink_path}.1')
+                self.rotations += 1
+        finally:
+            if fcntl is not None:
+                fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+        self._open_file()
+
+    def _writer(self):
+        while True:
+            record = self._queue.get()
+            try:
+                if record is None:
+                    self._close_file()
+                    return
+                if self._file is None or not self._is_current_file():
+                    self._open_file()
+                elif os.fstat(self._file.fileno()).st_size >= self.max_bytes:
+                    self._rotate()
+                self._file.write(json.dumps(record, default=str) + '\n')
+                self.traces_written += 1
+                # Flush saat antrian kosong supaya trace terbaca walau proses mati mendadak
+                if self._queue.empty():
+                    self._file.flush()
+            except Exception as e:
+                logger.error(f"❌ Error writing trace: {e}")
+            finally:
+                self._queue.task_done()
+
+    def close(self, timeout=5):
+        """Write queued traces and close the sink"""
+        if self._thread is None:
+            return
+        self._queue.put(None)
+        self._thread.join(timeout)
+        self._thread = None
+
+    def get_stats(self):
+        """Get tracer metrics"""
+        return {
+            'enabled': self.enabled,
+            'sink_path': self.sink_path,
+            'sample_rate': self.sample_rate,
+            'slow_threshold_ms': self.slow_threshold_ms,
+            'traces_started': self.traces_started,
+            'traces_written': self.traces_written,
+            'traces_dropped': self.traces_dropped,
+            'queued': self._queue.qsize(),
+            'rotations': self.rotations,
+            'slow_traces': self.slow_traces
+        }
+
+# Tracer global untuk seluruh proses
+tracer = Tracer()
+
+def traced(name):
+    """Decorator: record call (sync or async function) as child span"""
+    def decorator(func):
+        if asyncio.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with tracer.span(name):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with tracer.span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
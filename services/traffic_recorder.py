@@ -0,0 +1,192 @@
+# services/traffic_recorder.py
+import os
+import copy
+import gzip
+import hmac
+import json
+import time
+import queue
+import hashlib
+import logging
+import threading
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+# Field identitas yang dibuang dari objek user/chat saat scrub user_ids
+_IDENTITY_FIELDS = ('last_name', 'username', 'title', 'bio')
+
+class TrafficRecorder:
+    """Opt-in recorder of received webhook updates into rotating gzip JSONL files"""
+
+    def __init__(self, keep_texts=()):
+        self.directory = os.environ.get('WEBHOOK_RECORD_DIR')
+        self.enabled = bool(self.directory)
+        self.max_bytes = int(float(os.environ.get('WEBHOOK_RECORD_MAX_MB', '50')) * 1024 * 1024)
+        self.max_files = int(os.environ.get('WEBHOOK_RECORD_MAX_FILES', '10'))
+        self.scrub = {
+            item.strip() for item in os.environ.get('WEBHOOK_RECORD_SCRUB', 'user_ids,text').split(',') if item.strip()
+        }
+        # Salt tetap per capture supaya user yang sama tetap punya ID samaran yang sama
+        self._salt = (os.environ.get('WEBHOOK_RECORD_SALT') or os.urandom(16).hex()).encode()
+        # Label tombol & command tidak mengandung data pribadi, dibiarkan agar replay tetap jalan
+        self.keep_texts = set(keep_texts)
+
+        self.records_written = 0
+        self.records_dropped = 0
+        self._queue = queue.Queue(maxsize=10000)
+        self._thread = None
+        self._file = None
+        self._file_bytes = 0
+
+        if self.enabled:
+            os.makedirs(self.directory, exist_ok=True)
+            self._thread = threading.Thread(target=self._writer, name='traffic-recorder', daemon=True)
+            self._thread.start()
+            logger.info(f"📼 Recording webhook traffic to {self.directory} (scrub: {', '.join(sorted(self.scrub)) or 'none'})")
+
+    def _pseudonym(self, value):
+        digest = hmac.new(self._salt, str(value).encode(), hashlib.sha256).hexdigest()
+        return int(digest[:12], 16)
+
+    def _scrub_identity(self, obj):
+        if not isinstance(obj, dict):
+            return
+        if 'id' in obj:
+            obj['id'] = self._pseudonym(obj['id'])
+        # first_name wajib ada di User, diganti agar update tetap valid saat replay
+        if 'first_name' in obj:
+            obj['first_name'] = f"user{obj.get('id', '')}"
+        for field in _IDENTITY_FIELDS:
+            obj.pop(field, None)
+
+    def _mask(self, value):
+        # Nilai sama -> samaran sama (ticket ID tetap unik per laporan), panjang dipertahankan
+        core = value.strip()
+        if not core:
+            return value
+        digest = hmac.new(self._salt, core.encode(), hashlib.sha256).hexdigest()
+        masked = (digest * (len(core) // len(digest) + 1))[:len(core)]
+        return value.replace(core, masked, 1)
+
+    def _scrub_text(self, text):
+        if not text or text in self.keep_texts:
+            return text
+        if text.startswith('/'):
+            # Command dipertahankan supaya replay tetap jalan; argumennya (/cari <nama customer>) disamarkan
+            parts = text.split(maxsplit=1)
+            if len(parts) == 1:
+                return text
+            return text[:len(text) - len(parts[1])] + self._scrub_text(parts[1])
+        # Pertahankan struktur "Label : nilai" supaya form tetap bisa di-parse saat replay
+        lines = []
+        for line in text.split('\n'):
+            if ':' in line:
+                key, value = line.split(':', 1)
+                lines.append(f"{key}:{self._mask(value)}")
+            else:
+                lines.append(self._mask(line))
+        return '\n'.join(lines)
+
+    def _scrub_message(self, message):
+        if not isinstance(message, dict):
+            return
+        if 'user_ids' in self.scrub:
+            self._scrub_identity(message.get('from'))
+            self._scrub_identity(message.get('chat'))
+            self._scrub_identity(message.get('forward_from'))
+            message.pop('contact', None)
+        if 'text' in self.scrub:
+            for field in ('text', 'caption'):
+                if field in message:
+                    message[field] = self._scrub_text(message[field])
+        self._scrub_message(message.get('reply_to_message'))
+
+    def scrub_update(self, update_data):
+        """Return scrubbed copy of a raw update dict"""
+        update_data = copy.deepcopy(update_data)
+        for key in ('message', 'edited_message', 'channel_post', 'edited_channel_post'):
+            self._scrub_message(update_data.get(key))
+        callback_query = update_data.get('callback_query')
+        if isinstance(callback_query, dict):
+            if 'user_ids' in self.scrub:
+                self._scrub_identity(callback_query.get('from'))
+            self._scrub_message(callback_query.get('message'))
+        return update_data
+
+    def record(self, update_data, received_at=None):
+        """Queue update for writing (never blocks the webhook)"""
+        if not self.enabled:
+            return
+        try:
+            entry = {'t': received_at or time.time(), 'update': self.scrub_update(update_data)}
+            self._queue.put_nowait(entry)
+        except queue.Full:
+            self.records_dropped += 1
+        except Exception as e:
+            self.records_dropped += 1
+            logger.error(f"❌ Error recording update: {e}")
+
+    def _open_file(self):
+        # PID supaya file beberapa worker gunicorn tidak bentrok
+        filename = f"webhook-{datetime.now().strftime('%Y%m%d-%H%M%S-%f')}-{os.getpid()}.jsonl.gz"
+        self._file = gzip.open(os.path.join(self.directory, filename), 'at', encoding='utf-8')
+        self._file_bytes = 0
+        self._prune_old_files()
+
+    def _prune_old_files(self):
+        files = sorted(
+            name for name in os.listdir(self.directory)
+            if name.startswith('webhook-') and name.endswith('.jsonl.gz')
+        )
+        for name in files[:-self.max_files] if self.max_files > 0 else []:
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except OSError as e:
+                logger.error(f"❌ Error removing old capture {name}: {e}")
+
+    def _close_file(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _writer(self):
+        while True:
+            entry = self._queue.get()
+            try:
+                if entry is None:
+                    self._close_file()
+                    return
+                if self._file is None or self._file_bytes >= self.max_bytes:
+                    self._close_file()
+                    self._open_file()
+                line = json.dumps(entry, ensure_ascii=False) + '\n'
+                self._file.write(line)
+                self._file_bytes += len(line)
+                self.records_written += 1
+                # Flush saat antrian kosong supaya capture terbaca walau proses mati mendadak
+                if self._queue.empty():
+                    self._file.flush()
+            except Exception as e:
+                logger.error(f"❌ Error writing capture: {e}")
+            finally:
+                self._queue.task_done()
+
+    def close(self, timeout=5):
+        """Flush queued records and close the current file"""
+        if not self.enabled or self._thread is None:
+            return
+        self._queue.put(None)
+        self._thread.join(timeout)
+        self._thread = None
+
+    def get_stats(self):
+        """Get recorder metrics"""
+        return {
+            'enabled': self.enabled,
+            'directory': self.directory,
+            'scrub': sorted(self.scrub),
+            'records_written': self.records_written,
+            'records_dropped': self.records_dropped,
+            'queued': self._queue.qsize()
+        }
@@ -0,0 +1,56 @@
+# tests/conftest.py
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config.spreadsheet_config import SpreadsheetConfig
+from services.sheet_mirror_service import SheetMirror
+
+class FakeSheet:
+    """Google service stand-in holding the report table of one tab (rows from table_start_row)"""
+
+    def __init__(self, spreadsheet_config):
+        self.spreadsheet_config = spreadsheet_config
+        self.rows = []
+        self.reads = 0
+
+    def add(self, **report):
+        self.rows.append(self.spreadsheet_config.prepare_row_data(report, 0))
+        return len(self.rows) + self.spreadsheet_config.table_start_row - 1
+
+    def get_sheet_titles(self, spreadsheet_id):
+        return [self.spreadsheet_config.sheet_name]
+
+    def read_values(self, spreadsheet_id, a1_range):
+        self.reads += 1
+        # '<tab>'!A<start>:U -> baris mulai <start>
+        start_row = int(a1_range.split('!')[1].split(':')[0][1:])
+        return [list(row) for row in self.rows[start_row - self.spreadsheet_config.table_start_row:]]
+
+@pytest.fixture(autouse=True)
+def isolated_files(tmp_path, monkeypatch):
+    """State DB, mirror, leader lock and health file of every test go to tmp_path, never the repo root"""
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv('BOT_STATE_DB', str(tmp_path / 'bot_state.db'))
+    monkeypatch.setenv('BOT_SHEET_MIRROR_DB', str(tmp_path / 'sheet_mirror.db'))
+    monkeypatch.setenv('BOT_LEADER_LOCK', str(tmp_path / 'bot_leader.lock'))
+    monkeypatch.setenv('BOT_HEALTH_FILE', str(tmp_path / 'bot_health.json'))
+
+@pytest.fixture
+def spreadsheet_config(monkeypatch):
+    monkeypatch.setenv('SHEET_NAME', 'Sheet1')
+    monkeypatch.delenv('SHEET_PARTITION', raising=False)
+    return SpreadsheetConfig()
+
+@pytest.fixture
+def fake_sheet(spreadsheet_config):
+    return FakeSheet(spreadsheet_config)
+
+@pytest.fixture
+def mirror(fake_sheet, spreadsheet_config, tmp_path):
+    mirror = SheetMirror(fake_sheet, 'sheet', spreadsheet_config, path=str(tmp_path / 'mirror.db'))
+    yield mirror
+    mirror.close()
@@ -0,0 +1,26 @@
+# tests/test_dispatcher_service.py
+from collections import Counter
+
+from services.dispatcher_service import HashRing, update_user_key
+
+KEYS = range(20000)
+
+def test_keys_spread_over_all_nodes():
+    ring = HashRing(range(4), vnodes=128)
+    counts = Counter(ring.node_for(key) for key in KEYS)
+    assert set(counts) == {0, 1, 2, 3}
+    # vnode membuat pembagian kira-kira rata
+    assert max(counts.values()) / min(counts.values()) < 1.5
+
+def test_adding_a_node_only_moves_keys_to_that_node():
+    before = HashRing(range(4), vnodes=128)
+    after = HashRing(range(5), vnodes=128)
+    moved = [key for key in KEYS if before.node_for(key) != after.node_for(key)]
+    assert all(after.node_for(key) == 4 for key in moved)
+    # Sekitar 1/5 key pindah, bukan hampir semua seperti hash modulo
+    assert 0.12 < len(moved) / len(KEYS) < 0.28
+
+def test_update_user_key_uses_sender_then_update_id():
+    assert update_user_key({'update_id': 7, 'message': {'from': {'id': 42}}}) == 42
+    assert update_user_key({'update_id': 7, 'callback_query': {'from': {'id': 43}}}) == 43
+    assert update_user_key({'update_id': 7, 'channel_post': {}}) == 7
@@ -0,0 +1,63 @@
+# tests/test_export_service.py
+import csv
+import io
+
+import pytest
+
+from services.export_service import ExportFilterError, ReportExporter, parse_filters
+from services.sheet_mirror_service import SheetMirror
+
+def test_parse_filters():
+    assert parse_filters({}) == {}
+    assert parse_filters({'from': '2026-10-01', 'to': '2026-10-19', 'report_type': 'BGES, Squad,', 'sto': 'bjm'}) == {
+        'date_from': '20261001',
+        'date_to': '20261019',
+        'report_type': ['BGES', 'Squad'],
+        'sto': ['BJM']
+    }
+    with pytest.raises(ExportFilterError):
+        parse_filters({'from': '19/10/2026'})
+
+@pytest.fixture
+def exporter(fake_sheet, spreadsheet_config, tmp_path):
+    path = str(tmp_path / 'mirror.db')
+    reports = [
+        ('IN1', '30/09/2026 08:00', 'BGES', 'BJM'),
+        ('IN2', '01/10/2026 09:00', 'Squad', 'BJM'),
+        ('IN3', '15/10/2026 10:00', 'BGES', 'BJB'),
+        ('IN4', '19/10/2026 11:00', 'BGES', 'BJM'),
+        ('IN5', '01/11/2026 12:00', 'Non B2B', 'BJM'),
+        # Diketik sebelum validasi form
+        ('IN6', '02/11/2026 08:00', 'bges', 'bjm'),
+    ]
+    for ticket, reported, report_type, sto in reports:
+        fake_sheet.add(id_ticket=ticket, reported=reported, report_type=report_type, sto=sto)
+    mirror = SheetMirror(fake_sheet, 'sheet', spreadsheet_config, path=path)
+    assert mirror.load()
+    mirror.close()
+    return ReportExporter(spreadsheet_config, path=path, page_rows=2)
+
+def _tickets(exporter, filters=None):
+    column = exporter.columns.index('id_ticket')
+    return [[row[column] for row in page] for page in exporter.pages(filters)]
+
+def test_pages_return_every_row_in_order(exporter):
+    assert exporter.available()
+    assert _tickets(exporter) == [['IN1', 'IN2'], ['IN3', 'IN4'], ['IN5', 'IN6']]
+
+def test_pages_apply_filters(exporter):
+    filters = parse_filters({'from': '2026-10-01', 'to': '2026-10-31'})
+    assert _tickets(exporter, filters) == [['IN2', 'IN3'], ['IN4']]
+    filters = parse_filters({'report_type': 'BGES', 'sto': 'bjm'})
+    assert _tickets(exporter, filters) == [['IN1', 'IN4'], ['IN6']]
+    assert _tickets(exporter, parse_filters({'report_type': 'non b2b'})) == [['IN5']]
+    assert _tickets(exporter, parse_filters({'sto': 'XYZ'})) == []
+
+def test_csv_stream_has_header_and_all_rows(exporter):
+    body = ''.join(exporter.stream_csv())
+    rows = list(csv.reader(io.StringIO(body.lstrip('\ufeff'))))
+    assert rows[0] == exporter.headers
+    assert len(rows) == 7
+
+def test_unsynced_mirror_is_not_available(spreadsheet_config, tmp_path):
+    assert not ReportExporter(spreadsheet_config, path=str(tmp_path / 'missing.db')).available()
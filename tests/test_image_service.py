@@ -0,0 +1,57 @@
+# tests/test_image_service.py
+import asyncio
+import os
+from concurrent.futures import Future
+from concurrent.futures.process import BrokenProcessPool
+
+from PIL import Image
+
+from services.image_service import ImageProcessor, _transcode_photo
+
+def _photo(path, size=(400, 300), quality=85):
+    Image.effect_noise(size, 64).convert('RGB').save(path, 'JPEG', quality=quality)
+    return str(path)
+
+class _BrokenPool:
+    def submit(self, *args):
+        future = Future()
+        future.set_exception(BrokenProcessPool('worker died'))
+        return future
+
+    def shutdown(self, wait=True, cancel_futures=False):
+        pass
+
+def test_transcode_keeps_original_when_it_is_not_smaller(tmp_path):
+    path = _photo(tmp_path / 'small.jpg', size=(256, 256), quality=5)
+    original = open(path, 'rb').read()
+
+    result = _transcode_photo(path, 800, 95)
+    assert result['kept_original']
+    assert result['bytes_saved'] == 0
+    assert open(path, 'rb').read() == original
+    assert not os.path.exists(f"{path}.processed")
+
+def test_transcode_downscales_large_photo(tmp_path):
+    path = _photo(tmp_path / 'large.jpg', size=(2000, 1500))
+    result = _transcode_photo(path, 200, 85)
+    assert not result['kept_original']
+    assert result['bytes_saved'] > 0
+    with Image.open(path) as img:
+        assert max(img.size) == 200
+
+def test_broken_pool_is_recreated_for_next_photo(tmp_path, monkeypatch):
+    monkeypatch.setenv('PHOTO_MAX_DIMENSION', '200')
+    processor = ImageProcessor()
+    path = _photo(tmp_path / 'large.jpg', size=(2000, 1500))
+
+    processor._pool = _BrokenPool()
+    assert asyncio.run(processor.process(path)) is None
+    assert processor._pool is None
+    assert processor.pool_restarts == 1
+
+    try:
+        result = asyncio.run(processor.process(path))
+    finally:
+        processor.shutdown()
+    assert result['bytes_saved'] > 0
+    assert processor.get_stats()['photos_processed'] == 1
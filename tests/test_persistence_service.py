@@ -0,0 +1,186 @@
+# tests/test_persistence_service.py
+import asyncio
+import logging
+import sqlite3
+import threading
+
+from telegram import PhotoSize
+
+from services.persistence_service import StateStore, SQLitePersistence, conversation_key, default_state_path, shard_state_path
+
+class _GatedConnection:
+    """sqlite3 connection whose writes wait for a gate (a commit caught mid-write)"""
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.entered = threading.Event()
+        self.gate = threading.Event()
+
+    def __enter__(self):
+        return self.conn.__enter__()
+
+    def __exit__(self, *exc_info):
+        return self.conn.__exit__(*exc_info)
+
+    def execute(self, *args):
+        self.entered.set()
+        self.gate.wait(5)
+        return self.conn.execute(*args)
+
+    def close(self):
+        self.conn.close()
+
+def _store(tmp_path, shared=True):
+    return StateStore(str(tmp_path / 'state.db'), legacy_session_file=None, shared=shared)
+
+def test_flush_waits_for_commit_of_other_user_holding_its_rows(tmp_path):
+    worker1 = _store(tmp_path)
+    worker2 = _store(tmp_path)
+    persistence = SQLitePersistence(worker1)
+    gated = worker1._conn = _GatedConnection(worker1._conn)
+
+    # Commit user B sedang berjalan dan sudah mengambil perubahan user A dari stage
+    worker1.stage('sessions', 'A', {'step': 'form'})
+    committer = threading.Thread(target=worker1.commit)
+    committer.start()
+    assert gated.entered.wait(5)
+    assert worker1.pending == 0
+
+    async def flush_user_a():
+        flush = asyncio.ensure_future(persistence.flush())
+        await asyncio.sleep(0.2)
+        assert not flush.done(), "flush returned while the rows were still being written"
+        gated.gate.set()
+        await flush
+        # Setelah flush (lock user dilepas) worker lain harus membaca state terbaru
+        assert worker2.load_row('sessions', 'A') == {'step': 'form'}
+
+    asyncio.run(flush_user_a())
+    committer.join(5)
+    worker1.close()
+    worker2.close()
+
+def test_flush_without_changes_does_not_commit(tmp_path):
+    store = _store(tmp_path, shared=False)
+    persistence = SQLitePersistence(store)
+    assert asyncio.run(persistence.flush())
+    assert store.commits == 0
+    store.close()
+
+def test_state_db_defaults_to_railway_volume_and_warns_without_it(tmp_path, monkeypatch, caplog):
+    monkeypatch.delenv('BOT_STATE_DB', raising=False)
+    monkeypatch.setenv('RAILWAY_ENVIRONMENT_NAME', 'production')
+    monkeypatch.setenv('RAILWAY_VOLUME_MOUNT_PATH', str(tmp_path))
+    assert default_state_path() == str(tmp_path / 'bot_state.db')
+
+    with caplog.at_level(logging.WARNING):
+        StateStore(legacy_session_file=None, shared=False).close()
+        assert 'NOT on a persistent volume' not in caplog.text
+
+        monkeypatch.setenv('BOT_STATE_DB', str(tmp_path.parent / 'ephemeral.db'))
+        StateStore(legacy_session_file=None, shared=False).close()
+        assert 'NOT on a persistent volume' in caplog.text
+
+class _FailingConnection:
+    """sqlite3 connection whose n-th execute fails, running on_fail first"""
+
+    def __init__(self, conn, fail_at, on_fail=None):
+        self.conn = conn
+        self.fail_at = fail_at
+        self.on_fail = on_fail
+        self.calls = 0
+
+    def __enter__(self):
+        return self.conn.__enter__()
+
+    def __exit__(self, *exc_info):
+        return self.conn.__exit__(*exc_info)
+
+    def execute(self, *args):
+        self.calls += 1
+        if self.calls == self.fail_at:
+            if self.on_fail:
+                self.on_fail()
+            raise sqlite3.OperationalError("disk I/O error")
+        return self.conn.execute(*args)
+
+    def close(self):
+        self.conn.close()
+
+def test_commit_writes_and_deletes_staged_rows(tmp_path):
+    store = _store(tmp_path, shared=False)
+    store.stage('sessions', '1', {'step': 'form'})
+    store.stage('user_data', 1, {'report_type': 'BGES'})
+    store.stage('conversations', conversation_key('report', (1, 1)), 3)
+    assert store.commit()
+    assert store.pending == 0
+    assert store.load_row('sessions', '1') == {'step': 'form'}
+    assert store.load_row('user_data', 1) == {'report_type': 'BGES'}
+    assert store.load_row('conversations', conversation_key('report', (1, 1))) == 3
+
+    store.stage('sessions', '1', None)
+    assert store.commit()
+    assert store.load_row('sessions', '1') is None
+    assert store.count('user_data') == 1
+    store.close()
+
+def test_failed_commit_rolls_back_and_keeps_newer_changes(tmp_path):
+    store = _store(tmp_path, shared=False)
+    real_conn = store._conn
+    store.stage('sessions', '1', {'step': 'photo'})
+    store.stage('sessions', '2', {'step': 'form'})
+
+    # Perubahan baru user 2 masuk stage saat commit sedang gagal
+    store._conn = _FailingConnection(real_conn, fail_at=2, on_fail=lambda: store.stage('sessions', '2', {'step': 'submit'}))
+    assert not store.commit()
+    assert store.commit_errors == 1
+    # Transaksi dibatalkan: baris pertama juga tidak tertulis
+    assert store.load_row('sessions', '1') is None
+    assert store.pending == 2
+
+    store._conn = real_conn
+    assert store.commit()
+    assert store.load_row('sessions', '1') == {'step': 'photo'}
+    assert store.load_row('sessions', '2') == {'step': 'submit'}
+    store.close()
+
+def test_persistence_round_trip_restores_telegram_objects(tmp_path):
+    store = _store(tmp_path, shared=False)
+    persistence = SQLitePersistence(store)
+    photo = PhotoSize(file_id='file-1', file_unique_id='unique-1', width=800, height=600, file_size=1234)
+
+    async def save():
+        await persistence.update_user_data(42, {'temp_photo': photo, 'photos': [{'name': 'a.jpg'}]})
+        await persistence.update_conversation('report', (42, 42), 5)
+        await persistence.flush()
+
+    asyncio.run(save())
+    store.close()
+
+    reopened = SQLitePersistence(_store(tmp_path, shared=False))
+    user_data = asyncio.run(reopened.get_user_data())
+    assert isinstance(user_data[42]['temp_photo'], PhotoSize)
+    assert user_data[42]['temp_photo'] == photo
+    assert user_data[42]['temp_photo'].file_size == 1234
+    assert user_data[42]['photos'] == [{'name': 'a.jpg'}]
+    assert asyncio.run(reopened.get_conversations('report')) == {(42, 42): 5}
+    reopened.store.close()
+
+def test_shard_store_loads_only_its_users(tmp_path, monkeypatch):
+    monkeypatch.setenv('BOT_STATE_DB', str(tmp_path / 'state.db'))
+    assert shard_state_path(1) == str(tmp_path / 'state.shard1.db')
+
+    store = _store(tmp_path, shared=False)
+    for user_id in (1, 2):
+        store.stage('sessions', str(user_id), {'step': 'form'})
+        store.stage('user_data', user_id, {'report_type': 'BGES'})
+        store.stage('conversations', conversation_key('report', (user_id, user_id)), 3)
+    assert store.commit()
+    store.close()
+
+    shard = StateStore(str(tmp_path / 'state.db'), legacy_session_file=None, shared=False,
+                       owns_user=lambda user_id: int(user_id) == 2)
+    assert shard.load_sessions() == {'2': {'step': 'form'}}
+    assert asyncio.run(SQLitePersistence(shard).get_user_data()) == {2: {'report_type': 'BGES'}}
+    assert asyncio.run(SQLitePersistence(shard).get_conversations('report')) == {(2, 2): 3}
+    shard.close()
@@ -0,0 +1,79 @@
+# tests/test_photo_budget_service.py
+import asyncio
+
+from services.photo_budget_service import PhotoByteBudget
+
+async def _settle():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+def test_queued_photos_are_admitted_in_arrival_order():
+    async def scenario():
+        budget = PhotoByteBudget(budget_bytes=100)
+        admitted = []
+
+        async def photo(name, nbytes):
+            await budget.acquire(nbytes)
+            admitted.append(name)
+
+        await photo('first', 60)
+        large = asyncio.create_task(photo('large', 50))
+        await _settle()
+        # Muat di budget, tapi antre di belakang foto besar (FIFO, tidak menyalip)
+        small = asyncio.create_task(photo('small', 10))
+        await _settle()
+        assert admitted == ['first']
+        assert budget.get_stats()['queued_photos'] == 2
+
+        budget.release(60)
+        await asyncio.gather(large, small)
+        assert admitted == ['first', 'large', 'small']
+        assert budget.in_flight_bytes == 60
+        assert budget.peak_in_flight_bytes == 60
+
+    asyncio.run(scenario())
+
+def test_photo_larger_than_budget_runs_alone():
+    async def scenario():
+        budget = PhotoByteBudget(budget_bytes=100)
+        await budget.acquire(500)
+        assert budget.in_flight_bytes == 500
+
+        waiter = asyncio.create_task(budget.acquire(10))
+        await _settle()
+        assert not waiter.done()
+
+        budget.release(500)
+        await waiter
+        assert budget.in_flight_bytes == 10
+        assert budget.total_queued == 1
+
+    asyncio.run(scenario())
+
+def test_cancelled_waiter_does_not_block_the_queue():
+    async def scenario():
+        budget = PhotoByteBudget(budget_bytes=100)
+        await budget.acquire(100)
+        cancelled = asyncio.create_task(budget.acquire(80))
+        waiting = asyncio.create_task(budget.acquire(20))
+        await _settle()
+        cancelled.cancel()
+        await _settle()
+
+        budget.release(100)
+        await waiting
+        assert budget.in_flight_bytes == 20
+        assert budget.in_flight_photos == 1
+
+    asyncio.run(scenario())
+
+def test_budget_is_split_over_bot_processes(monkeypatch):
+    monkeypatch.setenv('PHOTO_INFLIGHT_BUDGET_MB', '64')
+    monkeypatch.setenv('WEB_CONCURRENCY', '4')
+    monkeypatch.delenv('DISPATCH_WORKERS', raising=False)
+    assert PhotoByteBudget().budget_bytes == 16 * 1024 * 1024
+
+    # Mode dispatcher: gunicorn 1 worker, update diproses worker dispatcher
+    monkeypatch.setenv('WEB_CONCURRENCY', '1')
+    monkeypatch.setenv('DISPATCH_WORKERS', '2')
+    assert PhotoByteBudget().budget_bytes == 32 * 1024 * 1024
@@ -0,0 +1,28 @@
+# tests/test_photo_dedup_service.py
+from services.metrics_service import metrics
+from services.photo_dedup_service import PhotoDedupIndex
+
+def _hits(method):
+    prefix = f'photo_dedup_hits_total{{method="{method}"}} '
+    lines = [line for line in metrics.render().splitlines() if line.startswith(prefix)]
+    return float(lines[0][len(prefix):]) if lines else 0
+
+def test_hits_are_counted_per_method():
+    index = PhotoDedupIndex()
+    before = _hits('file_unique_id'), _hits('content_hash')
+    index.add('folder', 'unique', 'sha', 'file-1', 'foto_1.jpg')
+
+    assert index.lookup_unique_id('folder', 'unique')['id'] == 'file-1'
+    assert index.lookup_hash('folder', 'sha')['name'] == 'foto_1.jpg'
+    assert index.lookup_unique_id('other-folder', 'unique') is None
+
+    assert (_hits('file_unique_id'), _hits('content_hash')) == (before[0] + 1, before[1] + 1)
+    assert '# TYPE photo_dedup_hits_total counter' in metrics.render()
+
+def test_lru_evicts_oldest_entries():
+    index = PhotoDedupIndex(max_entries=2)
+    for i in range(3):
+        index.add('folder', f'unique-{i}', None, f'file-{i}', f'foto_{i}.jpg')
+    assert index.lookup_unique_id('folder', 'unique-0') is None
+    assert index.lookup_unique_id('folder', 'unique-2')['id'] == 'file-2'
+    assert index.evictions == 1
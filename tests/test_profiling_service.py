@@ -0,0 +1,100 @@
+# tests/test_profiling_service.py
+import asyncio
+import marshal
+import threading
+import time
+
+import pytest
+
+from services.profiling_service import ProcessProfiler
+
+@pytest.fixture
+def loop():
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    yield loop
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join(5)
+    loop.close()
+
+def _wait_job(profiler, job_id, timeout=10):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = profiler.get_job(job_id)
+        if job['status'] != 'running':
+            return job
+        time.sleep(0.02)
+    raise AssertionError("profiling job did not finish")
+
+def test_enable_that_times_out_is_undone_once_the_loop_resumes(loop):
+    profiler = ProcessProfiler()
+    original = profiler._run_in_loop
+    profiler._run_in_loop = lambda loop, func, timeout=5: original(loop, func, timeout=0.2)
+
+    release = threading.Event()
+    loop.call_soon_threadsafe(release.wait, 5)
+    calls = []
+
+    with pytest.raises(TimeoutError):
+        profiler._enable_in_loop(loop, lambda: calls.append('enable'), lambda: calls.append('disable'))
+
+    release.set()
+    asyncio.run_coroutine_threadsafe(asyncio.sleep(0), loop).result(5)
+    assert calls == ['enable', 'disable']
+
+def test_start_job_runs_in_background_and_keeps_result():
+    profiler = ProcessProfiler()
+    release = threading.Event()
+
+    job = profiler.start_job('sample', lambda: release.wait(5) and 'stacks')
+    assert profiler.get_job(job['id'])['status'] == 'running'
+    with pytest.raises(RuntimeError):
+        profiler.start_job('sample', lambda: None)
+
+    release.set()
+    finished = _wait_job(profiler, job['id'])
+    assert finished['status'] == 'done'
+    assert finished['result'] == 'stacks'
+
+    # Lock dilepas setelah job selesai
+    second = profiler.start_job('sample', lambda: 1 / 0)
+    assert _wait_job(profiler, second['id'])['status'] == 'error'
+    assert profiler.get_job('unknown') is None
+
+def test_profile_event_loop_returns_stats(loop):
+    profiler = ProcessProfiler()
+    job = profiler.start_job('cprofile', profiler.profile_event_loop, loop=loop, seconds=0.2)
+    finished = _wait_job(profiler, job['id'])
+    assert finished['status'] == 'done'
+    assert 'function calls' in finished['result']
+
+def _busy_other_thread(stop):
+    while not stop.is_set():
+        [x * x for x in range(2000)]
+        time.sleep(0.001)
+
+def test_profile_event_loop_leaves_out_other_threads(loop):
+    async def loop_work():
+        while True:
+            # Loop tertahan ~20ms per putaran
+            deadline = time.perf_counter() + 0.02
+            while time.perf_counter() < deadline:
+                pass
+            await asyncio.sleep(0.005)
+
+    stop = threading.Event()
+    work = asyncio.run_coroutine_threadsafe(loop_work(), loop)
+    other = threading.Thread(target=_busy_other_thread, args=(stop,), daemon=True)
+    other.start()
+    try:
+        data = ProcessProfiler().profile_event_loop(loop, seconds=0.5, output='pstats')
+    finally:
+        work.cancel()
+        asyncio.run_coroutine_threadsafe(asyncio.sleep(0.05), loop).result(5)
+        stop.set()
+        other.join(5)
+
+    functions = {name for _, _, name in marshal.loads(data)}
+    assert 'loop_work' in functions
+    assert '_busy_other_thread' not in functions
@@ -0,0 +1,75 @@
+# tests/test_report_form.py
+import pytest
+
+from config.bot_messages import render_confirmation, render_form_created, render_form_edit
+from config.report_form import ReportFormParser, normalize_label
+from config.spreadsheet_config import ReportField, SpreadsheetConfig
+
+FORM = """Report Type: BGES
+Customer Name: PT Maju Jaya
+Service No: 1234 5678 90
+Segment: DGS
+Teknisi 1: Budi
+Teknisi 2: Andi
+STO: bjm
+Valins ID: VL-001"""
+
+@pytest.fixture
+def parser():
+    return ReportFormParser(SpreadsheetConfig())
+
+def test_normalize_label_ignores_case_and_separators():
+    assert normalize_label('  Teknisi_1 ') == 'teknisi1'
+    assert normalize_label('Service-No.') == 'serviceno'
+
+def test_parse_complete_form(parser):
+    values, errors = parser.parse(FORM)
+    assert errors == []
+    assert values == {
+        'customer_name': 'PT Maju Jaya',
+        'service_no': '1234567890',
+        'segment': 'DGS',
+        'teknisi_1': 'Budi',
+        'teknisi_2': 'Andi',
+        'sto': 'BJM',
+        'valins_id': 'VL-001'
+    }
+
+def test_aliases_and_loose_labels_are_recognized(parser):
+    text = FORM.replace('Customer Name:', 'nama pelanggan :').replace('Teknisi 1:', 'TEKNISI_1:').replace('Valins ID:', 'Valins:')
+    values, errors = parser.parse(text)
+    assert errors == []
+    assert values['customer_name'] == 'PT Maju Jaya'
+    assert values['teknisi_1'] == 'Budi'
+    assert values['valins_id'] == 'VL-001'
+
+def test_first_value_of_a_field_wins_and_colons_in_values_are_kept(parser):
+    values, errors = parser.parse(FORM + "\nSegment: LAIN\nCatatan tanpa titik dua")
+    assert values['segment'] == 'DGS'
+    values, errors = parser.parse(FORM.replace('VL-001', 'VL:001'))
+    assert values['valins_id'] == 'VL:001'
+
+def test_missing_and_invalid_fields_are_reported(parser):
+    text = FORM.replace('Teknisi 2: Andi', 'Teknisi 2:').replace('STO: bjm', 'STO: bjm1').replace('1234 5678 90', 'abc')
+    values, errors = parser.parse(text)
+    assert errors[0] == 'Field berikut harus diisi: Teknisi 2'
+    assert any(error.startswith('Service No:') for error in errors)
+    assert any(error.startswith('STO:') for error in errors)
+    assert values['teknisi_2'] == ''
+
+def test_empty_text_lists_every_required_field(parser):
+    values, errors = parser.parse(None)
+    assert len(errors) == 1
+    assert 'Customer Name' in errors[0] and 'Valins ID' in errors[0]
+
+def test_new_schema_field_is_in_every_form_text():
+    config = SpreadsheetConfig()
+    config.form_fields.append(ReportField("ODP", 'odp', form=True))
+    blank = render_form_created(config.form_fields, 'BGES', 'IN1', 'https://drive/x')
+    assert blank.endswith("Valins ID : \nODP : ")
+
+    values, errors = ReportFormParser(config).parse(FORM + "\nODP : ODP-BJM-01")
+    assert errors == []
+    report = dict(values, report_type='BGES', id_ticket='IN1', folder_link='https://drive/x')
+    assert render_form_edit(config.form_fields, report).endswith("ODP : ODP-BJM-01")
+    assert "ODP: ODP-BJM-01\n" in render_confirmation(config.form_fields, report, [])
@@ -0,0 +1,88 @@
+# tests/test_report_summary_service.py
+from datetime import datetime
+
+from services.persistence_service import StateStore
+from services.report_summary_service import ReportAggregator, period_keys
+
+NOW = datetime(2026, 10, 19, 15, 0)
+
+def _report(ticket, sto='BJM', reported='19/10/2026 10:00', **extra):
+    return {
+        'id_ticket': ticket, 'reported': reported, 'report_type': 'BGES', 'sto': sto,
+        'segment': 'DGS', 'teknisi_1': 'Budi', 'teknisi_2': 'Andi', **extra
+    }
+
+def test_period_keys():
+    assert period_keys('19/10/2026 10:00') == ('19/10/2026', '10/2026')
+
+def test_daily_and_monthly_counts(fake_sheet, spreadsheet_config, mirror):
+    fake_sheet.add(**_report('IN1'))
+    fake_sheet.add(**_report('IN2', sto='BJB'))
+    fake_sheet.add(**_report('IN3', reported='02/10/2026 08:00'))
+    fake_sheet.add(**_report('IN4', reported='30/09/2026 08:00'))
+    assert mirror.load()
+    aggregator = ReportAggregator(mirror, spreadsheet_config)
+
+    today = aggregator.summary('hari', now=NOW)
+    assert today['total'] == 2
+    assert today['sto'] == [('BJM', 1), ('BJB', 1)]
+    assert today['teknisi'] == [('Budi', 2), ('Andi', 2)]
+    assert today['report_type'] == [('Non B2B', 0), ('BGES', 2), ('Squad', 0)]
+
+    month = aggregator.summary('bulan', now=NOW)
+    assert month['total'] == 3
+    assert month['label'] == '10/2026'
+
+def test_own_submit_is_counted_once_before_and_after_the_mirror_syncs_it(fake_sheet, spreadsheet_config, mirror, tmp_path):
+    fake_sheet.add(**_report('IN1'))
+    assert mirror.load()
+    store = StateStore(str(tmp_path / 'state.db'), legacy_session_file=None, shared=False)
+    aggregator = ReportAggregator(mirror, spreadsheet_config, store)
+    assert aggregator.summary('hari', now=NOW)['total'] == 1
+
+    aggregator.record(_report('IN2'), turnaround_seconds=120)
+    summary = aggregator.summary('hari', now=NOW)
+    assert summary['total'] == 2
+    assert summary['turnaround'] == {'average_seconds': 120, 'reports': 1}
+
+    fake_sheet.add(**_report('IN2'))
+    assert mirror.sync()
+    assert aggregator.summary('hari', now=NOW)['total'] == 2
+    assert aggregator.get_stats()['pending_submits'] == 0
+    store.close()
+
+def test_rows_edited_in_the_sheet_rebuild_the_columns(fake_sheet, spreadsheet_config, mirror):
+    fake_sheet.add(**_report('IN1'))
+    fake_sheet.add(**_report('IN2'))
+    assert mirror.load()
+    aggregator = ReportAggregator(mirror, spreadsheet_config)
+    assert aggregator.summary('hari', now=NOW)['sto'] == [('BJM', 2)]
+
+    # Submit yang belum tersinkron tetap terhitung setelah rebuild
+    aggregator.record(_report('IN3', sto='BJB'))
+    fake_sheet.rows[0] = spreadsheet_config.prepare_row_data(_report('IN1', sto='BJB'), 0)
+    assert mirror.load()
+
+    summary = aggregator.summary('hari', now=NOW)
+    assert aggregator.rebuilds == 1
+    assert summary['total'] == 3
+    assert summary['sto'] == [('BJB', 2), ('BJM', 1)]
+
+    fake_sheet.add(**_report('IN3', sto='BJB'))
+    assert mirror.sync()
+    assert aggregator.summary('hari', now=NOW)['total'] == 3
+
+def test_turnaround_includes_other_dispatcher_shards(fake_sheet, spreadsheet_config, mirror, tmp_path):
+    assert mirror.load()
+    peer = StateStore(str(tmp_path / 'state.shard1.db'), legacy_session_file=None, shared=False)
+    peer.record_turnaround('IN1|19/10/2026 10:00', '19/10/2026', '10/2026', 60)
+    peer.close()
+    store = StateStore(
+        str(tmp_path / 'state.shard0.db'), legacy_session_file=None, shared=False,
+        peer_paths=[str(tmp_path / 'state.shard1.db'), str(tmp_path / 'state.shard2.db')]
+    )
+    aggregator = ReportAggregator(mirror, spreadsheet_config, store)
+
+    aggregator.record(_report('IN2'), turnaround_seconds=180)
+    assert aggregator.summary('hari', now=NOW)['turnaround'] == {'average_seconds': 120, 'reports': 2}
+    store.close()
@@ -0,0 +1,80 @@
+# tests/test_search_service.py
+from services.search_service import SearchIndex, tokenize
+
+def _index(mirror, spreadsheet_config):
+    assert mirror.load()
+    index = SearchIndex(mirror, spreadsheet_config)
+    assert index.sync()
+    return index
+
+def test_tokenize_lowercases_and_splits_on_punctuation():
+    assert tokenize('PT. Maju-Jaya 01') == ['pt', 'maju', 'jaya', '01']
+
+def test_prefix_terms_match_every_token_they_start(fake_sheet, spreadsheet_config, mirror):
+    fake_sheet.add(id_ticket='IN100', customer_name='Budi Santoso', sto='BJM', teknisi_1='Andi')
+    fake_sheet.add(id_ticket='IN101', customer_name='Bunga Citra', sto='BJB', teknisi_1='Andi')
+    fake_sheet.add(id_ticket='IN102', customer_name='Cahya', sto='BJM', teknisi_1='Budiman')
+    index = _index(mirror, spreadsheet_config)
+
+    total, records = index.search('bu')
+    assert total == 3
+    # Baris terbaru dulu
+    assert [record['id_ticket'] for record in records] == ['IN102', 'IN101', 'IN100']
+
+    total, records = index.search('budi')
+    assert {record['id_ticket'] for record in records} == {'IN100', 'IN102'}
+    assert index.search('budis') == (0, [])
+
+def test_terms_are_anded(fake_sheet, spreadsheet_config, mirror):
+    fake_sheet.add(id_ticket='IN100', customer_name='Budi', sto='BJM')
+    fake_sheet.add(id_ticket='IN101', customer_name='Budi', sto='BJB')
+    index = _index(mirror, spreadsheet_config)
+
+    total, records = index.search('budi bjb')
+    assert total == 1
+    assert records[0]['id_ticket'] == 'IN101'
+    assert records[0]['row'] == 4
+    assert index.search('budi xyz') == (0, [])
+    assert index.search('  ') == (0, [])
+
+def test_index_waits_for_the_first_mirror_sync(fake_sheet, spreadsheet_config, mirror):
+    fake_sheet.add(id_ticket='IN100', customer_name='Budi')
+    index = SearchIndex(mirror, spreadsheet_config)
+    assert not index.sync()
+    assert not index.loaded
+    assert fake_sheet.reads == 0
+
+def test_new_mirror_rows_are_added_without_reading_the_sheet(fake_sheet, spreadsheet_config, mirror):
+    fake_sheet.add(id_ticket='IN100', customer_name='Budi')
+    index = _index(mirror, spreadsheet_config)
+    fake_sheet.add(id_ticket='IN101', customer_name='Agus')
+    assert mirror.sync()
+    reads = fake_sheet.reads
+
+    assert index.sync()
+    assert fake_sheet.reads == reads
+    assert index.search('ag')[0] == 1
+    assert index.search('in10')[0] == 2
+    assert index.rows_loaded == 2
+    assert index.rebuilds == 1
+
+def test_rows_edited_in_the_sheet_rebuild_the_index(fake_sheet, spreadsheet_config, mirror):
+    fake_sheet.add(id_ticket='IN100', customer_name='Budi')
+    fake_sheet.add(id_ticket='IN101', customer_name='Agus')
+    index = _index(mirror, spreadsheet_config)
+
+    fake_sheet.rows[0] = spreadsheet_config.prepare_row_data({'id_ticket': 'IN100', 'customer_name': 'Cahya'}, 0)
+    assert mirror.load()
+    assert index.sync()
+    assert index.rebuilds == 2
+    assert index.search('budi') == (0, [])
+    assert index.search('cahya')[0] == 1
+    assert index.rows_loaded == 2
+
+def test_limit_keeps_total(fake_sheet, spreadsheet_config, mirror):
+    for i in range(5):
+        fake_sheet.add(id_ticket=f'IN{i}', customer_name='Budi')
+    index = _index(mirror, spreadsheet_config)
+    total, records = index.search('budi', limit=2)
+    assert total == 5
+    assert len(records) == 2
@@ -0,0 +1,71 @@
+# tests/test_sheet_mirror_service.py
+import sqlite3
+import threading
+
+from services.export_service import ReportExporter, parse_filters
+from services.sheet_mirror_service import SheetMirror, mirror_column, reported_date
+
+def _old_mirror(path, spreadsheet_config, reports):
+    """Mirror file as written before reported_date existed (index on Month)"""
+    columns = [mirror_column(field) for field in spreadsheet_config.fields]
+    conn = sqlite3.connect(path)
+    conn.execute(
+        f"CREATE TABLE reports (id INTEGER PRIMARY KEY, tab TEXT NOT NULL, row INTEGER NOT NULL, "
+        f"{', '.join(f'{column} TEXT' for column in columns)}, row_hash TEXT, UNIQUE (tab, row))"
+    )
+    conn.execute('CREATE INDEX reports_month ON reports (month)')
+    for row, (ticket, reported) in enumerate(reports, start=3):
+        conn.execute('INSERT INTO reports (tab, row, id_ticket, reported) VALUES (?, ?, ?, ?)', ('Sheet1', row, ticket, reported))
+    conn.commit()
+    conn.close()
+
+def test_reported_date():
+    assert reported_date('19/10/2026 10:00') == '20261019'
+    assert reported_date('') == ''
+    assert reported_date('kemarin') == ''
+
+def test_old_mirror_gets_indexed_reported_date(fake_sheet, spreadsheet_config, tmp_path):
+    path = str(tmp_path / 'mirror.db')
+    _old_mirror(path, spreadsheet_config, [('IN1', '30/09/2026 08:00'), ('IN2', '01/10/2026 09:00')])
+
+    mirror = SheetMirror(fake_sheet, 'sheet', spreadsheet_config, path=path)
+    rows = mirror.query('SELECT id_ticket, reported_date FROM reports ORDER BY id')
+    assert [(row['id_ticket'], row['reported_date']) for row in rows] == [('IN1', '20260930'), ('IN2', '20261001')]
+    indexes = {row['name'] for row in mirror.query("SELECT name FROM sqlite_master WHERE type = 'index'")}
+    assert 'reports_reported_date' in indexes
+    assert 'reports_month' not in indexes
+    mirror.close()
+
+def test_workers_opening_an_old_mirror_together_migrate_once(fake_sheet, spreadsheet_config, tmp_path):
+    path = str(tmp_path / 'mirror.db')
+    _old_mirror(path, spreadsheet_config, [('IN1', '30/09/2026 08:00')])
+    mirrors, errors = [], []
+
+    def open_mirror():
+        try:
+            mirrors.append(SheetMirror(fake_sheet, 'sheet', spreadsheet_config, path=path))
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=open_mirror) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(10)
+    assert errors == []
+    assert mirrors[0].query('SELECT reported_date FROM reports')[0]['reported_date'] == '20260930'
+    for mirror in mirrors:
+        mirror.close()
+
+def test_synced_rows_store_reported_date_and_export_filters_use_its_index(fake_sheet, spreadsheet_config, tmp_path):
+    path = str(tmp_path / 'mirror.db')
+    fake_sheet.add(id_ticket='IN1', reported='19/10/2026 10:00')
+    mirror = SheetMirror(fake_sheet, 'sheet', spreadsheet_config, path=path)
+    assert mirror.load()
+    assert mirror.query('SELECT reported_date FROM reports')[0]['reported_date'] == '20261019'
+
+    exporter = ReportExporter(spreadsheet_config, path=path)
+    where, params = exporter._where(parse_filters({'from': '2026-10-01', 'to': '2026-10-31'}))
+    plan = mirror.query(f'EXPLAIN QUERY PLAN SELECT id FROM reports WHERE 1{where}', params)
+    assert any('reports_reported_date' in row['detail'] for row in plan)
+    mirror.close()
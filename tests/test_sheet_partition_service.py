@@ -0,0 +1,108 @@
+# tests/test_sheet_partition_service.py
+import pytest
+
+from config.spreadsheet_config import SpreadsheetConfig
+from services.google_service import SheetTabMissing
+from services.sheet_partition_service import SheetPartitions
+
+class FakeSheets:
+    """Tabs as {title: {range: values}}, appends as {title: [rows]}"""
+
+    def __init__(self, tabs=()):
+        self.headers = {title: [] for title in tabs}
+        self.rows = {title: [] for title in tabs}
+        self.fail_header_writes = 0
+        self.fail_appends = 0
+        self.title_reads = 0
+
+    def get_sheet_titles(self, spreadsheet_id):
+        self.title_reads += 1
+        return list(self.rows)
+
+    def read_values(self, spreadsheet_id, a1_range):
+        title = a1_range.split('!')[0].strip("'")
+        if a1_range.endswith('!A1:U2'):
+            return self.headers.get(title, [])
+        return []
+
+    def add_sheet(self, spreadsheet_id, title):
+        self.rows.setdefault(title, [])
+        self.headers.setdefault(title, [])
+        return True
+
+    def write_values(self, spreadsheet_id, a1_range, values):
+        if self.fail_header_writes:
+            self.fail_header_writes -= 1
+            return False
+        self.headers[a1_range.split('!')[0].strip("'")] = values
+        return True
+
+    def update_spreadsheet(self, spreadsheet_id, spreadsheet_config, laporan_data, sheet_name=None):
+        if sheet_name not in self.rows:
+            raise SheetTabMissing(sheet_name)
+        self.rows[sheet_name].append(laporan_data['id_ticket'])
+        if self.fail_appends:
+            # Timeout/5xx setelah baris tertulis
+            self.fail_appends -= 1
+            return False
+        return True
+
+@pytest.fixture
+def config(monkeypatch):
+    monkeypatch.setenv('SHEET_NAME', 'Sheet1')
+    monkeypatch.setenv('SHEET_PARTITION', 'month')
+    return SpreadsheetConfig()
+
+def _report(ticket, reported='05/03/2026 10:00'):
+    return {'id_ticket': ticket, 'reported': reported}
+
+def test_append_recreates_a_cached_tab_that_was_deleted(config):
+    sheets = FakeSheets(['Sheet1'])
+    sheets.headers['Sheet1'] = [['Laporan'], ['Report Type', 'ID Ticket']]
+    partitions = SheetPartitions(sheets, 'sheet', config)
+
+    assert partitions.append(_report('IN1'))
+    assert sheets.rows['2026-03'] == ['IN1']
+
+    # Tab dihapus manual setelah judulnya di-cache
+    del sheets.rows['2026-03']
+    del sheets.headers['2026-03']
+
+    assert partitions.append(_report('IN2'))
+    assert sheets.rows['2026-03'] == ['IN2']
+    assert sheets.headers['2026-03'] == sheets.headers['Sheet1']
+    assert partitions.append_retries == 1
+
+def test_tab_left_without_header_gets_it_on_next_use(config):
+    sheets = FakeSheets(['Sheet1'])
+    sheets.headers['Sheet1'] = [['Laporan'], ['Report Type', 'ID Ticket']]
+    sheets.fail_header_writes = 1
+    partitions = SheetPartitions(sheets, 'sheet', config)
+
+    # add_sheet berhasil, header gagal ditulis
+    assert partitions.tab_for(_report('IN1')) is None
+    assert '2026-03' in sheets.rows and sheets.headers['2026-03'] == []
+
+    assert partitions.tab_for(_report('IN1')) == '2026-03'
+    assert sheets.headers['2026-03'] == sheets.headers['Sheet1']
+    assert partitions.headers_repaired == 1
+
+def test_known_tab_is_not_looked_up_again(config):
+    sheets = FakeSheets(['Sheet1', '2026-03'])
+    sheets.headers['2026-03'] = [['Laporan'], ['Report Type', 'ID Ticket']]
+    partitions = SheetPartitions(sheets, 'sheet', config)
+
+    assert partitions.append(_report('IN1'))
+    assert partitions.append(_report('IN2'))
+    assert sheets.title_reads == 1
+    assert sheets.rows['2026-03'] == ['IN1', 'IN2']
+
+def test_failed_append_to_existing_tab_is_not_retried(config):
+    sheets = FakeSheets(['Sheet1', '2026-03'])
+    sheets.headers['2026-03'] = [['Laporan'], ['Report Type', 'ID Ticket']]
+    sheets.fail_appends = 1
+    partitions = SheetPartitions(sheets, 'sheet', config)
+
+    assert not partitions.append(_report('IN1'))
+    assert sheets.rows['2026-03'] == ['IN1']
+    assert partitions.append_retries == 0
@@ -0,0 +1,40 @@
+# tests/test_ticket_index_service.py
+from services.ticket_index_service import TicketIndex, normalize_ticket_id
+
+def test_normalize_ticket_id():
+    assert normalize_ticket_id(' in123 ') == 'IN123'
+
+def test_tickets_come_from_the_mirror(fake_sheet, spreadsheet_config, mirror):
+    fake_sheet.add(id_ticket='IN100')
+    fake_sheet.add(id_ticket='in100')
+    fake_sheet.add(id_ticket='IN101')
+    assert mirror.load()
+    index = TicketIndex(mirror, spreadsheet_config)
+    assert index.sync()
+
+    assert index.contains(' in100')
+    # Baris pertama yang memakai ID ini
+    assert index.row_of('IN100') == ('Sheet1', 3)
+    assert index.row_of('IN101') == ('Sheet1', 5)
+    assert not index.contains('IN102')
+
+def test_own_append_survives_a_rebuild_until_the_mirror_has_it(fake_sheet, spreadsheet_config, mirror):
+    fake_sheet.add(id_ticket='IN100')
+    assert mirror.load()
+    index = TicketIndex(mirror, spreadsheet_config)
+    assert index.sync()
+
+    index.add('IN101')
+    assert index.contains('IN101') and index.row_of('IN101') is None
+
+    # Baris dihapus manual: mirror ditulis ulang, index dibangun ulang
+    fake_sheet.rows[0] = spreadsheet_config.prepare_row_data({'id_ticket': 'IN099'}, 0)
+    assert mirror.load()
+    assert index.sync()
+    assert not index.contains('IN100')
+    assert index.contains('IN101') and index.row_of('IN101') is None
+
+    fake_sheet.add(id_ticket='IN101')
+    assert mirror.sync()
+    assert index.sync()
+    assert index.row_of('IN101') == ('Sheet1', 4)
@@ -0,0 +1,52 @@
+# tests/test_tracing_service.py
+import json
+
+from services.tracing_service import Tracer
+
+def _trace(tracer, name='webhook'):
+    root = tracer.start_trace(name)
+    with tracer.activate(root):
+        with tracer.span('sheets.append'):
+            pass
+    tracer.finish_trace(root)
+
+def _sampled_tracer(monkeypatch, tmp_path, **env):
+    monkeypatch.setenv('TRACE_SINK_PATH', str(tmp_path / 'traces.jsonl'))
+    monkeypatch.setenv('TRACE_SAMPLE_RATE', '1')
+    for key, value in env.items():
+        monkeypatch.setenv(key, value)
+    return Tracer()
+
+def test_sink_is_off_by_default(monkeypatch):
+    monkeypatch.delenv('TRACE_SINK_PATH', raising=False)
+    tracer = Tracer()
+    assert not tracer.enabled
+    assert tracer.start_trace('webhook') is None
+
+def test_traces_are_written_by_the_background_writer(monkeypatch, tmp_path):
+    tracer = _sampled_tracer(monkeypatch, tmp_path)
+    _trace(tracer)
+    tracer.close()
+
+    records = [json.loads(line) for line in (tmp_path / 'traces.jsonl').read_text().splitlines()]
+    assert [span['name'] for span in records[0]['spans']] == ['webhook', 'sheets.append']
+    assert tracer.get_stats()['traces_written'] == 1
+
+def test_sink_is_rotated_by_size(monkeypatch, tmp_path):
+    # ~0 MB: setiap trace memicu rotasi
+    tracer = _sampled_tracer(monkeypatch, tmp_path, TRACE_SINK_MAX_MB='0.0001', TRACE_SINK_MAX_FILES='2')
+    for _ in range(5):
+        _trace(tracer)
+        tracer._queue.join()
+    tracer.close()
+
+    assert sorted(path.name for path in tmp_path.iterdir()) == ['traces.jsonl', 'traces.jsonl.1', 'traces.jsonl.2']
+    assert tracer.rotations == 4
+    assert tracer.traces_written == 5
+
+def test_full_queue_drops_traces(monkeypatch, tmp_path):
+    tracer = _sampled_tracer(monkeypatch, tmp_path)
+    tracer._thread = object()   # writer tidak jalan
+    for _ in range(tracer._queue.maxsize + 3):
+        _trace(tracer)
+    assert tracer.traces_dropped == 3
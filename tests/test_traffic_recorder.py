@@ -0,0 +1,32 @@
+# tests/test_traffic_recorder.py
+import pytest
+
+from services.traffic_recorder import TrafficRecorder
+
+@pytest.fixture
+def recorder(monkeypatch):
+    monkeypatch.delenv('WEBHOOK_RECORD_DIR', raising=False)
+    monkeypatch.setenv('WEBHOOK_RECORD_SALT', 'salt')
+    return TrafficRecorder(keep_texts={'📝 Buat Laporan'})
+
+def _update(text):
+    return {'update_id': 1, 'message': {'message_id': 1, 'text': text, 'from': {'id': 42, 'first_name': 'Budi'}}}
+
+def test_command_arguments_are_masked(recorder):
+    text = recorder.scrub_update(_update('/cari PT Foo'))['message']['text']
+    assert text.startswith('/cari ')
+    assert 'PT' not in text and 'Foo' not in text
+    assert len(text) == len('/cari PT Foo')
+    # Nilai yang sama -> samaran yang sama
+    assert recorder.scrub_update(_update('/cari PT Foo'))['message']['text'] == text
+
+def test_bare_commands_and_button_labels_are_kept(recorder):
+    assert recorder.scrub_update(_update('/start'))['message']['text'] == '/start'
+    assert recorder.scrub_update(_update('/rekap@laporan_bot'))['message']['text'] == '/rekap@laporan_bot'
+    assert recorder.scrub_update(_update('📝 Buat Laporan'))['message']['text'] == '📝 Buat Laporan'
+
+def test_form_values_are_masked_but_labels_kept(recorder):
+    text = recorder.scrub_update(_update('Customer Name : PT Foo\nSTO : BJM'))['message']['text']
+    assert text.split('\n')[0].startswith('Customer Name :')
+    assert 'PT Foo' not in text and 'BJM' not in text
+    assert recorder.scrub_update(_update('x'))['message']['from']['id'] != 42
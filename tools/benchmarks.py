@@ -0,0 +1,466 @@
+# tools/benchmarks.py - Microbenchmarks for the session store and report pipeline
+"""
+Usage:
+    python -m tools.benchmarks run --save benchmarks/baseline.json
+    python -m tools.benchmarks run --only session,form --quick
+    python -m tools.benchmarks compare --threshold 0.2
+    python -m tools.benchmarks compare benchmarks/baseline.json current.json
+
+Suites:
+    session   SessionService get/update/create+end/count, update+SQLite commit and
+              startup reload at 10, 1k and 100k sessions
+    row       SpreadsheetConfig.prepare_row_data
+    form      ReportFormParser used by input_data
+    render    confirmation text rendering (0 and 20 photos)
+    photo     download -> process -> upload of one photo against tools/fake_servers.py
+              (in-process, no network), sequential latency and concurrent throughput
+    rekap     /rekap daily/monthly summary over a sheet mirror of 1k and 100k reports,
+              column build from the mirror and summary of already built columns
+
+Every result is the time per operation; compare uses the median over repeats
+and exits with status 1 when any benchmark is slower than the baseline by
+more than --threshold (0.2 = 20%).
+
+compare defaults to the committed reference baseline benchmarks/baseline.json
+(full run, requirements.txt installed). Timings depend on the machine: when
+comparing on different hardware, record a local baseline first with
+run --save and compare against that. A change that makes the pipeline faster
+or slower on purpose updates the committed baseline in the same commit.
+"""
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import asyncio
+import logging
+import argparse
+import platform
+import statistics
+import subprocess
+import tempfile
+from datetime import datetime
+from types import SimpleNamespace
+
+SUITES = ('session', 'row', 'form', 'render', 'photo', 'rekap')
+SESSION_SIZES = (10, 1_000, 100_000)
+REKAP_SIZES = (1_000, 100_000)
+# Baseline referensi yang di-commit, default untuk compare
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks', 'baseline.json')
+
+SAMPLE_FORM = (
+    "Customer Name : PT Contoh Sejahtera\n"
+    "Service No : 123456789\n"
+    "Segment : DBS\n"
+    "Teknisi 1 : Budi\n"
+    "Teknisi 2 : Andi\n"
+    "STO : BJM\n"
+    "Valins ID : VAL1234"
+)
+
+SAMPLE_REPORT = {
+    'report_type': 'BGES',
+    'id_ticket': 'INC12345678',
+    'folder_link': 'https://drive.google.com/drive/folders/abc123',
+    'reported': '19/10/2026 08:15',
+    'customer_name': 'PT Contoh Sejahtera',
+    'service_no': '123456789',
+    'segment': 'DBS',
+    'teknisi_1': 'Budi',
+    'teknisi_2': 'Andi',
+    'sto': 'BJM',
+    'valins_id': 'VAL1234'
+}
+
+def _summary(samples, loops):
+    """Per-op statistics in microseconds"""
+    per_op = [sample / loops * 1e6 for sample in samples]
+    median = statistics.median(per_op)
+    return {
+        'median_us': median,
+        'mean_us': statistics.mean(per_op),
+        'min_us': min(per_op),
+        'stdev_us': statistics.stdev(per_op) if len(per_op) > 1 else 0.0,
+        'ops_per_sec': 1e6 / median if median else 0.0,
+        'loops': loops,
+        'repeat': len(per_op)
+    }
+
+def measure(func, min_time=0.2, repeat=5):
+    """Time func() like timeit: calibrate loops to min_time, take several repeats"""
+    loops = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(loops):
+            func()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            break
+        loops *= 10 if elapsed < min_time / 10 else 2
+
+    # Operasi lambat (mis. 100k session) cukup 3 repeat
+    if elapsed > 1.0:
+        repeat = min(repeat, 3)
+    samples = [elapsed]
+    for _ in range(repeat - 1):
+        start = time.perf_counter()
+        for _ in range(loops):
+            func()
+        samples.append(time.perf_counter() - start)
+    return _summary(samples, loops)
+
+def _fake_session(user_id):
+    return {
+        'report_type': 'BGES',
+        'id_ticket': f'INC{user_id:08d}',
+        'folder_id': f'folder{user_id}',
+        'photos': [{'id': f'file{user_id}_{i}', 'name': f'foto {i}'} for i in range(3)],
+        'data': dict(SAMPLE_REPORT, id_ticket=f'INC{user_id:08d}'),
+        'created_at': datetime.now().isoformat()
+    }
+
+def bench_session(quick):
+    from services.session_service import SessionService
+    from services.persistence_service import StateStore
+
+    results = {}
+    sizes = SESSION_SIZES[:2] if quick else SESSION_SIZES
+    workdir = tempfile.mkdtemp(prefix='bench_sessions_')
+    try:
+        for size in sizes:
+            db_path = os.path.join(workdir, f'state_{size}.db')
+            store = StateStore(db_path, legacy_session_file=None)
+            for user_id in range(size):
+                store.stage('sessions', str(user_id), _fake_session(user_id))
+            store.commit()
+            service = SessionService(google_service=None, store=store)
+
+            user_ids = list(range(size))
+            new_user = size + 1
+
+            def get():
+                service.get_session(random.choice(user_ids))
+
+            def update():
+                service.update_session(random.choice(user_ids), {'folder_id': 'folder_updated'})
+
+            def update_commit():
+                update()
+                store.commit()
+
+            def create_end():
+                service.create_session(new_user)
+                service.end_session(new_user)
+
+            def load():
+                StateStore(db_path, legacy_session_file=None).load_sessions()
+
+            results[f'session.get[{size}]'] = measure(get)
+            results[f'session.update[{size}]'] = measure(update)
+            results[f'session.create_end[{size}]'] = measure(create_end)
+            results[f'session.count[{size}]'] = measure(service.count_sessions)
+            # Biaya per update sebenarnya: ubah session lalu commit ke SQLite
+            results[f'session.update_commit[{size}]'] = measure(update_commit)
+            # Waktu reload semua session saat startup
+            results[f'session.load[{size}]'] = measure(load)
+            store.close()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return results
+
+def bench_row(quick):
+    from config.spreadsheet_config import SpreadsheetConfig
+
+    config = SpreadsheetConfig()
+    return {'row.prepare_row_data': measure(lambda: config.prepare_row_data(SAMPLE_REPORT, 0))}
+
+def bench_form(quick):
+    from config.spreadsheet_config import SpreadsheetConfig
+    from config.report_form import ReportFormParser
+
+    parser = ReportFormParser(SpreadsheetConfig())
+    return {'form.parse': measure(lambda: parser.parse(SAMPLE_FORM))}
+
+def bench_render(quick):
+    from config.bot_messages import render_confirmation
+    from config.spreadsheet_config import SpreadsheetConfig
+
+    form_fields = SpreadsheetConfig().form_fields
+    photos = [{'id': f'file{i}', 'name': f'Foto eviden {i}'} for i in range(1, 21)]
+    return {
+        'render.confirmation[0]': measure(lambda: render_confirmation(form_fields, SAMPLE_REPORT, [])),
+        'render.confirmation[20]': measure(lambda: render_confirmation(form_fields, SAMPLE_REPORT, photos))
+    }
+
+def bench_photo(quick):
+    from tools.fake_servers import start_servers
+
+    telegram_server, google_server = start_servers()
+    os.environ['TELEGRAM_API_BASE_URL'] = telegram_server.base_url
+    os.environ['GOOGLE_API_BASE_URL'] = google_server.base_url
+    os.environ.setdefault('PARENT_FOLDER_ID', 'bench_parent')
+
+    from telegram import PhotoSize
+    from bot import TelegramBot
+
+    count = 10 if quick else 40
+    concurrency = 8
+    workdir = tempfile.mkdtemp(prefix='bench_photo_')
+    previous_cwd = os.getcwd()
+    loop = asyncio.new_event_loop()
+    try:
+        # File temp foto ditulis relatif ke cwd
+        os.chdir(workdir)
+        bot = TelegramBot('123:bench', 'bench_sheet')
+        if not loop.run_until_complete(bot.initialize_application()):
+            raise RuntimeError("Bot application failed to initialize against fake servers")
+        context = SimpleNamespace(bot=bot.application.bot)
+        folder_id = bot.google_service.create_folder('BENCH_PHOTO', os.environ['PARENT_FOLDER_ID'])
+
+        counter = iter(range(1_000_000))
+
+        def new_photo():
+            index = next(counter)
+            return PhotoSize(
+                file_id=f'bench_{index}', file_unique_id=f'ubench_{index}',
+                width=1280, height=1706, file_size=250_000
+            )
+
+        async def one():
+            file_id, _ = await bot._download_and_upload_photo(
+                context, new_photo(), f'foto_{time.monotonic_ns()}.jpg', folder_id
+            )
+            if not file_id:
+                raise RuntimeError("Photo pipeline returned no file id")
+
+        # Pemanasan: koneksi, process pool gambar
+        loop.run_until_complete(one())
+
+        samples = []
+        for _ in range(count):
+            start = time.perf_counter()
+            loop.run_until_complete(one())
+            samples.append(time.perf_counter() - start)
+
+        async def batch():
+            semaphore = asyncio.Semaphore(concurrency)
+
+            async def limited():
+                async with semaphore:
+                    await one()
+
+            await asyncio.gather(*(limited() for _ in range(count)))
+
+        batch_samples = []
+        for _ in range(3):
+            start = time.perf_counter()
+            loop.run_until_complete(batch())
+            batch_samples.append(time.perf_counter() - start)
+
+        loop.run_until_complete(bot.application.shutdown())
+        bot.image_processor.shutdown()
+        return {
+            'photo.pipeline.sequential': _summary(samples, 1),
+            f'photo.pipeline.concurrent[{concurrency}]': _summary(batch_samples, count)
+        }
+    finally:
+        os.chdir(previous_cwd)
+        loop.close()
+        telegram_server.shutdown()
+        google_server.shutdown()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+def _fake_sheet_rows(size):
+    from config.spreadsheet_config import SpreadsheetConfig
+
+    config = SpreadsheetConfig()
+    stos = ('BJM', 'KBL', 'SBY', 'MLG', 'DPS', 'BDG')
+    report_types = list(config.report_type_options.values())
+    today = datetime.now()
+    rows = []
+    for i in range(size):
+        # Sebagian besar bulan ini, sebagian hari ini
+        day = today.day if i % 10 == 0 else random.randint(1, 28)
+        report = dict(
+            SAMPLE_REPORT,
+            report_type=report_types[i % len(report_types)],
+            id_ticket=f'INC{i:08d}',
+            reported=today.replace(day=day).strftime('%d/%m/%Y %H:%M'),
+            sto=stos[i % len(stos)],
+            teknisi_1=f'Teknisi {i % 300}',
+            teknisi_2=f'Teknisi {(i + 7) % 300}'
+        )
+        rows.append(config.prepare_row_data(report, 0))
+    return config, rows
+
+def bench_rekap(quick):
+    from services.sheet_mirror_service import SheetMirror
+    from services.report_summary_service import ReportAggregator
+
+    results = {}
+    workdir = tempfile.mkdtemp(prefix='bench_rekap_')
+    try:
+        for size in REKAP_SIZES:
+            config, rows = _fake_sheet_rows(size)
+            google = SimpleNamespace(read_values=lambda spreadsheet_id, a1_range: rows)
+            mirror = SheetMirror(google, 'sheet', config, path=os.path.join(workdir, f'mirror_{size}.db'))
+            mirror.load()
+
+            aggregator = ReportAggregator(mirror, config)
+            aggregator.summary('hari')
+
+            def build():
+                ReportAggregator(mirror, config).summary('hari')
+
+            # Kolom sudah terbangun: biaya per /rekap (cek mirror + agregasi)
+            results[f'rekap.day[{size}]'] = measure(lambda: aggregator.summary('hari'))
+            results[f'rekap.month[{size}]'] = measure(lambda: aggregator.summary('bulan'))
+            # Pertama kali setelah start: baca semua baris mirror lalu encode kolom
+            results[f'rekap.build[{size}]'] = measure(build, min_time=0, repeat=3)
+            mirror.close()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return results
+
+BENCHMARKS = {
+    'session': bench_session,
+    'row': bench_row,
+    'form': bench_form,
+    'render': bench_render,
+    'photo': bench_photo,
+    'rekap': bench_rekap
+}
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, timeout=5
+        ).stdout.strip() or None
+    except Exception:
+        return None
+
+def run_suites(suites, quick=False):
+    """Run selected suites and return results document"""
+    results = {}
+    for suite in suites:
+        print(f"⏱️  Running {suite}...", file=sys.stderr)
+        results.update(BENCHMARKS[suite](quick))
+    return {
+        'created_at': datetime.now().isoformat(),
+        'commit': _git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'quick': quick,
+        'results': results
+    }
+
+def compare(baseline, current, threshold):
+    """Return list of (name, baseline_us, current_us, change, status)"""
+    rows = []
+    for name, result in current['results'].items():
+        base = baseline['results'].get(name)
+        if not base:
+            rows.append((name, None, result['median_us'], None, 'new'))
+            continue
+        change = result['median_us'] / base['median_us'] - 1 if base['median_us'] else 0.0
+        if change > threshold:
+            status = 'REGRESSION'
+        elif change < -threshold:
+            status = 'improved'
+        else:
+            status = 'ok'
+        rows.append((name, base['median_us'], result['median_us'], change, status))
+    # Suite yang tidak dijalankan (--only) tidak dihitung hilang
+    suites_run = {name.split('.', 1)[0] for name in current['results']}
+    for name in baseline['results']:
+        if name not in current['results'] and name.split('.', 1)[0] in suites_run:
+            rows.append((name, baseline['results'][name]['median_us'], None, None, 'missing'))
+    return rows
+
+def print_results(document):
+    print(f"\n{'benchmark':<40}{'median us':>12}{'min us':>12}{'stdev us':>12}{'ops/s':>14}")
+    for name, result in document['results'].items():
+        print(f"{name:<40}{result['median_us']:>12.2f}{result['min_us']:>12.2f}"
+              f"{result['stdev_us']:>12.2f}{result['ops_per_sec']:>14.1f}")
+
+def print_comparison(rows, threshold):
+    print(f"\n{'benchmark':<40}{'baseline us':>13}{'current us':>13}{'change':>9}  status")
+    for name, base, current, change, status in rows:
+        base_text = f"{base:.2f}" if base is not None else '-'
+        current_text = f"{current:.2f}" if current is not None else '-'
+        change_text = f"{change * 100:+.1f}%" if change is not None else '-'
+        print(f"{name:<40}{base_text:>13}{current_text:>13}{change_text:>9}  {status}")
+    regressions = [row for row in rows if row[4] == 'REGRESSION']
+    if regressions:
+        print(f"\n❌ {len(regressions)} regression(s) beyond {threshold * 100:.0f}%")
+    else:
+        print(f"\n✅ No regressions beyond {threshold * 100:.0f}%")
+    return not regressions
+
+def _parse_suites(value):
+    suites = [suite.strip() for suite in value.split(',') if suite.strip()]
+    unknown = [suite for suite in suites if suite not in BENCHMARKS]
+    if unknown:
+        raise argparse.ArgumentTypeError(f"unknown suite(s): {', '.join(unknown)}")
+    return suites
+
+def _save(document, path):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump(document, f, indent=2)
+    print(f"💾 Results saved to {path}", file=sys.stderr)
+
+def main():
+    parser = argparse.ArgumentParser(description='Session store and report pipeline microbenchmarks')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = subparsers.add_parser('run', help='Run benchmarks')
+    run_parser.add_argument('--only', type=_parse_suites, default=list(SUITES), help=f"Comma list of suites ({','.join(SUITES)})")
+    run_parser.add_argument('--quick', action='store_true', help='Skip 100k sessions, fewer photos')
+    run_parser.add_argument('--save', default=None, help='Write results as JSON baseline')
+
+    compare_parser = subparsers.add_parser('compare', help='Compare against a baseline')
+    compare_parser.add_argument('baseline', nargs='?', default=DEFAULT_BASELINE, help='Baseline results (default: benchmarks/baseline.json)')
+    compare_parser.add_argument('current', nargs='?', default=None, help='Saved results (default: run now)')
+    compare_parser.add_argument('--only', type=_parse_suites, default=None)
+    compare_parser.add_argument('--quick', action='store_true')
+    compare_parser.add_argument('--threshold', type=float, default=0.2, help='Allowed slowdown (0.2 = 20%%)')
+    compare_parser.add_argument('--save', default=None, help='Also write the fresh results')
+    args = parser.parse_args()
+
+    # Log INFO per operasi ikut terukur kalau tidak dimatikan
+    logging.disable(logging.INFO)
+
+    if args.command == 'run':
+        document = run_suites(args.only, args.quick)
+        print_results(document)
+        if args.save:
+            _save(document, args.save)
+        return
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    if args.current:
+        with open(args.current) as f:
+            current = json.load(f)
+    else:
+        # Default: suite yang sama dengan baseline
+        suites = args.only or sorted({name.split('.', 1)[0] for name in baseline['results']} & set(SUITES))
+        current = run_suites(suites, args.quick or baseline.get('quick', False))
+        if args.save:
+            _save(current, args.save)
+    if (baseline.get('python'), baseline.get('platform')) != (current.get('python'), current.get('platform')):
+        print(
+            f"⚠️ Baseline recorded on Python {baseline.get('python')} / {baseline.get('platform')}, "
+            f"current run on Python {current.get('python')} / {current.get('platform')}",
+            file=sys.stderr
+        )
+    print_results(current)
+    if not print_comparison(compare(baseline, current, args.threshold), args.threshold):
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
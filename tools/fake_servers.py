@@ -0,0 +1,577 @@
+# tools/fake_servers.py - Local fake Telegram Bot API and Google Drive/Sheets servers
+"""
+Usage:
+    python -m tools.fake_servers --telegram-port 8081 --google-port 8082 \
+        --tg-latency-ms 40 --google-latency-ms 120 --google-distribution lognormal \
+        --google-error-rate 0.01 --google-429-rate 0.02
+
+Point the bot at them with:
+    TELEGRAM_API_BASE_URL=http://127.0.0.1:8081
+    GOOGLE_API_BASE_URL=http://127.0.0.1:8082
+
+GET /_stats on either server returns request counters (and stored sheet rows
+for the Google server). GET /_replies?chat_id=..&after=..&timeout=.. on the
+Telegram server waits until the bot has sent (or edited) more than `after`
+messages to that chat and returns the count, so a load test can time a step
+until the bot's reply instead of until /webhook answers. The fake spreadsheet starts with one tab, Sheet1;
+like the real API, ranges on other tabs fail until addSheet creates them.
+"""
+import io
+import re
+import json
+import time
+import uuid
+import random
+import string
+import argparse
+import threading
+from collections import defaultdict
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs, unquote
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+class LatencyModel:
+    """Latency distribution plus error and 429 injection"""
+
+    def __init__(self, latency_ms=0.0, distribution='fixed', jitter_ms=0.0, sigma=0.5,
+                 error_rate=0.0, rate_limit_rate=0.0, retry_after=1):
+        self.latency_ms = latency_ms
+        self.distribution = distribution
+        self.jitter_ms = jitter_ms
+        self.sigma = sigma
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_after = retry_after
+
+    def sample_ms(self):
+        if self.latency_ms <= 0:
+            return 0.0
+        if self.distribution == 'uniform':
+            return max(0.0, random.uniform(self.latency_ms - self.jitter_ms, self.latency_ms + self.jitter_ms))
+        if self.distribution == 'exponential':
+            return random.expovariate(1.0 / self.latency_ms)
+        if self.distribution == 'lognormal':
+            # median = latency_ms, ekor panjang seperti API sungguhan
+            return random.lognormvariate(0, self.sigma) * self.latency_ms
+        return self.latency_ms
+
+    def wait(self):
+        delay = self.sample_ms()
+        if delay > 0:
+            time.sleep(delay / 1000)
+
+    def fault(self):
+        """Return '429', 'error' or None"""
+        roll = random.random()
+        if roll < self.rate_limit_rate:
+            return '429'
+        if roll < self.rate_limit_rate + self.error_rate:
+            return 'error'
+        return None
+
+class _FakeHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def _read_body(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        return self.rfile.read(length) if length else b''
+
+    def _send(self, status, body=b'', content_type='application/json', headers=None):
+        if isinstance(body, (dict, list)):
+            body = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        if body and self.command != 'HEAD':
+            self.wfile.write(body)
+
+    def _dispatch(self):
+        server = self.server
+        url = urlparse(self.path)
+        path = url.path
+        if path == '/_stats':
+            return self._send(200, server.get_stats())
+        if path == '/_replies' and hasattr(server, 'wait_replies'):
+            query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+            return self._send(200, server.wait_replies(
+                int(query.get('chat_id', 0)), int(query.get('after', -1)), float(query.get('timeout', 0))
+            ))
+
+        body = self._read_body()
+        server.latency.wait()
+        fault = server.latency.fault()
+        with server.lock:
+            server.counters[f'{self.command} {server.route_name(path)}'] += 1
+            if fault:
+                server.counters[f'fault_{fault}'] += 1
+        if fault:
+            return server.send_fault(self, fault)
+        return server.handle_route(self, path, body)
+
+    do_GET = _dispatch
+    do_POST = _dispatch
+    do_PUT = _dispatch
+    do_DELETE = _dispatch
+
+class _FakeServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, latency):
+        super().__init__(address, _FakeHandler)
+        self.latency = latency
+        self.lock = threading.Lock()
+        self.counters = defaultdict(int)
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def route_name(self, path):
+        return path
+
+    def get_stats(self):
+        with self.lock:
+            return {'requests': dict(self.counters)}
+
+    def start(self):
+        thread = threading.Thread(target=self.serve_forever, daemon=True)
+        thread.start()
+        return thread
+
+class FakeTelegramServer(_FakeServer):
+    """Bot API subset used by the bot: getMe, sendMessage, editMessageText, getFile, file download"""
+
+    METHOD_PATH = re.compile(r'^/bot[^/]+/(\w+)$')
+    FILE_PATH = re.compile(r'^/file/bot[^/]+/(.+)$')
+
+    def __init__(self, address, latency):
+        super().__init__(address, latency)
+        self._message_ids = iter(range(1, 10**12))
+        self.photo_bytes = self._build_photo()
+        # chat_id -> jumlah pesan terkirim/diedit bot (untuk /_replies)
+        self.replies = defaultdict(int)
+        self._replied = threading.Condition(self.lock)
+
+    @staticmethod
+    def _build_photo():
+        if Image is None:
+            # Tanpa Pillow: isi acak dengan header JPEG
+            return b'\xff\xd8\xff\xe0' + bytes(random.getrandbits(8) for _ in range(200_000)) + b'\xff\xd9'
+        buffer = io.BytesIO()
+        Image.effect_noise((1280, 960), 40).convert('RGB').save(buffer, 'JPEG', quality=90)
+        return buffer.getvalue()
+
+    def route_name(self, path):
+        match = self.METHOD_PATH.match(path)
+        if match:
+            return match.group(1)
+        return 'file_download' if self.FILE_PATH.match(path) else path
+
+    def send_fault(self, handler, fault):
+        if fault == '429':
+            return handler._send(429, {
+                'ok': False,
+                'error_code': 429,
+                'description': f'Too Many Requests: retry after {self.latency.retry_after}',
+                'parameters': {'retry_after': self.latency.retry_after}
+            })
+        return handler._send(500, {'ok': False, 'error_code': 500, 'description': 'Internal Server Error'})
+
+    @staticmethod
+    def _params(handler, body):
+        content_type = handler.headers.get('Content-Type', '')
+        if 'application/json' in content_type:
+            return json.loads(body or b'{}')
+        if 'application/x-www-form-urlencoded' in content_type:
+            return {key: values[-1] for key, values in parse_qs(body.decode()).items()}
+        return {}
+
+    def wait_replies(self, chat_id, after, timeout):
+        """Wait up to timeout until chat_id has more than `after` bot messages"""
+        with self._replied:
+            self._replied.wait_for(lambda: self.replies[chat_id] > after, timeout)
+            return {'chat_id': chat_id, 'replies': self.replies[chat_id]}
+
+    def _message(self, chat_id, text, message_id=None):
+        with self._replied:
+            message_id = message_id or next(self._message_ids)
+            self.replies[int(chat_id)] += 1
+            self._replied.notify_all()
+        return {
+            'message_id': int(message_id),
+            'date': int(time.time()),
+            'chat': {'id': int(chat_id), 'type': 'private'},
+            'text': text
+        }
+
+    def handle_route(self, handler, path, body):
+        file_match = self.FILE_PATH.match(path)
+        if file_match:
+            # Data setelah marker EOI diabaikan decoder, tapi membuat hash tiap file berbeda
+            payload = self.photo_bytes + file_match.group(1).encode()
+            return handler._send(200, payload, content_type='image/jpeg')
+
+        match = self.METHOD_PATH.match(path)
+        if not match:
+            return handler._send(404, {'ok': False, 'error_code': 404, 'description': 'Not Found'})
+
+        method = match.group(1)
+        params = self._params(handler, body)
+
+        if method == 'getMe':
+            result = {
+                'id': 1000001, 'is_bot': True, 'first_name': 'FakeBot', 'username': 'fake_bot',
+                'can_join_groups': True, 'can_read_all_group_messages': False, 'supports_inline_queries': False
+            }
+        elif method == 'sendMessage':
+            result = self._message(params.get('chat_id', 0), params.get('text', ''))
+        elif method == 'editMessageText':
+            result = self._message(params.get('chat_id', 0), params.get('text', ''), params.get('message_id'))
+        elif method == 'getFile':
+            file_id = params.get('file_id', 'unknown')
+            result = {
+                'file_id': file_id,
+                'file_unique_id': f'u{abs(hash(file_id)) % 10**10}',
+                'file_size': len(self.photo_bytes),
+                'file_path': f'photos/{file_id}.jpg'
+            }
+        else:
+            # Method lain cukup dianggap sukses
+            result = True
+
+        return handler._send(200, {'ok': True, 'result': result})
+
+def _column_index(letters):
+    index = 0
+    for char in letters:
+        index = index * 26 + (ord(char) - ord('A') + 1)
+    return index - 1
+
+def _parse_a1(a1_range):
+    """'Sheet1!B3:B' -> (sheet, first_row, last_row, first_col, last_col), rows 1-based, None = open"""
+    sheet, _, cells = a1_range.rpartition('!')
+    sheet = sheet.strip("'") or 'Sheet1'
+    match = re.match(r'^([A-Z]*)(\d*)(?::([A-Z]*)(\d*))?$', cells.upper())
+    if not match:
+        return sheet, None, None, None, None
+    start_col, start_row, end_col, end_row = match.groups()
+    return (
+        sheet,
+        int(start_row) if start_row else None,
+        int(end_row) if end_row else (int(start_row) if start_row and end_col is None else None),
+        _column_index(start_col) if start_col else None,
+        _column_index(end_col) if end_col else (_column_index(start_col) if start_col and end_col is None else None)
+    )
+
+class FakeGoogleServer(_FakeServer):
+    """Drive v3 (files.create/get/delete incl. resumable upload, about.get) and
+    Sheets v4 spreadsheets.get/batchUpdate (addSheet), values.append/get/update/batchGet"""
+
+    def __init__(self, address, latency, table_start_row=3, sheet_names=('Sheet1',)):
+        super().__init__(address, latency)
+        self.table_start_row = table_start_row
+        self.files = {}
+        self.uploads = {}
+        self.sheets = {name: [] for name in sheet_names}
+        self.bytes_uploaded = 0
+
+    @staticmethod
+    def _new_id():
+        return ''.join(random.choices(string.ascii_letters + string.digits, k=33))
+
+    def route_name(self, path):
+        if path.startswith('/upload/drive/v3/files'):
+            return 'drive.files.upload'
+        if path.startswith('/drive/v3/files'):
+            return 'drive.files'
+        if path.startswith('/drive/v3/about'):
+            return 'drive.about'
+        if ':append' in path:
+            return 'sheets.values.append'
+        if path.endswith('/values:batchGet'):
+            return 'sheets.values.batchGet'
+        if path.endswith(':batchUpdate'):
+            return 'sheets.batchUpdate'
+        if path.startswith('/v4/spreadsheets/') and '/values' not in path:
+            return 'sheets.get'
+        if '/values/' in path:
+            # values.get (GET) / values.update (PUT), method ada di nama counter
+            return 'sheets.values'
+        return path
+
+    def get_stats(self):
+        stats = super().get_stats()
+        with self.lock:
+            stats['drive_files'] = len(self.files)
+            stats['bytes_uploaded'] = self.bytes_uploaded
+            stats['sheet_rows'] = {
+                name: max(0, len(rows) - (self.table_start_row - 1)) for name, rows in self.sheets.items()
+            }
+        return stats
+
+    def send_fault(self, handler, fault):
+        if fault == '429':
+            return handler._send(429, {'error': {'code': 429, 'message': 'Rate Limit Exceeded', 'status': 'RESOURCE_EXHAUSTED'}},
+                                 headers={'Retry-After': str(self.latency.retry_after)})
+        return handler._send(500, {'error': {'code': 500, 'message': 'Backend Error', 'status': 'INTERNAL'}})
+
+    def _create_file(self, metadata, size=0):
+        file_id = self._new_id()
+        resource = {
+            'kind': 'drive#file',
+            'id': file_id,
+            'name': metadata.get('name', 'Untitled'),
+            'mimeType': metadata.get('mimeType', 'image/jpeg'),
+            'parents': metadata.get('parents', [])
+        }
+        with self.lock:
+            self.files[file_id] = resource
+            self.bytes_uploaded += size
+        return resource
+
+    def handle_route(self, handler, path, body):
+        query = parse_qs(urlparse(handler.path).query)
+        method = handler.command
+
+        # Drive resumable upload: POST metadata -> Location, PUT isi file per chunk
+        if path == '/upload/drive/v3/files':
+            if method == 'POST':
+                upload_id = uuid.uuid4().hex
+                with self.lock:
+                    self.uploads[upload_id] = {'metadata': json.loads(body or b'{}'), 'received': 0}
+                location = f'{self.base_url}/upload/drive/v3/files?uploadType=resumable&upload_id={upload_id}'
+                return handler._send(200, b'', headers={'Location': location})
+
+            upload_id = query.get('upload_id', [''])[0]
+            upload = self.uploads.get(upload_id)
+            if upload is None:
+                return handler._send(404, {'error': {'code': 404, 'message': 'Upload not found'}})
+
+            upload['received'] += len(body)
+            content_range = handler.headers.get('Content-Range', '')
+            total = content_range.rsplit('/', 1)[-1] if '/' in content_range else '*'
+            if total != '*' and upload['received'] < int(total):
+                return handler._send(308, b'', headers={'Range': f"bytes=0-{upload['received'] - 1}"})
+
+            with self.lock:
+                self.uploads.pop(upload_id, None)
+            return handler._send(200, self._create_file(upload['metadata'], upload['received']))
+
+        if path == '/drive/v3/files' and method == 'POST':
+            return handler._send(200, self._create_file(json.loads(body or b'{}')))
+
+        file_match = re.match(r'^/drive/v3/files/([^/]+)$', path)
+        if file_match:
+            file_id = file_match.group(1)
+            if method == 'DELETE':
+                with self.lock:
+                    self.files.pop(file_id, None)
+                return handler._send(204, b'')
+            resource = self.files.get(file_id) or {
+                # Folder induk (PARENT_FOLDER_ID) dianggap selalu ada
+                'kind': 'drive#file', 'id': file_id, 'name': f'Folder {file_id}',
+                'mimeType': 'application/vnd.google-apps.folder'
+            }
+            return handler._send(200, resource)
+
+        if path == '/drive/v3/about':
+            with self.lock:
+                usage = self.bytes_uploaded
+            return handler._send(200, {
+                'storageQuota': {
+                    'limit': str(15 * 1024**3),
+                    'usage': str(usage),
+                    'usageInDrive': str(usage)
+                },
+                'user': {'emailAddress': 'fake-owner@example.com', 'displayName': 'Fake Owner'}
+            })
+
+        batch_get_match = re.match(r'^/v4/spreadsheets/([^/]+)/values:batchGet$', path)
+        if batch_get_match:
+            return self._batch_get_values(handler, query.get('ranges', []))
+
+        batch_update_match = re.match(r'^/v4/spreadsheets/([^/:]+):batchUpdate$', path)
+        if batch_update_match and method == 'POST':
+            return self._batch_update(handler, batch_update_match.group(1), body)
+
+        spreadsheet_match = re.match(r'^/v4/spreadsheets/([^/:]+)$', path)
+        if spreadsheet_match and method == 'GET':
+            with self.lock:
+                titles = list(self.sheets)
+            return handler._send(200, {
+                'spreadsheetId': spreadsheet_match.group(1),
+                'sheets': [{'properties': {'sheetId': i, 'title': title}} for i, title in enumerate(titles)]
+            })
+
+        values_match = re.match(r'^/v4/spreadsheets/([^/]+)/values/(.+)$', path)
+        if values_match:
+            spreadsheet_id, a1_range = values_match.group(1), unquote(values_match.group(2))
+            if a1_range.endswith(':append') and method == 'POST':
+                return self._append(handler, spreadsheet_id, a1_range[:-len(':append')], body)
+            if method == 'PUT':
+                return self._update_values(handler, spreadsheet_id, a1_range, body)
+            return self._get_values(handler, a1_range)
+
+        return handler._send(404, {'error': {'code': 404, 'message': f'Unknown route {method} {path}'}})
+
+    @staticmethod
+    def _unknown_sheet(handler, a1_range):
+        return handler._send(400, {'error': {'code': 400, 'message': f'Unable to parse range: {a1_range}', 'status': 'INVALID_ARGUMENT'}})
+
+    def _batch_update(self, handler, spreadsheet_id, body):
+        replies = []
+        for batch_request in json.loads(body or b'{}').get('requests', []):
+            title = batch_request.get('addSheet', {}).get('properties', {}).get('title')
+            if title is None:
+                return handler._send(400, {'error': {'code': 400, 'message': 'Only addSheet is supported', 'status': 'INVALID_ARGUMENT'}})
+            with self.lock:
+                if title in self.sheets:
+                    message = f'Invalid requests[0].addSheet: A sheet with the name "{title}" already exists. Please enter another name.'
+                    return handler._send(400, {'error': {'code': 400, 'message': message, 'status': 'INVALID_ARGUMENT'}})
+                self.sheets[title] = []
+                sheet_id = len(self.sheets) - 1
+            replies.append({'addSheet': {'properties': {'sheetId': sheet_id, 'title': title}}})
+        return handler._send(200, {'spreadsheetId': spreadsheet_id, 'replies': replies})
+
+    def _append(self, handler, spreadsheet_id, a1_range, body):
+        sheet = _parse_a1(a1_range)[0]
+        values = json.loads(body or b'{}').get('values', [])
+        with self.lock:
+            rows = self.sheets.get(sheet)
+            if rows is None:
+                return self._unknown_sheet(handler, a1_range)
+            # Baris judul/header di atas tabel
+            while len(rows) < self.table_start_row - 1:
+                rows.append([])
+            first_row = len(rows) + 1
+            rows.extend(values)
+            last_row = len(rows)
+        return handler._send(200, {
+            'spreadsheetId': spreadsheet_id,
+            'tableRange': a1_range,
+            'updates': {
+                'spreadsheetId': spreadsheet_id,
+                'updatedRange': f'{sheet}!A{first_row}:U{last_row}',
+                'updatedRows': len(values),
+                'updatedColumns': max((len(row) for row in values), default=0),
+                'updatedCells': sum(len(row) for row in values)
+            }
+        })
+
+    def _update_values(self, handler, spreadsheet_id, a1_range, body):
+        sheet, first_row, _, first_col, _ = _parse_a1(a1_range)
+        values = json.loads(body or b'{}').get('values', [])
+        first_row, first_col = first_row or 1, first_col or 0
+        with self.lock:
+            rows = self.sheets.get(sheet)
+            if rows is None:
+                return self._unknown_sheet(handler, a1_range)
+            for i, new_cells in enumerate(values):
+                while len(rows) < first_row + i:
+                    rows.append([])
+                row = rows[first_row + i - 1]
+                row.extend([''] * (first_col + len(new_cells) - len(row)))
+                row[first_col:first_col + len(new_cells)] = new_cells
+        return handler._send(200, {
+            'spreadsheetId': spreadsheet_id,
+            'updatedRange': a1_range,
+            'updatedRows': len(values),
+            'updatedCells': sum(len(row) for row in values)
+        })
+
+    def _get_values(self, handler, a1_range):
+        with self.lock:
+            if _parse_a1(a1_range)[0] not in self.sheets:
+                return self._unknown_sheet(handler, a1_range)
+        return handler._send(200, self._value_range(a1_range))
+
+    def _batch_get_values(self, handler, ranges):
+        with self.lock:
+            for a1_range in ranges:
+                if _parse_a1(a1_range)[0] not in self.sheets:
+                    return self._unknown_sheet(handler, a1_range)
+        return handler._send(200, {'valueRanges': [self._value_range(a1_range) for a1_range in ranges]})
+
+    def _value_range(self, a1_range):
+        sheet, first_row, last_row, first_col, last_col = _parse_a1(a1_range)
+        with self.lock:
+            rows = list(self.sheets.get(sheet, []))
+        start = (first_row or 1) - 1
+        end = last_row if last_row is not None else len(rows)
+        values = []
+        for row in rows[start:end]:
+            cells = row[first_col or 0:(last_col + 1) if last_col is not None else None]
+            values.append(cells)
+        # API asli membuang baris kosong di akhir
+        while values and not any(values[-1]):
+            values.pop()
+        return {'range': a1_range, 'majorDimension': 'ROWS', 'values': values}
+
+def start_servers(host='127.0.0.1', telegram_port=0, google_port=0, telegram_latency=None, google_latency=None):
+    """Start both fake servers in background threads (port 0 = random free port)"""
+    telegram = FakeTelegramServer((host, telegram_port), telegram_latency or LatencyModel())
+    google = FakeGoogleServer((host, google_port), google_latency or LatencyModel())
+    telegram.start()
+    google.start()
+    return telegram, google
+
+def _add_latency_args(parser, prefix, label):
+    parser.add_argument(f'--{prefix}-latency-ms', type=float, default=0.0, help=f'{label} median/mean latency')
+    parser.add_argument(f'--{prefix}-distribution', default='fixed', choices=['fixed', 'uniform', 'exponential', 'lognormal'])
+    parser.add_argument(f'--{prefix}-jitter-ms', type=float, default=0.0, help='Half-width for uniform distribution')
+    parser.add_argument(f'--{prefix}-sigma', type=float, default=0.5, help='Sigma for lognormal distribution')
+    parser.add_argument(f'--{prefix}-error-rate', type=float, default=0.0, help='Share of requests answered with 500')
+    parser.add_argument(f'--{prefix}-429-rate', type=float, default=0.0, help='Share of requests answered with 429')
+    parser.add_argument(f'--{prefix}-retry-after', type=int, default=1)
+
+def _latency_from_args(args, prefix):
+    prefix = prefix.replace('-', '_')
+    return LatencyModel(
+        latency_ms=getattr(args, f'{prefix}_latency_ms'),
+        distribution=getattr(args, f'{prefix}_distribution'),
+        jitter_ms=getattr(args, f'{prefix}_jitter_ms'),
+        sigma=getattr(args, f'{prefix}_sigma'),
+        error_rate=getattr(args, f'{prefix}_error_rate'),
+        rate_limit_rate=getattr(args, f'{prefix}_429_rate'),
+        retry_after=getattr(args, f'{prefix}_retry_after')
+    )
+
+def main():
+    parser = argparse.ArgumentParser(description='Run local fake Telegram Bot API and Google Drive/Sheets servers')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--telegram-port', type=int, default=8081)
+    parser.add_argument('--google-port', type=int, default=8082)
+    _add_latency_args(parser, 'tg', 'Telegram')
+    _add_latency_args(parser, 'google', 'Google')
+    args = parser.parse_args()
+
+    telegram, google = start_servers(
+        host=args.host,
+        telegram_port=args.telegram_port,
+        google_port=args.google_port,
+        telegram_latency=_latency_from_args(args, 'tg'),
+        google_latency=_latency_from_args(args, 'google')
+    )
+    print(f"🤖 Fake Telegram Bot API: {telegram.base_url}  (TELEGRAM_API_BASE_URL)")
+    print(f"📁 Fake Google Drive/Sheets: {google.base_url}  (GOOGLE_API_BASE_URL)")
+
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        telegram.shutdown()
+        google.shutdown()
+
+if __name__ == '__main__':
+    main()
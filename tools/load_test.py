@@ -0,0 +1,310 @@
+# tools/load_test.py - Replay synthetic technician conversations against /webhook
+"""
+Usage:
+    python -m tools.load_test --url http://localhost:5000/webhook \
+        --telegram-url http://127.0.0.1:8081 \
+        --conversations 200 --concurrency 20 --rate 5 --photos 3 --album-ratio 0.5
+
+Each virtual technician runs one full report: /start, report type, ticket ID,
+filled-in form, photo upload (single with description, or album) and submit.
+Photo file_ids are synthetic, so run the bot against tools/fake_servers.py
+(see TELEGRAM_API_BASE_URL / GOOGLE_API_BASE_URL).
+
+Latency is measured per step from posting the update until the fake Telegram
+server (--telegram-url, default $TELEGRAM_API_BASE_URL) has recorded the
+bot's replies to it, so queueing and processing behind /webhook are
+included. Without a Telegram URL only the /webhook response time is measured.
+Album parts are posted concurrently, like Telegram delivers them.
+"""
+import os
+import json
+import math
+import time
+import random
+import argparse
+import itertools
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+REPORT_TYPES = ['Non B2B', 'BGES', 'Squad']
+STOS = ['BJM', 'BJB', 'MTP', 'PLE', 'KDG']
+# Pesan bot (kirim + edit) per update dari langkah ini, selain 1: foto diupload setelah
+# deskripsi / langsung di mode album = pesan "memproses", edit hasilnya, lalu prompt berikutnya
+REPLIES_PER_UPDATE = {'photo_desc': 3, 'photo_album': 3}
+
+def _percentile(values, percent):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    index = max(0, math.ceil(percent / 100 * len(values)) - 1)
+    return values[index]
+
+class UpdateFactory:
+    """Build Telegram Update payloads for one virtual technician"""
+
+    _update_ids = itertools.count(int(time.time()))
+    _message_ids = itertools.count(1)
+    _lock = threading.Lock()
+
+    def __init__(self, user_id):
+        self.user_id = user_id
+        self.user = {'id': user_id, 'is_bot': False, 'first_name': f'Teknisi{user_id}'}
+        self.chat = {'id': user_id, 'type': 'private', 'first_name': f'Teknisi{user_id}'}
+
+    def _next_ids(self):
+        with self._lock:
+            return next(self._update_ids), next(self._message_ids)
+
+    def _message(self, **fields):
+        update_id, message_id = self._next_ids()
+        message = {
+            'message_id': message_id,
+            'date': int(time.time()),
+            'chat': self.chat,
+            'from': self.user,
+            **fields
+        }
+        return {'update_id': update_id, 'message': message}
+
+    def text(self, text):
+        fields = {'text': text}
+        if text.startswith('/'):
+            fields['entities'] = [{'type': 'bot_command', 'offset': 0, 'length': len(text.split()[0])}]
+        return self._message(**fields)
+
+    def photo(self, media_group_id=None, size_bytes=None):
+        size_bytes = size_bytes or random.randint(80_000, 350_000)
+        unique = f'{self.user_id}_{random.getrandbits(48):x}'
+        sizes = [
+            {'file_id': f'synthetic_s_{unique}', 'file_unique_id': f'us_{unique}', 'width': 90, 'height': 120, 'file_size': 1500},
+            {'file_id': f'synthetic_m_{unique}', 'file_unique_id': f'um_{unique}', 'width': 600, 'height': 800, 'file_size': size_bytes // 4},
+            {'file_id': f'synthetic_l_{unique}', 'file_unique_id': f'ul_{unique}', 'width': 1280, 'height': 1706, 'file_size': size_bytes},
+        ]
+        fields = {'photo': sizes}
+        if media_group_id:
+            fields['media_group_id'] = media_group_id
+        return self._message(**fields)
+
+def build_conversation(user_id, photos, album):
+    """Return list of (step_name, [update_payload, ...]) for one full report (album parts form one step)"""
+    factory = UpdateFactory(user_id)
+    ticket_id = f'INC{random.randint(10_000_000, 99_999_999)}'
+    form = (
+        f"Customer Name : PT Beban Uji {user_id}\n"
+        f"Service No : {random.randint(100_000_000, 999_999_999)}\n"
+        f"Segment : DBS\n"
+        f"Teknisi 1 : Teknisi {user_id}\n"
+        f"Teknisi 2 : Teknisi {user_id + 1}\n"
+        f"STO : {random.choice(STOS)}\n"
+        f"Valins ID : VAL{random.randint(1000, 9999)}"
+    )
+
+    steps = [
+        ('start', [factory.text('/start')]),
+        ('report_type', [factory.text(random.choice(REPORT_TYPES))]),
+        ('ticket_id', [factory.text(ticket_id)]),
+        ('form', [factory.text(form)]),
+    ]
+
+    if photos > 0:
+        steps.append(('open_upload', [factory.text('📷 Upload Foto Eviden')]))
+        if album:
+            steps.append(('select_mode', [factory.text('📷 Upload Banyak (Auto Nama)')]))
+            media_group_id = f'{user_id}{random.getrandbits(32)}'
+            steps.append(('photo_album', [factory.photo(media_group_id=media_group_id) for _ in range(photos)]))
+            steps.append(('finish_upload', [factory.text('✅ Selesai Upload')]))
+        else:
+            steps.append(('select_mode', [factory.text('🔸 Upload Satu-Satu (Custom Nama)')]))
+            for i in range(photos):
+                steps.append(('photo_single', [factory.photo()]))
+                steps.append(('photo_desc', [factory.text(f'foto uji {i + 1}')]))
+                steps.append(('photo_confirm', [factory.text('✅ Benar, Lanjut Upload')]))
+            steps.append(('finish_upload', [factory.text('✅ Selesai Upload')]))
+
+    steps.append(('submit', [factory.text('✅ Kirim Laporan')]))
+    return steps
+
+class LoadTest:
+    """Run conversations at a given concurrency and arrival rate, collect latency per step"""
+
+    def __init__(self, url, conversations, concurrency, rate, photos, album_ratio,
+                 think_time, timeout, user_id_base, telegram_url=None):
+        self.url = url
+        self.telegram_url = telegram_url.rstrip('/') if telegram_url else None
+        self.conversations = conversations
+        self.concurrency = concurrency
+        self.rate = rate
+        self.photos = photos
+        self.album_ratio = album_ratio
+        self.think_time = think_time
+        self.timeout = timeout
+        self.user_id_base = user_id_base
+        self.headers = {'Content-Type': 'application/json'}
+
+        self._lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.no_reply = defaultdict(int)
+        self.updates_sent = 0
+        self.status_codes = defaultdict(int)
+        self._local = threading.local()
+        self._album_pool = None
+
+    def _session(self):
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = self._local.session = requests.Session()
+        return session
+
+    def _post(self, payload):
+        """POST one update to /webhook; True if accepted"""
+        with self._lock:
+            self.updates_sent += 1
+        try:
+            response = self._session().post(self.url, data=json.dumps(payload), headers=self.headers, timeout=self.timeout)
+        except requests.RequestException:
+            return False
+        with self._lock:
+            self.status_codes[response.status_code] += 1
+        return response.status_code < 400
+
+    def _replies(self, chat_id, after=-1, timeout=0.0):
+        """Bot messages recorded for chat_id by the fake Telegram server, waiting until > after (None on error)"""
+        try:
+            response = self._session().get(
+                f'{self.telegram_url}/_replies',
+                params={'chat_id': chat_id, 'after': after, 'timeout': timeout},
+                timeout=timeout + 10
+            )
+            return response.json()['replies']
+        except (requests.RequestException, ValueError, KeyError):
+            return None
+
+    def _step(self, step, payloads, chat_id):
+        """Send one step (album parts concurrently) and time it until the bot has replied"""
+        replies_before = self._replies(chat_id) if self.telegram_url else None
+        start = time.perf_counter()
+        if len(payloads) > 1:
+            accepted = all(self._album_pool.map(self._post, payloads))
+        else:
+            accepted = self._post(payloads[0])
+
+        replied = True
+        if accepted and replies_before is not None:
+            expected = replies_before + REPLIES_PER_UPDATE.get(step, 1) * len(payloads)
+            replies = self._replies(chat_id, expected - 1, self.timeout)
+            replied = replies is not None and replies >= expected
+        elapsed = time.perf_counter() - start
+
+        with self._lock:
+            self.latencies[step].append(elapsed)
+            if not accepted:
+                self.errors[step] += 1
+            elif not replied:
+                self.errors[step] += 1
+                self.no_reply[step] += 1
+
+    def _run_conversation(self, index):
+        album = random.random() < self.album_ratio
+        user_id = self.user_id_base + index
+        for step, payloads in build_conversation(user_id, self.photos, album):
+            # Chat privat: chat_id = user_id
+            self._step(step, payloads, user_id)
+            if self.think_time > 0:
+                time.sleep(random.uniform(0.5, 1.5) * self.think_time)
+
+    def run(self):
+        """Start conversations with Poisson arrivals (rate per second; 0 = all at once)"""
+        started = time.perf_counter()
+        self._album_pool = ThreadPoolExecutor(max_workers=max(1, self.concurrency * self.photos))
+        try:
+            with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+                futures = []
+                for index in range(self.conversations):
+                    futures.append(pool.submit(self._run_conversation, index))
+                    if self.rate > 0:
+                        time.sleep(random.expovariate(self.rate))
+                for future in futures:
+                    future.result()
+        finally:
+            self._album_pool.shutdown()
+        return self.report(time.perf_counter() - started)
+
+    def report(self, elapsed):
+        total_requests = self.updates_sent
+        steps = {}
+        for step, values in self.latencies.items():
+            steps[step] = {
+                'requests': len(values),
+                'errors': self.errors.get(step, 0),
+                'no_reply': self.no_reply.get(step, 0),
+                'p50_ms': _percentile(values, 50) * 1000,
+                'p95_ms': _percentile(values, 95) * 1000,
+                'p99_ms': _percentile(values, 99) * 1000,
+                'max_ms': max(values) * 1000
+            }
+        return {
+            'latency': 'until bot reply' if self.telegram_url else 'webhook response only',
+            'elapsed_seconds': elapsed,
+            'conversations': self.conversations,
+            'requests': total_requests,
+            'throughput_rps': total_requests / elapsed if elapsed else 0.0,
+            'conversations_per_second': self.conversations / elapsed if elapsed else 0.0,
+            'status_codes': dict(self.status_codes),
+            'steps': steps
+        }
+
+def print_report(report):
+    print(f"⏱️  {report['conversations']} conversations, {report['requests']} requests "
+          f"in {report['elapsed_seconds']:.1f}s")
+    print(f"🚀 Throughput: {report['throughput_rps']:.1f} req/s, "
+          f"{report['conversations_per_second']:.2f} conversations/s")
+    print(f"📨 Status codes: {report['status_codes']}")
+    print(f"⏱️  Latency measured {report['latency']}")
+    print(f"\n{'step':<15}{'requests':>9}{'errors':>8}{'no reply':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for step, stats in report['steps'].items():
+        print(f"{step:<15}{stats['requests']:>9}{stats['errors']:>8}{stats['no_reply']:>9}{stats['p50_ms']:>10.1f}"
+              f"{stats['p95_ms']:>10.1f}{stats['p99_ms']:>10.1f}{stats['max_ms']:>10.1f}")
+
+def main():
+    parser = argparse.ArgumentParser(description='Load test the bot /webhook with synthetic technician conversations')
+    parser.add_argument('--url', default='http://localhost:5000/webhook')
+    parser.add_argument('--telegram-url', default=os.environ.get('TELEGRAM_API_BASE_URL'),
+                        help='Fake Telegram server the bot replies to (latency until reply)')
+    parser.add_argument('--conversations', type=int, default=50, help='Total conversations to run')
+    parser.add_argument('--concurrency', type=int, default=10, help='Max concurrent technicians')
+    parser.add_argument('--rate', type=float, default=2.0, help='Conversation arrival rate per second (0 = burst)')
+    parser.add_argument('--photos', type=int, default=3, help='Photos per report')
+    parser.add_argument('--album-ratio', type=float, default=0.5, help='Share of reports sending photos as album')
+    parser.add_argument('--think-time', type=float, default=1.0, help='Mean pause between steps in seconds')
+    parser.add_argument('--timeout', type=float, default=30.0)
+    parser.add_argument('--user-id-base', type=int, default=900_000_000)
+    parser.add_argument('--json', dest='json_path', default=None, help='Also write report as JSON')
+    args = parser.parse_args()
+
+    load_test = LoadTest(
+        url=args.url,
+        conversations=args.conversations,
+        concurrency=args.concurrency,
+        rate=args.rate,
+        photos=args.photos,
+        album_ratio=args.album_ratio,
+        think_time=args.think_time,
+        timeout=args.timeout,
+        user_id_base=args.user_id_base,
+        telegram_url=args.telegram_url
+    )
+    if not load_test.telegram_url:
+        print("⚠️  No --telegram-url: latency is only the /webhook response time, not processing")
+    report = load_test.run()
+    print_report(report)
+
+    if args.json_path:
+        with open(args.json_path, 'w') as f:
+            json.dump(report, f, indent=2)
+
+if __name__ == '__main__':
+    main()
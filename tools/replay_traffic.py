@@ -0,0 +1,208 @@
+# tools/replay_traffic.py - Replay recorded webhook traffic against a test instance
+"""
+Usage:
+    python -m tools.replay_traffic captures/ --url http://localhost:5000/webhook --speed 1
+    python -m tools.replay_traffic captures/webhook-20261019-*.jsonl.gz --speed 10
+    python -m tools.replay_traffic captures/ --speed 0      # as fast as possible
+
+Reads captures written by services/traffic_recorder.py (WEBHOOK_RECORD_DIR)
+and sends each update at its original offset from the first one, divided by
+--speed. Updates of the same user are sent in order on one worker, so a
+conversation is never reordered even when the target is slower than the
+capture. Photo file_ids in a capture belong to the production bot, so point
+the test instance at tools/fake_servers.py.
+"""
+import os
+import sys
+import glob
+import gzip
+import json
+import time
+import zlib
+import queue
+import argparse
+import threading
+from collections import defaultdict
+
+import requests
+
+from tools.load_test import _percentile
+
+def _update_kind(update):
+    message = update.get('message') or update.get('edited_message') or {}
+    if 'photo' in message:
+        return 'photo'
+    if 'text' in message:
+        return 'command' if message['text'].startswith('/') else 'text'
+    if 'callback_query' in update:
+        return 'callback_query'
+    return 'other'
+
+def _user_key(update):
+    for key in ('message', 'edited_message', 'callback_query'):
+        sender = (update.get(key) or {}).get('from')
+        if sender:
+            return sender.get('id')
+    return update.get('update_id')
+
+def capture_files(paths):
+    """Expand directories and globs into sorted capture file list"""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(glob.glob(os.path.join(path, 'webhook-*.jsonl.gz')))
+        else:
+            files.extend(glob.glob(path) or [path])
+    return sorted(set(files))
+
+def load_capture(files):
+    """Read capture entries ordered by arrival time"""
+    entries = []
+    for path in files:
+        opener = gzip.open if path.endswith('.gz') else open
+        try:
+            with opener(path, 'rt', encoding='utf-8') as f:
+                for line in f:
+                    line = line.strip()
+                    if line:
+                        entries.append(json.loads(line))
+        except (EOFError, zlib.error, json.JSONDecodeError) as e:
+            # File terakhir bisa terpotong kalau proses mati saat menulis
+            print(f"⚠️ {path}: capture truncated ({e}), using {len(entries)} entries read so far", file=sys.stderr)
+    entries.sort(key=lambda entry: entry['t'])
+    return entries
+
+class Replayer:
+    """Send captured updates with original inter-arrival times scaled by speed"""
+
+    def __init__(self, url, entries, speed, workers, timeout):
+        self.url = url
+        self.entries = entries
+        self.speed = speed
+        self.workers = workers
+        self.timeout = timeout
+        self.headers = {'Content-Type': 'application/json'}
+
+        self._lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.lateness = []
+        self.errors = defaultdict(int)
+        self.status_codes = defaultdict(int)
+
+    def _send(self, session, entry, due):
+        update = entry['update']
+        kind = _update_kind(update)
+        if due is not None:
+            delay = due - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+        start = time.perf_counter()
+        lateness = start - due if due is not None else 0.0
+        try:
+            response = session.post(self.url, data=json.dumps(update), headers=self.headers, timeout=self.timeout)
+            status = response.status_code
+        except requests.RequestException:
+            status = 'error'
+        elapsed = time.perf_counter() - start
+
+        with self._lock:
+            self.latencies[kind].append(elapsed)
+            self.lateness.append(max(0.0, lateness))
+            self.status_codes[status] += 1
+            if status == 'error' or status >= 400:
+                self.errors[kind] += 1
+
+    def _worker(self, work):
+        session = requests.Session()
+        while True:
+            item = work.get()
+            if item is None:
+                return
+            self._send(session, *item)
+
+    def run(self):
+        """Replay all entries; returns report dict"""
+        queues = [queue.Queue() for _ in range(self.workers)]
+        threads = [threading.Thread(target=self._worker, args=(q,), daemon=True) for q in queues]
+        for thread in threads:
+            thread.start()
+
+        started = time.perf_counter()
+        first_t = self.entries[0]['t'] if self.entries else 0
+        for entry in self.entries:
+            due = None
+            if self.speed > 0:
+                due = started + (entry['t'] - first_t) / self.speed
+            # User yang sama selalu ke worker yang sama supaya urutan percakapan terjaga
+            shard = hash(_user_key(entry['update'])) % self.workers
+            queues[shard].put((entry, due))
+
+        for q in queues:
+            q.put(None)
+        for thread in threads:
+            thread.join()
+        return self.report(time.perf_counter() - started, first_t)
+
+    def report(self, elapsed, first_t):
+        captured = (self.entries[-1]['t'] - first_t) if self.entries else 0.0
+        kinds = {}
+        for kind, values in self.latencies.items():
+            kinds[kind] = {
+                'requests': len(values),
+                'errors': self.errors.get(kind, 0),
+                'p50_ms': _percentile(values, 50) * 1000,
+                'p95_ms': _percentile(values, 95) * 1000,
+                'p99_ms': _percentile(values, 99) * 1000,
+                'max_ms': max(values) * 1000
+            }
+        return {
+            'updates': len(self.entries),
+            'speed': self.speed,
+            'captured_seconds': captured,
+            'elapsed_seconds': elapsed,
+            'throughput_rps': len(self.entries) / elapsed if elapsed else 0.0,
+            'lateness_p50_ms': _percentile(self.lateness, 50) * 1000,
+            'lateness_p99_ms': _percentile(self.lateness, 99) * 1000,
+            'status_codes': {str(code): count for code, count in self.status_codes.items()},
+            'kinds': kinds
+        }
+
+def print_report(report):
+    speed = f"{report['speed']:g}x" if report['speed'] > 0 else 'max speed'
+    print(f"⏱️  {report['updates']} updates ({report['captured_seconds']:.1f}s captured) "
+          f"replayed at {speed} in {report['elapsed_seconds']:.1f}s")
+    print(f"🚀 Throughput: {report['throughput_rps']:.1f} req/s")
+    print(f"⌛ Send lateness vs schedule: p50 {report['lateness_p50_ms']:.1f} ms, "
+          f"p99 {report['lateness_p99_ms']:.1f} ms")
+    print(f"📨 Status codes: {report['status_codes']}")
+    print(f"\n{'kind':<15}{'requests':>9}{'errors':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for kind, stats in report['kinds'].items():
+        print(f"{kind:<15}{stats['requests']:>9}{stats['errors']:>8}{stats['p50_ms']:>10.1f}"
+              f"{stats['p95_ms']:>10.1f}{stats['p99_ms']:>10.1f}{stats['max_ms']:>10.1f}")
+
+def main():
+    parser = argparse.ArgumentParser(description='Replay recorded webhook traffic against a test instance')
+    parser.add_argument('captures', nargs='+', help='Capture files, globs or WEBHOOK_RECORD_DIR directories')
+    parser.add_argument('--url', default='http://localhost:5000/webhook')
+    parser.add_argument('--speed', type=float, default=1.0, help='1 = real time, N = N times faster, 0 = as fast as possible')
+    parser.add_argument('--workers', type=int, default=32, help='Parallel senders (updates of one user stay on one sender)')
+    parser.add_argument('--timeout', type=float, default=30.0)
+    parser.add_argument('--json', dest='json_path', default=None, help='Also write report as JSON')
+    args = parser.parse_args()
+
+    files = capture_files(args.captures)
+    entries = load_capture(files)
+    if not entries:
+        print("❌ No captured updates found", file=sys.stderr)
+        sys.exit(1)
+
+    replayer = Replayer(args.url, entries, args.speed, max(1, args.workers), args.timeout)
+    report = replayer.run()
+    print_report(report)
+
+    if args.json_path:
+        with open(args.json_path, 'w') as f:
+            json.dump(report, f, indent=2)
+
+if __name__ == '__main__':
+    main()